@@ -8,7 +8,7 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from rest_framework.authtoken.models import Token
 from .forms import UserRegisterForm, UserLoginForm
-from packages.models import Package
+from packages.services import PackageService
 
 
 class CustomLoginView(LoginView):
@@ -42,8 +42,11 @@ class ProfileView(LoginRequiredMixin, TemplateView):
         token, _ = Token.objects.get_or_create(user=self.request.user)
         context['api_token'] = token.key
         
-        # Récupère les paquets de l'utilisateur
-        context['my_packages'] = Package.objects.filter(author=self.request.user).order_by('-updated_at')
+        # Paquets de l'utilisateur et statistiques (nombre constant de requêtes)
+        stats = PackageService.get_author_stats(self.request.user)
+        context['stats'] = stats
+        context['my_packages'] = stats['packages']
+        context['downloads_peak'] = max(day['downloads'] for day in stats['downloads_over_time'])
         
         return context
 
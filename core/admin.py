@@ -0,0 +1,60 @@
+from typing import Any, Dict, List
+
+from django.contrib import admin
+from django.utils.html import format_html, format_html_join
+from unfold.admin import ModelAdmin
+from unfold.contrib.filters.admin import RangeDateFilter
+from unfold.decorators import display
+
+from .models import RequestTrace
+
+
+@admin.register(RequestTrace)
+class RequestTraceAdmin(ModelAdmin):
+    """Slowest requests first, with the span waterfall of each trace (read only, filled by core.tracing)."""
+    list_display = ["route", "method", "path", "status_code", "duration", "reason", "started_at"]
+    list_filter = ["route", "reason", "status_code", ("started_at", RangeDateFilter)]
+    list_filter_submit = True
+    search_fields = ["path", "trace_id"]
+    ordering = ["-duration_ms"]
+    fields = ["trace_id", "method", "path", "route", "status_code", "duration", "reason", "started_at", "waterfall"]
+    readonly_fields = fields
+
+    def has_add_permission(self, request: Any) -> bool:
+        return False
+
+    def has_change_permission(self, request: Any, obj: Any = None) -> bool:
+        return False
+
+    @display(description="Duration", ordering="duration_ms")
+    def duration(self, obj: RequestTrace) -> str:
+        return f"{obj.duration_ms:.1f} ms"
+
+    @display(description="Spans")
+    def waterfall(self, obj: RequestTrace) -> str:
+        spans: List[Dict[str, Any]] = obj.spans
+        if not spans:
+            return "-"
+        total = max(obj.duration_ms, 0.001)
+        depths: Dict[str, int] = {}
+        rows = []
+        for span in spans:  # Triés par début : un parent précède toujours ses enfants
+            depth = depths.get(span['parent_id'], -1) + 1
+            depths[span['span_id']] = depth
+            detail = span['attributes'].get('sql') or ''
+            rows.append((
+                depth * 16,
+                span['name'] + (f" ({span['error']})" if span['error'] else ''),
+                f"{span['duration_ms']:.2f} ms",
+                f"{span['offset_ms'] / total * 100:.2f}",
+                f"{max(span['duration_ms'] / total * 100, 0.3):.2f}",
+                detail,
+            ))
+        body = format_html_join(
+            '',
+            '<tr><td style="padding-left:{}px;white-space:nowrap" title="{}">{}</td>'
+            '<td style="text-align:right;white-space:nowrap;padding:0 8px">{}</td>'
+            '<td style="width:60%"><div style="margin-left:{}%;width:{}%;height:10px;background:#6366f1;border-radius:2px"></div></td></tr>',
+            ((indent, detail, name, duration, offset, width) for indent, name, duration, offset, width, detail in rows),
+        )
+        return format_html('<table style="width:100%;font-size:12px">{}</table>', body)
@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('DJANGO_SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
+
+# Optional warm-up before the worker accepts traffic
+from django.conf import settings
+
+if settings.WARMUP_ON_BOOT:
+    from core.warmup import warm_up
+    warm_up()
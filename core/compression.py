@@ -0,0 +1,70 @@
+import gzip
+from typing import Optional, Tuple
+
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # Brotli est optionnel, gzip reste toujours disponible
+    brotli = None
+
+# Content types worth compressing (archives and images are already compressed)
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.html', '.txt', '.xml', '.svg', '.map')
+
+# Server preference when the client accepts several encodings
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.split(';')[0].strip().lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Returns the preferred encoding accepted by the client (`q=0` means refused), or None."""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    """
+    Compresses `data` with the given encoding.
+    Static files are compressed once at collectstatic time, so they get the best (slowest) levels;
+    dynamic responses use fast levels and keep Django's random gzip padding against BREACH.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else 5)
+    if static:
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return compress_string(data, max_random_bytes=100)
+
+
+def compressed_variants(data: bytes) -> Tuple[Tuple[str, bytes], ...]:
+    """Precompressed variants (suffix, bytes) of a static file, only those smaller than the original."""
+    variants = []
+    for encoding in ENCODINGS:
+        compressed = compress(data, encoding, static=True)
+        if len(compressed) < len(data):
+            variants.append((SUFFIXES[encoding], compressed))
+    return tuple(variants)
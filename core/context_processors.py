@@ -0,0 +1,9 @@
+from typing import Any, Dict
+
+from django.conf import settings
+from django.http import HttpRequest
+
+
+def cache_settings(request: HttpRequest) -> Dict[str, Any]:
+    """Exposes the fragment cache timeout to the `{% cache %}` tags."""
+    return {'FRAGMENT_CACHE_TIMEOUT': settings.FRAGMENT_CACHE_TIMEOUT}
@@ -0,0 +1,52 @@
+import logging
+import threading
+from typing import Any, Dict
+
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('core.db')
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {
+    'connections_opened': 0,
+    'requests': 0,
+}
+
+
+@receiver(connection_created)
+def count_connection(sender: Any, connection: Any, **kwargs: Any) -> None:
+    with _lock:
+        _counters['connections_opened'] += 1
+        opened, requests = _counters['connections_opened'], _counters['requests']
+    logger.debug(
+        "New DB connection on '%s' (%d opened for %d requests)",
+        connection.alias, opened, requests,
+    )
+
+
+@receiver(request_finished)
+def count_request(sender: Any, **kwargs: Any) -> None:
+    with _lock:
+        _counters['requests'] += 1
+
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Connection churn of the current process.
+    connections_per_request close to 1 means a connection is opened on every request
+    (CONN_MAX_AGE = 0), close to 0 means connections are reused.
+    """
+    with _lock:
+        data: Dict[str, Any] = dict(_counters)
+    data['connections_per_request'] = (
+        round(data['connections_opened'] / data['requests'], 3) if data['requests'] else 0.0
+    )
+    return data
+
+
+def reset() -> None:
+    with _lock:
+        for key in _counters:
+            _counters[key] = 0
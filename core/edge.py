@@ -0,0 +1,159 @@
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import add_never_cache_headers, patch_cache_control
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('core.edge')
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class BasePurger(ABC):
+    """Invalidates the edge (CDN) copies of the responses tagged with the given surrogate keys."""
+
+    @abstractmethod
+    def purge(self, keys: List[str]) -> None:
+        ...
+
+
+class LocalPurger(BasePurger):
+    """
+    Stand-in for development and tests: no CDN, the purged keys are only logged and recorded
+    (`purged`, one list per purge) so a test can assert what a change would have invalidated.
+    """
+
+    def __init__(self):
+        self.purged: List[List[str]] = []
+
+    def purge(self, keys: List[str]) -> None:
+        self.purged.append(keys)
+        logger.info("edge purge: %s", ' '.join(keys))
+
+
+class FastlyPurger(BasePurger):
+    """Surrogate-key purge through the Fastly API (one request for all the keys)."""
+
+    timeout = 5
+
+    def purge(self, keys: List[str]) -> None:
+        request = urllib.request.Request(
+            f'https://api.fastly.com/service/{settings.EDGE_FASTLY_SERVICE_ID}/purge',
+            data=json.dumps({'surrogate_keys': keys}).encode(),
+            method='POST',
+            headers={
+                'Fastly-Key': settings.EDGE_FASTLY_API_TOKEN,
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+            },
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+@lru_cache(maxsize=None)
+def get_purger() -> BasePurger:
+    return import_string(settings.EDGE_PURGER)()
+
+
+def purge(keys: Iterable[str]) -> None:
+    """
+    Purges the keys once the current transaction is committed, so the edge never re-caches the old data.
+    The purge itself runs on a background thread: a slow CDN API never delays the response.
+    """
+    keys = sorted(set(keys))
+    if keys:
+        transaction.on_commit(lambda: _enqueue(keys))
+
+
+# --- Background purge ---------------------------------------------------------
+
+_queue: "queue.Queue[List[str]]" = queue.Queue(maxsize=1000)
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def _enqueue(keys: List[str]) -> None:
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_purge_loop, name='edge-purger', daemon=True)
+                _worker.start()
+    try:
+        _queue.put_nowait(keys)
+    except queue.Full:
+        # The page expires from the edge after EDGE_CACHE_TTL at the latest
+        logger.warning("edge purge queue full, keys dropped: %s", ' '.join(keys))
+
+
+def flush(timeout: float = 5.0) -> None:
+    """Waits until the queued purges are sent (tests, management commands)."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _purge_loop() -> None:
+    while True:
+        # Les purges en attente sont regroupées en un seul appel
+        batches = [_queue.get()]
+        while True:
+            try:
+                batches.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        keys = sorted({key for batch in batches for key in batch})
+        try:
+            get_purger().purge(keys)
+        except Exception:
+            # Un purge raté ne fait pas échouer le publish : la page expire au plus tard après EDGE_CACHE_TTL
+            logger.exception("edge purge failed: %s", ' '.join(keys))
+        for _ in batches:
+            _queue.task_done()
+
+
+def is_edge_cacheable(request: HttpRequest) -> bool:
+    """
+    Anonymous GET without per-visitor content: no session (logged-in users) and no pending
+    flash messages (rendered once, stored in a cookie).
+    """
+    return (
+        settings.EDGE_CACHE_TTL > 0
+        and request.method in SAFE_METHODS
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+class EdgeCacheMixin:
+    """
+    Public HTML views: anonymous responses are cacheable by the edge for EDGE_CACHE_TTL
+    (Surrogate-Control, tagged with `get_surrogate_keys()` for targeted purges) and by browsers
+    for EDGE_BROWSER_TTL only. Every other response is marked private and uncacheable.
+    """
+
+    def get_surrogate_keys(self) -> List[str]:
+        return []
+
+    def dispatch(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        response = super().dispatch(request, *args, **kwargs)
+        if is_edge_cacheable(request) and response.status_code == 200:
+            patch_cache_control(response, public=True, max_age=settings.EDGE_BROWSER_TTL)
+            response.headers['Surrogate-Control'] = f'max-age={settings.EDGE_CACHE_TTL}'
+            response.headers['Surrogate-Key'] = ' '.join(self.get_surrogate_keys())
+        else:
+            add_never_cache_headers(response)
+            patch_cache_control(response, private=True)
+        return response
@@ -0,0 +1,72 @@
+import statistics
+import time
+from typing import Any, Dict, List
+
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+
+from core import db_metrics
+
+
+class Command(BaseCommand):
+    help = "Measures the per-request latency saved by persistent DB connections (CONN_MAX_AGE)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/packages/', help="Path requested on each iteration.")
+        parser.add_argument('--requests', type=int, default=200, help="Number of requests per run.")
+        parser.add_argument('--max-age', type=int, default=60, help="CONN_MAX_AGE used for the persistent run.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        runs = [("new connection per request", 0), ("persistent connections", options['max_age'])]
+        results: Dict[str, Dict[str, float]] = {}
+
+        with override_settings(ALLOWED_HOSTS=['127.0.0.1']):
+            for label, max_age in runs:
+                results[label] = self._run(options['url'], options['requests'], max_age)
+                stats = results[label]
+                self.stdout.write(
+                    f"{label:<28} CONN_MAX_AGE={max_age:<4} "
+                    f"mean={stats['mean']:.2f}ms p50={stats['p50']:.2f}ms p95={stats['p95']:.2f}ms "
+                    f"connections/request={stats['connections_per_request']}"
+                )
+
+        saved = results[runs[0][0]]['mean'] - results[runs[1][0]]['mean']
+        self.stdout.write(self.style.SUCCESS(f"\nLatency saved per request: {saved:.2f}ms"))
+
+    def _run(self, url: str, count: int, max_age: int) -> Dict[str, float]:
+        for conn in connections.all():
+            conn.close()
+            conn.settings_dict['CONN_MAX_AGE'] = max_age
+
+        # The real WSGI handler rather than the test Client: the test Client disables
+        # close_old_connections, which is precisely what CONN_MAX_AGE drives.
+        handler = WSGIHandler()
+        self._request(handler, url)  # Warm-up (URL resolver, templates)
+        db_metrics.reset()
+
+        timings: List[float] = []
+        for _ in range(count):
+            start = time.perf_counter()
+            self._request(handler, url)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        return {
+            'mean': statistics.fmean(timings),
+            'p50': timings[len(timings) // 2],
+            'p95': timings[int(len(timings) * 0.95) - 1],
+            'connections_per_request': db_metrics.snapshot()['connections_per_request'],
+        }
+
+    @staticmethod
+    def _request(handler: WSGIHandler, url: str) -> None:
+        environ: Dict[str, Any] = {'PATH_INFO': url, 'REQUEST_METHOD': 'GET'}
+        setup_testing_defaults(environ)
+        response = handler(environ, lambda status, headers: None)
+        for _ in response:
+            pass
+        response.close()  # Fires request_finished
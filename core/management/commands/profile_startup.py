@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Exécuté dans un interpréteur neuf : c'est exactement ce que paie un worker au démarrage
+BOOT_SCRIPT = """
+import json, os, time
+start = time.perf_counter()
+if os.environ['PROFILE_INTERFACE'] == 'asgi':
+    from core.asgi import application
+else:
+    from core.wsgi import application
+loaded = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urlconf = time.perf_counter()
+warmup = {}
+if os.environ['PROFILE_WARMUP'] == '1':
+    from core.warmup import warm_up
+    warmup = warm_up()
+done = time.perf_counter()
+print(json.dumps({
+    'application': (loaded - start) * 1000,
+    'urlconf': (urlconf - loaded) * 1000,
+    'warmup': warmup,
+    'total': (done - start) * 1000,
+}))
+"""
+
+ImportTiming = Tuple[str, int, int]  # (module, self us, cumulative us)
+
+
+class Command(BaseCommand):
+    help = (
+        "Boots the WSGI/ASGI application in a fresh interpreter with `python -X importtime` "
+        "and reports the boot phases and the import cost per module and per top-level package."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interface', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--limit', type=int, default=20, help="Rows shown in each table.")
+        parser.add_argument('--warmup', action='store_true', help="Also time the warm-up steps (core/warmup.py).")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        env = {
+            **os.environ,
+            'PROFILE_INTERFACE': options['interface'],
+            'PROFILE_WARMUP': '1' if options['warmup'] else '0',
+            # Le warm-up est mesuré explicitement, pas celui déclenché par wsgi.py/asgi.py
+            'WARMUP_ON_BOOT': 'False',
+        }
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+            capture_output=True, text=True, env=env, cwd=os.getcwd(),
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Boot failed:\n{result.stderr[-2000:]}")
+
+        phases: Dict[str, Any] = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = self._parse_importtime(result.stderr)
+        limit: int = options['limit']
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Boot phases ({options['interface']})"))
+        self.stdout.write(f"  {'load application':<28}{phases['application']:>9.1f}ms")
+        self.stdout.write(f"  {'import urlconf':<28}{phases['urlconf']:>9.1f}ms")
+        for step, duration in phases['warmup'].items():
+            self.stdout.write(f"  {'warm-up: ' + step:<28}{duration:>9.1f}ms")
+        self.stdout.write(f"  {'total':<28}{phases['total']:>9.1f}ms")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nImport cost per top-level package (self time)"))
+        packages: Dict[str, int] = defaultdict(int)
+        for module, self_us, _ in imports:
+            packages[module.split('.')[0]] += self_us
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f"  {package:<40}{self_us / 1000:>9.1f}ms")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nSlowest modules (cumulative, includes their own imports)"))
+        for module, _, cumulative_us in sorted(imports, key=lambda item: -item[2])[:limit]:
+            self.stdout.write(f"  {module:<60}{cumulative_us / 1000:>9.1f}ms")
+
+        total_us = sum(self_us for _, self_us, _ in imports)
+        self.stdout.write(f"\n{len(imports)} modules imported, {total_us / 1000:.1f}ms spent in imports.")
+
+    @staticmethod
+    def _parse_importtime(stderr: str) -> List[ImportTiming]:
+        """Lines look like `import time:       412 |       1045 |   django.urls`."""
+        imports = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            fields = line[len('import time:'):].split('|')
+            if len(fields) != 3 or not fields[0].strip().isdigit():
+                continue  # En-tête "self [us] | cumulative | imported package"
+            imports.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+        return imports
@@ -0,0 +1,71 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Minimal OTLP/HTTP (JSON) collector for development: receives the traces sent by "
+        "core.tracing.OTLPExporter on /v1/traces, prints one line per trace and optionally "
+        "appends the raw payloads to a file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=4318, help="Default OTLP/HTTP port.")
+        parser.add_argument('--output', help="Append every received payload (one JSON per line) to this file.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        command = self
+        output: Optional[str] = options['output']
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                if self.path != '/v1/traces':
+                    self.send_error(404)
+                    return
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    self.send_error(400, "Only the OTLP JSON encoding is supported")
+                    return
+                if output:
+                    with open(output, 'a') as f:
+                        f.write(json.dumps(payload) + '\n')
+                command.print_payload(payload)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass  # Une ligne par trace suffit
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(f"Collecting traces on http://{options['host']}:{options['port']}/v1/traces")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    def print_payload(self, payload: Dict[str, Any]) -> None:
+        spans: List[Dict[str, Any]] = [
+            span
+            for resource in payload.get('resourceSpans', [])
+            for scope in resource.get('scopeSpans', [])
+            for span in scope.get('spans', [])
+        ]
+        roots = [span for span in spans if span.get('kind') == 2]
+        for root in roots:
+            children = [s for s in spans if s['traceId'] == root['traceId'] and s is not root]
+            duration_ms = (int(root['endTimeUnixNano']) - int(root['startTimeUnixNano'])) / 1e6
+            queries = sum(1 for s in children if s['name'] == 'db')
+            self.stdout.write(
+                f"{root['traceId']}  {root['name']:<40} {duration_ms:>9.1f}ms  "
+                f"{len(children)} span(s), {queries} quer{'y' if queries == 1 else 'ies'}"
+            )
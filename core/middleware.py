@@ -0,0 +1,125 @@
+import hashlib
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .compression import compress, is_compressible, negotiate_encoding
+from .routers import get_replica_aliases, is_client_pinned, pin_to_primary, read_from_primary, reset_pin
+
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class PrimaryPinningMiddleware:
+    """
+    Read-after-write consistency for the replica router.
+    - Unsafe requests (POST, PUT, ...) read and write on the primary only.
+    - After such a write (or an explicit `pin_to_primary()`), a short-lived cookie keeps the client's
+      next requests on the primary until the replicas had time to catch up (REPLICA_PIN_SECONDS).
+      Every pinned write restarts the window.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not get_replica_aliases():
+            return self.get_response(request)
+
+        reset_pin()
+        if request.method in UNSAFE_METHODS:
+            pin_to_primary()
+        elif settings.REPLICA_PIN_COOKIE in request.COOKIES:
+            read_from_primary()
+
+        response = self.get_response(request)
+
+        if is_client_pinned():
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+
+        reset_pin()
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Negotiated response compression (brotli when installed, gzip otherwise) for the API and HTML views.
+    The compressed variants of successful anonymous GET responses are cached by content digest: an identical
+    payload (cached list page, unchanged API listing) is compressed once and then served as is.
+    Streaming responses (archive downloads) are left untouched, their content is already compressed.
+    """
+
+    min_length = 200
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        response = self.get_response(request)
+
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < self.min_length or not is_compressible(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        content = self.get_compressed(request, response, encoding)
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        response.headers['Content-Encoding'] = encoding
+
+        # Une ETag forte ne peut pas désigner à la fois la version brute et la version compressée
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+        return response
+
+    @staticmethod
+    def is_shared(request: HttpRequest, response: HttpResponse) -> bool:
+        """
+        Whether the body is the same for every client: no session, credentials or CSRF token involved.
+        Only those are cached, per-user pages (masked CSRF token, user data) would never be reused
+        and their compression must keep the random gzip padding (BREACH).
+        """
+        return (
+            settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and 'HTTP_AUTHORIZATION' not in request.META
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+        )
+
+    @classmethod
+    def get_compressed(cls, request: HttpRequest, response: HttpResponse, encoding: str) -> bytes:
+        cacheable = (
+            settings.COMPRESSION_CACHE_TIMEOUT
+            and request.method == 'GET'
+            and response.status_code == 200
+            and len(response.content) <= settings.COMPRESSION_CACHE_MAX_SIZE
+            and cls.is_shared(request, response)
+        )
+        if not cacheable:
+            return compress(response.content, encoding)
+
+        digest = hashlib.blake2b(response.content, digest_size=20).hexdigest()
+        key = f'compressed:{encoding}:{digest}'
+        content = cache.get(key)
+        if content is None:
+            content = compress(response.content, encoding)
+            cache.set(key, content, settings.COMPRESSION_CACHE_TIMEOUT)
+        return content
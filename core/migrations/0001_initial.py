@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestTrace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trace_id', models.CharField(db_index=True, max_length=32)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=255)),
+                ('route', models.CharField(blank=True, help_text='URL name of the view, e.g. package-latest', max_length=100)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('reason', models.CharField(choices=[('slow', 'Slow'), ('sampled', 'Sampled')], max_length=10)),
+                ('started_at', models.DateTimeField()),
+                ('spans', models.JSONField(default=list)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-duration_ms'], name='trace_duration_idx'), models.Index(fields=['route', '-duration_ms'], name='trace_route_duration_idx'), models.Index(fields=['started_at'], name='trace_started_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict
+
+from django.db import models
+
+
+class RequestTrace(models.Model):
+    """
+    Request trace kept by core.tracing (slow or sampled), stored by the DatabaseExporter
+    for the "Slow requests" admin page. Pruned after TRACING_RETENTION_DAYS.
+    """
+    REASONS = [('slow', 'Slow'), ('sampled', 'Sampled')]
+
+    trace_id = models.CharField(max_length=32, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    route = models.CharField(max_length=100, blank=True, help_text="URL name of the view, e.g. package-latest")
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    reason = models.CharField(max_length=10, choices=REASONS)
+    started_at = models.DateTimeField()
+    spans = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            # Slowest requests first, and per route
+            models.Index(fields=['-duration_ms'], name='trace_duration_idx'),
+            models.Index(fields=['route', '-duration_ms'], name='trace_route_duration_idx'),
+            # Retention pruning
+            models.Index(fields=['started_at'], name='trace_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+    @classmethod
+    def from_trace(cls, trace: Dict[str, Any]) -> "RequestTrace":
+        return cls(
+            trace_id=trace['trace_id'],
+            method=trace['method'],
+            path=trace['path'][:255],
+            route=trace['route'][:100],
+            status_code=trace['status_code'],
+            duration_ms=trace['duration_ms'],
+            reason=trace['reason'],
+            started_at=datetime.fromtimestamp(trace['start_unix_nano'] / 1e9, tz=dt_timezone.utc),
+            spans=trace['spans'],
+        )
@@ -0,0 +1,49 @@
+from typing import Optional
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large admin changelists.
+    An unfiltered queryset is counted from the table statistics (MySQL `information_schema`,
+    PostgreSQL `pg_class`) instead of an exact `COUNT(*)` that scans the whole table.
+    Small tables, filtered querysets and other backends keep the exact count.
+    """
+
+    # En dessous de ce seuil, le COUNT(*) exact est assez rapide
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self) -> int:
+        estimate = self.estimated_count()
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+    def estimated_count(self) -> Optional[int]:
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None or query.where or query.distinct or query.combinator:
+            return None
+
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(
+                    'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                    [table],
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+
+        # reltuples vaut -1 sur une table jamais analysée
+        if row is None or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
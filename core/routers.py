@@ -0,0 +1,73 @@
+import random
+from contextvars import ContextVar
+from typing import Any, List, Optional
+
+from django.conf import settings
+
+# Set once a request must read from the primary so that it never reads stale data from a lagging
+# replica: an unsafe request, or a client still pinned by its cookie (see PrimaryPinningMiddleware).
+_use_primary: ContextVar[bool] = ContextVar('use_primary', default=False)
+# Set when the request wrote on behalf of the client: its pin window (re)starts.
+_pin_client: ContextVar[bool] = ContextVar('pin_client', default=False)
+
+PRIMARY_DB = 'default'
+
+
+def get_replica_aliases() -> List[str]:
+    """Database aliases configured as read replicas (may be empty)."""
+    return settings.DATABASE_REPLICAS
+
+
+def read_from_primary() -> None:
+    """Sends every subsequent read of the current request to the primary."""
+    _use_primary.set(True)
+
+
+def pin_to_primary() -> None:
+    """
+    The current request wrote something the client must read back: its reads go to the primary
+    and the client stays pinned for REPLICA_PIN_SECONDS. Unsafe requests are pinned by the
+    middleware; a safe request making a user-visible write calls it explicitly.
+    Background writes (download counters, stats) don't pin.
+    """
+    _use_primary.set(True)
+    _pin_client.set(True)
+
+
+def is_pinned_to_primary() -> bool:
+    return _use_primary.get()
+
+
+def is_client_pinned() -> bool:
+    return _pin_client.get()
+
+
+def reset_pin() -> None:
+    _use_primary.set(False)
+    _pin_client.set(False)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random replica and writes to the primary.
+    Falls back to the primary when no replica is configured
+    or when the current request has been pinned (read-after-write).
+    """
+
+    def db_for_read(self, model: Any, **hints: Any) -> Optional[str]:
+        replicas = get_replica_aliases()
+        if not replicas or is_pinned_to_primary():
+            return PRIMARY_DB
+        return random.choice(replicas)
+
+    def db_for_write(self, model: Any, **hints: Any) -> Optional[str]:
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1: Any, obj2: Any, **hints: Any) -> Optional[bool]:
+        # Replicas mirror the primary: every alias holds the same rows
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints: Any) -> Optional[bool]:
+        # `migrate` only targets the primary, unless DATABASE_MIGRATE_REPLICAS opts in
+        # (local setup with two SQLite files, see DATABASE_REPLICA_NAMES in the settings)
+        return db == PRIMARY_DB or settings.DATABASE_MIGRATE_REPLICAS
@@ -1,6 +1,8 @@
+import json
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse_lazy
 
 load_dotenv()
@@ -25,6 +27,7 @@ CSRF_TRUSTED_ORIGINS = os.getenv("CSRF_TRUSTED_ORIGINS", "").split(" ")
 # Application definition
 
 INSTALLED_APPS = [
+    'core',
     'authentication',
     'packages',
 
@@ -32,6 +35,7 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'corsheaders',
     'unfold',
+    'unfold.contrib.filters',
 
     'django.contrib.admin',
     'django.contrib.auth',
@@ -41,9 +45,20 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 ]
 
+# Admin workers only: API/web workers can boot without the admin (unfold, admin autodiscovery)
+ENABLE_ADMIN = os.getenv("ENABLE_ADMIN", "True") == "True"
+if not ENABLE_ADMIN:
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ('unfold', 'unfold.contrib.filters', 'django.contrib.admin')]
+
+# Prime URL resolver, templates, markdown, dependency graph and suggest index when the worker boots (core/warmup.py)
+WARMUP_ON_BOOT = os.getenv("WARMUP_ON_BOOT", "False") == "True"
+
 MIDDLEWARE = [
+    'core.tracing.TracingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,17 +71,24 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 ROOT_URLCONF = 'core.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, "templates")],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.cache_settings',
             ],
+            # Production: compiled templates are kept in memory instead of being parsed on every render
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
         },
     },
 ]
@@ -85,9 +107,92 @@ DATABASES = {
         'PASSWORD': os.getenv('DATABASE_PWD'),
         'HOST': os.getenv('DATABASE_HOST'),
         'PORT': os.getenv('DATABASE_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True',
+    }
+}
+
+# Connection pooling for the ASGI server (set by core/asgi.py)
+# Under ASGI every request runs its sync code in a new thread, so a persistent connection
+# is never reused: connections must come from a pool instead.
+# PostgreSQL uses Django's native pool, MySQL expects DATABASE_HOST to point to a pooler (e.g. ProxySQL).
+if os.getenv('DJANGO_SERVER_INTERFACE') == 'asgi':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    if 'postgresql' in (DATABASES['default']['ENGINE'] or ''):
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', '10')),
+                'timeout': int(os.getenv('DATABASE_POOL_TIMEOUT', '10')),
+            }
+        }
+
+# SQLite (local development, tests): writers take the database lock when their transaction starts
+# (BEGIN IMMEDIATE) and wait up to `timeout` seconds for it, so concurrent publishes queue up instead of
+# failing with "database is locked" when a read transaction tries to upgrade to a write.
+# The test database is a file too (test_db.sqlite3, git-ignored, deleted after the run): connections to the
+# in-memory one are never closed, and its shared cache locks per table without waiting.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE', 'timeout': 20}
+    DATABASES['default']['TEST'] = {'NAME': str(BASE_DIR / 'test_db.sqlite3')}
+
+# Read replicas (optional)
+# Space separated lists, one entry per replica. Missing values are inherited from the primary,
+# e.g. DATABASE_REPLICA_HOSTS="10.0.0.2 10.0.0.3" for MySQL,
+# or DATABASE_REPLICA_NAMES="replica.sqlite3" to test locally with two SQLite files: create the replica
+# with `DATABASE_MIGRATE_REPLICAS=True migrate --database replica_1` (or copy the primary file), nothing
+# replicates between the files so copy the primary over it again to simulate the replica catching up.
+DATABASE_REPLICA_HOSTS = os.getenv("DATABASE_REPLICA_HOSTS", "").split()
+DATABASE_REPLICA_NAMES = os.getenv("DATABASE_REPLICA_NAMES", "").split()
+DATABASE_REPLICAS = []
+
+for index in range(max(len(DATABASE_REPLICA_HOSTS), len(DATABASE_REPLICA_NAMES))):
+    DATABASE_REPLICAS.append(f'replica_{index + 1}')
+    DATABASES[f'replica_{index + 1}'] = {
+        **DATABASES['default'],
+        'HOST': DATABASE_REPLICA_HOSTS[index] if index < len(DATABASE_REPLICA_HOSTS) else DATABASES['default']['HOST'],
+        'NAME': DATABASE_REPLICA_NAMES[index] if index < len(DATABASE_REPLICA_NAMES) else DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Mirror of the primary for the test suite, which routes to it with DATABASE_REPLICAS=['replica'].
+# Not a replica: never read from unless listed in DATABASE_REPLICAS, no connection is opened otherwise.
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+# `migrate` only targets the primary unless this is set (local replica created from its own SQLite file)
+DATABASE_MIGRATE_REPLICAS = os.getenv("DATABASE_MIGRATE_REPLICAS", "False") == "True"
+
+# Replicas only read: on SQLite their transactions must not take the write lock of the primary file
+for alias, database in DATABASES.items():
+    if alias != 'default' and database['ENGINE'] == 'django.db.backends.sqlite3':
+        database['OPTIONS'] = {**database['OPTIONS'], 'transaction_mode': 'DEFERRED'}
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# After a write, the client keeps reading from the primary for this long (replication lag budget)
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+REPLICA_PIN_COOKIE = 'use_primary'
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+# Lifetime of the cached template fragments (package cards, detail versions list).
+# Fragments are keyed on the package `updated_at`; counters are rendered outside of them.
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", "300"))
+
+# Compressed variants of anonymous GET responses, keyed by content digest (0 disables the cache).
+# Bodies above COMPRESSION_CACHE_MAX_SIZE are compressed on the fly (memcached items are capped at 1MB).
+COMPRESSION_CACHE_TIMEOUT = int(os.getenv("COMPRESSION_CACHE_TIMEOUT", "600"))
+COMPRESSION_CACHE_MAX_SIZE = int(os.getenv("COMPRESSION_CACHE_MAX_SIZE", str(512 * 1024)))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -129,6 +234,49 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Package archives storage
+# "local" (default) writes under MEDIA_ROOT and Django serves the downloads.
+# "s3" stores them in an S3-compatible bucket (AWS S3, MinIO, ...): large publishes use multipart
+# uploads and download URLs are short-lived presigned URLs, so artifact bytes bypass Django.
+# Requires the s3 extra (poetry install -E s3); packages/tests.py exercises it against moto's S3.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        # collectstatic also writes .gz/.br variants for the front server (nginx gzip_static)
+        'BACKEND': 'core.storage.CompressedStaticFilesStorage',
+    },
+}
+
+if STORAGE_BACKEND == 's3':
+    try:
+        from boto3.s3.transfer import TransferConfig
+    except ImportError:
+        raise ImproperlyConfigured('STORAGE_BACKEND=s3 requires the s3 extra (poetry install -E s3).')
+
+    STORAGES['default'] = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.getenv('S3_BUCKET'),
+            'endpoint_url': os.getenv('S3_ENDPOINT_URL') or None,  # e.g. http://localhost:9000 for MinIO
+            'region_name': os.getenv('S3_REGION') or None,
+            'access_key': os.getenv('S3_ACCESS_KEY'),
+            'secret_key': os.getenv('S3_SECRET_KEY'),
+            'default_acl': 'private',
+            'file_overwrite': False,
+            'querystring_auth': True,
+            'signature_version': 's3v4',
+            'querystring_expire': int(os.getenv('S3_PRESIGNED_URL_TTL', '300')),
+            'transfer_config': TransferConfig(
+                multipart_threshold=int(os.getenv('S3_MULTIPART_THRESHOLD_MB', '8')) * 1024 * 1024,
+                multipart_chunksize=int(os.getenv('S3_MULTIPART_CHUNK_MB', '8')) * 1024 * 1024,
+            ),
+        },
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -139,11 +287,63 @@ AUTH_USER_MODEL = 'authentication.User'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.TokenAuthentication',
-    )
+    ),
+    # orjson is used when installed (orjson extra), same output as DRF's JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 LOGIN_REDIRECT_URL = 'index' 
 LOGOUT_REDIRECT_URL = 'index'
 LOGIN_URL = 'login'
 
+
+# Registry
+
+# Delta downloads: a delta is served only when it's at most this fraction of the full archive
+DELTA_MAX_RATIO = float(os.getenv("DELTA_MAX_RATIO", "0.5"))
+
+# Lifetime of the in-process dependency graph used by the resolve endpoint (also invalidated on publish/delete)
+DEPENDENCY_GRAPH_TTL = int(os.getenv("DEPENDENCY_GRAPH_TTL", "300"))
+
+# Publish responses are replayed for retries carrying the same Idempotency-Key during this many hours
+PUBLISH_IDEMPOTENCY_TTL = int(os.getenv("PUBLISH_IDEMPOTENCY_TTL", "24"))
+# A retry overlapping the first request waits this many seconds for its response (then gets a 409)
+PUBLISH_IDEMPOTENCY_WAIT = int(os.getenv("PUBLISH_IDEMPOTENCY_WAIT", "30"))
+
+# Search suggestions: in-process prefix index, rebuilt when older than the TTL (new publishes are added right away)
+SUGGEST_INDEX_TTL = int(os.getenv("SUGGEST_INDEX_TTL", "300"))
+SUGGEST_MAX_RESULTS = int(os.getenv("SUGGEST_MAX_RESULTS", "10"))
+
+# Edge (CDN) caching of the anonymous HTML pages, purged by surrogate key on publish, yank and delete.
+# EDGE_PURGER: core.edge.LocalPurger (no CDN, purges are only logged) or core.edge.FastlyPurger
+EDGE_CACHE_TTL = int(os.getenv("EDGE_CACHE_TTL", "3600"))  # 0 disables the edge caching headers
+EDGE_BROWSER_TTL = int(os.getenv("EDGE_BROWSER_TTL", "60"))
+EDGE_PURGER = os.getenv("EDGE_PURGER", "core.edge.LocalPurger")
+EDGE_FASTLY_SERVICE_ID = os.getenv("EDGE_FASTLY_SERVICE_ID", "")
+EDGE_FASTLY_API_TOKEN = os.getenv("EDGE_FASTLY_API_TOKEN", "")
+
+# Request tracing (core/tracing.py): every request is traced, only the slow and sampled ones are exported.
+# TRACING_EXPORTERS: core.tracing.DatabaseExporter (admin "Slow requests"), FileExporter, OTLPExporter
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "False") == "True"
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.01"))
+TRACING_SLOW_MS = float(os.getenv("TRACING_SLOW_MS", "500"))
+TRACING_MAX_SPANS = int(os.getenv("TRACING_MAX_SPANS", "200"))
+TRACING_EXPORTERS = os.getenv("TRACING_EXPORTERS", "core.tracing.DatabaseExporter").split()
+TRACING_FILE = os.getenv("TRACING_FILE", str(BASE_DIR / "traces.jsonl"))
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "aegis")
+TRACING_RETENTION_DAYS = int(os.getenv("TRACING_RETENTION_DAYS", "7"))
+
+# Archive contents index (PackageFileEntry): files indexed per archive, files shown in the detail page tree
+ARCHIVE_INDEX_MAX_ENTRIES = int(os.getenv("ARCHIVE_INDEX_MAX_ENTRIES", "10000"))
+# Index published archives on a background thread (False: right after the publish commits, in the request)
+ARCHIVE_INDEX_BACKGROUND = os.getenv("ARCHIVE_INDEX_BACKGROUND", "True") == "True"
+FILE_TREE_MAX_ENTRIES = int(os.getenv("FILE_TREE_MAX_ENTRIES", "300"))
+
+# Extra platform compatibility edges, JSON: {"macos/arm64": ["macos/x86_64"]} (see packages/platforms.py)
+PLATFORM_FALLBACKS = json.loads(os.getenv("PLATFORM_FALLBACKS", "{}"))
+
 from core.unfold import *
@@ -0,0 +1,32 @@
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .compression import COMPRESSIBLE_EXTENSIONS, compressed_variants
+
+
+class CompressedStaticFilesStorage(StaticFilesStorage):
+    """
+    Writes `.gz` (and `.br` when brotli is installed) files next to the collected static files,
+    so the front server (nginx `gzip_static` / `brotli_static`) serves them without recompressing.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        parent = getattr(super(), 'post_process', None)
+        if parent is not None:
+            yield from parent(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        for name in paths:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+
+            with self.open(name) as f:
+                data = f.read()
+
+            for suffix, compressed in compressed_variants(data):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+                yield name, name + suffix, True
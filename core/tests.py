@@ -0,0 +1,429 @@
+import hashlib
+import io
+import os
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, List
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished
+from django.db import connections, router
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from authentication.models import User
+from core import db_metrics, edge, tracing, warmup
+from core.management.commands.profile_startup import Command as ProfileStartup
+from core.management.commands.trace_collector import Command as TraceCollector
+from core.middleware import CompressionMiddleware, PrimaryPinningMiddleware
+from core.models import RequestTrace
+from core.paginator import EstimatedCountPaginator
+from core.routers import ReplicaRouter, pin_to_primary
+from packages import suggest
+from packages.models import Package
+
+
+def routed_view(request: HttpRequest) -> HttpResponse:
+    """Reports the alias the reads of the request were routed to, after an optional write."""
+    if request.GET.get('write') == 'background':
+        # Routing of the download counter UPDATE of an anonymous GET
+        router.db_for_write(Package)
+    elif request.GET.get('write') == 'pin':
+        pin_to_primary()
+    return HttpResponse(Package.objects.all().db)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = PrimaryPinningMiddleware(routed_view)
+
+    def request(self, method: str = 'get', pinned: bool = False, **params: str) -> HttpResponse:
+        request = getattr(self.factory, method)('/', params)
+        if pinned:
+            request.COOKIES['use_primary'] = '1'
+        return self.middleware(request)
+
+    def test_reads_go_to_the_replica(self):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            list(Package.objects.all())
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(Package.objects.all().db, 'replica')
+        self.assertEqual(Package.objects.select_for_update().db, 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replica(self):
+        response = self.request('post')
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn('use_primary', response.cookies)
+
+    def test_anonymous_get(self):
+        response = self.request()
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn('use_primary', response.cookies)
+
+    def test_background_write_does_not_pin(self):
+        response = self.request(write='background')
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn('use_primary', response.cookies)
+
+    def test_unsafe_request_pins(self):
+        response = self.request('post')
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(response.cookies['use_primary']['max-age'], 5)
+
+    def test_pinned_client_reads_primary(self):
+        response = self.request(pinned=True)
+        self.assertEqual(response.content, b'default')
+        # Reading doesn't extend the window
+        self.assertNotIn('use_primary', response.cookies)
+
+    def test_write_while_pinned_extends_the_window(self):
+        response = self.request('post', pinned=True)
+        self.assertEqual(response.cookies['use_primary']['max-age'], 5)
+
+    def test_explicit_pin(self):
+        response = self.request(write='pin')
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(response.cookies['use_primary']['max-age'], 5)
+
+    def test_pin_does_not_leak_to_the_next_request(self):
+        self.request('post')
+        self.assertEqual(self.request().content, b'replica')
+
+    def test_migrations_only_run_on_the_primary(self):
+        router = ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'packages'))
+        self.assertFalse(router.allow_migrate('replica', 'packages'))
+        with self.settings(DATABASE_MIGRATE_REPLICAS=True):
+            self.assertTrue(router.allow_migrate('replica', 'packages'))
+
+
+class DbMetricsTests(TestCase):
+    def setUp(self):
+        db_metrics.reset()
+        self.addCleanup(db_metrics.reset)
+
+    def test_connections_per_request(self):
+        self.assertEqual(db_metrics.snapshot()['connections_per_request'], 0.0)
+        connection_created.send(sender=None, connection=connections['default'])
+        for _ in range(4):
+            request_finished.send(sender=None)
+        self.assertEqual(
+            db_metrics.snapshot(), {'connections_opened': 1, 'requests': 4, 'connections_per_request': 0.25}
+        )
+        db_metrics.reset()
+        self.assertEqual(db_metrics.snapshot()['requests'], 0)
+
+
+class DbBenchmarkTests(TransactionTestCase):
+    """Real WSGI requests, which open and close connections: TransactionTestCase."""
+
+    def setUp(self):
+        for alias in connections:
+            max_age = connections[alias].settings_dict['CONN_MAX_AGE']
+            self.addCleanup(connections[alias].settings_dict.__setitem__, 'CONN_MAX_AGE', max_age)
+        self.addCleanup(db_metrics.reset)
+
+    def test_persistent_connections_are_reused(self):
+        out = io.StringIO()
+        call_command('db_benchmark', requests=5, url='/api/packages/', stdout=out)
+        lines = out.getvalue().splitlines()
+        churn = [float(line.rsplit('connections/request=', 1)[1]) for line in lines if 'connections/request=' in line]
+        # A connection per request (or more, one per alias used), then none
+        self.assertEqual(len(churn), 2)
+        self.assertGreaterEqual(churn[0], 1)
+        self.assertEqual(churn[1], 0.0)
+        self.assertIn("Latency saved per request", out.getvalue())
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author', email='author@example.com')
+        Package.objects.bulk_create([Package(name=f'pkg{i}', author=author) for i in range(5)])
+
+    def estimate(self, vendor: str, row: Any) -> Any:
+        """Estimated count of the Package table on a `vendor` database whose statistics hold `row`."""
+        backend = mock.MagicMock(vendor=vendor)
+        backend.cursor.return_value.__enter__.return_value.fetchone.return_value = row
+        with mock.patch('core.paginator.connections', {'default': backend}):
+            return EstimatedCountPaginator(Package.objects.using('default').order_by('pk'), 2).estimated_count()
+
+    def test_table_statistics(self):
+        self.assertEqual(self.estimate('postgresql', (250000,)), 250000)
+        self.assertEqual(self.estimate('mysql', (250000,)), 250000)
+        # Never analyzed (PostgreSQL reltuples = -1), unknown table, unsupported backend
+        for vendor, row in (('postgresql', (-1,)), ('postgresql', None), ('mysql', (None,)), ('oracle', (1,))):
+            self.assertIsNone(self.estimate(vendor, row), vendor)
+
+    def test_exact_count_fallback(self):
+        # SQLite has no table statistics
+        self.assertEqual(EstimatedCountPaginator(Package.objects.order_by('pk'), 2).count, 5)
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count', return_value=250000):
+            self.assertEqual(EstimatedCountPaginator(Package.objects.order_by('pk'), 2).count, 250000)
+        # Small table: the estimate may be stale, the exact count is cheap
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count', return_value=40):
+            self.assertEqual(EstimatedCountPaginator(Package.objects.order_by('pk'), 2).count, 5)
+
+        # Filtered or distinct querysets are always counted exactly
+        for queryset in (Package.objects.filter(name__startswith='pkg1').order_by('pk'), Package.objects.distinct().order_by('pk')):
+            self.assertIsNone(EstimatedCountPaginator(queryset, 2).estimated_count())
+        self.assertEqual(EstimatedCountPaginator(Package.objects.filter(name='pkg1').order_by('pk'), 2).count, 1)
+
+    def test_admin_changelist(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', email='admin@example.com', password='x'))
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count', return_value=250000) as estimated_count:
+            response = self.client.get('/admin/packages/package/')
+        self.assertEqual(response.status_code, 200)
+        estimated_count.assert_called()
+        self.assertEqual(response.context['cl'].result_count, 250000)
+
+
+class WarmupTests(TransactionTestCase):
+    """warm_up() closes every connection when done: TransactionTestCase."""
+
+    def test_primes_the_process_caches(self):
+        with mock.patch.object(suggest, '_index', None):
+            timings = warmup.warm_up()
+            self.assertIsNotNone(suggest._index)
+        self.assertEqual(list(timings), [name for name, _ in warmup.STEPS])
+
+    def test_failing_step_is_skipped(self):
+        after = mock.Mock()
+        steps = [('database', mock.Mock(side_effect=OSError("connection refused"))), ('after', after)]
+        with mock.patch.object(warmup, 'STEPS', steps), mock.patch.object(warmup, 'connections') as connections_:
+            with self.assertLogs('core.warmup', 'WARNING') as logs:
+                timings = warmup.warm_up()
+        after.assert_called_once_with()
+        self.assertEqual(list(timings), ['database', 'after'])
+        self.assertIn("Warm-up step 'database' failed", logs.output[0])
+        # Nothing inherited by forked workers
+        connections_.close_all.assert_called_once_with()
+
+
+class ProfileStartupTests(SimpleTestCase):
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       412 |       1045 |   django.urls\n"
+            "unrelated line\n"
+            "import time:        30 |         30 | core\n"
+        )
+        self.assertEqual(ProfileStartup._parse_importtime(stderr), [('django.urls', 412, 1045), ('core', 30, 30)])
+
+    def test_boot_in_a_fresh_interpreter(self):
+        out = io.StringIO()
+        call_command('profile_startup', limit=3, stdout=out)
+        output = out.getvalue()
+        for heading in ("Boot phases (wsgi)", "Import cost per top-level package", "Slowest modules"):
+            self.assertIn(heading, output)
+        self.assertRegex(output, r"\d+ modules imported, [\d.]+ms spent in imports\.")
+
+    def test_boot_failure(self):
+        failed = subprocess.CompletedProcess(args=[], returncode=1, stdout='', stderr='ImproperlyConfigured: ...')
+        with mock.patch('core.management.commands.profile_startup.subprocess.run', return_value=failed):
+            with self.assertRaisesMessage(CommandError, 'ImproperlyConfigured'):
+                call_command('profile_startup', stdout=io.StringIO())
+
+
+@override_settings(COMPRESSION_CACHE_TIMEOUT=60)
+class CompressionCacheTests(TestCase):
+    body = b'<html>' + b'registry ' * 200 + b'</html>'
+
+    def setUp(self):
+        cache.clear()
+        self.middleware = CompressionMiddleware(lambda request: HttpResponse(self.body, content_type='text/html'))
+
+    def get(self, **extra: str) -> HttpResponse:
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip', **extra)
+        return self.middleware(request)
+
+    def cached(self) -> bool:
+        return cache.get(f'compressed:gzip:{hashlib.blake2b(self.body, digest_size=20).hexdigest()}') is not None
+
+    def test_anonymous_response_is_cached(self):
+        first, second = self.get(), self.get()
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertTrue(self.cached())
+        self.assertEqual(first.content, second.content)
+
+    def test_session_response_is_not_cached(self):
+        response = self.get(HTTP_COOKIE='sessionid=abc')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(self.cached())
+
+    def test_authenticated_api_response_is_not_cached(self):
+        self.get(HTTP_AUTHORIZATION='Token abc')
+        self.assertFalse(self.cached())
+
+
+class SlowPurger(edge.BasePurger):
+    """A CDN API taking its time to answer."""
+
+    purged: List[List[str]] = []
+    release = threading.Event()
+
+    def purge(self, keys: List[str]) -> None:
+        self.release.wait(5)
+        self.purged.append(keys)
+
+
+@override_settings(EDGE_PURGER='core.tests.SlowPurger')
+class EdgePurgeTests(TestCase):
+    def setUp(self):
+        edge.get_purger.cache_clear()
+        self.addCleanup(edge.get_purger.cache_clear)
+        SlowPurger.purged = []
+        SlowPurger.release.clear()
+
+    def test_purge_does_not_wait_for_the_cdn(self):
+        started = time.monotonic()
+        with self.captureOnCommitCallbacks(execute=True):
+            edge.purge(['package-a', 'index'])
+            edge.purge(['package-b', 'index'])
+        self.assertLess(time.monotonic() - started, 1)
+
+        SlowPurger.release.set()
+        edge.flush()
+        # Purges queued while the CDN answered are sent together
+        self.assertEqual({key for keys in SlowPurger.purged for key in keys}, {'index', 'package-a', 'package-b'})
+
+    def test_purger_must_implement_purge(self):
+        with self.assertRaises(TypeError):
+            edge.BasePurger()
+
+
+class RecordingExporter(tracing.BaseExporter):
+    exported: List[tracing.TraceData] = []
+
+    def export(self, traces: List[tracing.TraceData]) -> None:
+        self.exported.extend(traces)
+
+
+def traced_view(request: HttpRequest) -> HttpResponse:
+    with tracing.span('list packages', source='test'):
+        list(Package.objects.all())
+    return HttpResponse('ok')
+
+
+@override_settings(TRACING_ENABLED=True, TRACING_EXPORTERS=['core.tests.RecordingExporter'],
+                   TRACING_SLOW_MS=60_000, TRACING_SAMPLE_RATE=0, TRACING_MAX_SPANS=200)
+class TracingTests(TestCase):
+    def setUp(self):
+        tracing.get_exporters.cache_clear()
+        self.addCleanup(tracing.get_exporters.cache_clear)
+        RecordingExporter.exported = []
+        self.middleware = tracing.TracingMiddleware(traced_view)
+
+    def request(self, **headers: str) -> HttpResponse:
+        response = self.middleware(RequestFactory().get('/traced/', **headers))
+        tracing.flush()
+        return response
+
+    def test_fast_request_is_not_exported(self):
+        response = self.request()
+        self.assertEqual(len(response['X-Trace-Id']), 32)
+        self.assertEqual(RecordingExporter.exported, [])
+
+    @override_settings(TRACING_SLOW_MS=0)
+    def test_slow_request_is_exported_with_its_spans(self):
+        response = self.request()
+        [trace] = RecordingExporter.exported
+        self.assertEqual((trace['trace_id'], trace['reason'], trace['status_code']), (response['X-Trace-Id'], 'slow', 200))
+        spans = {s['name']: s for s in trace['spans']}
+        self.assertEqual(spans['list packages']['attributes'], {'source': 'test'})
+        # The query is a child of the span it ran in
+        self.assertEqual(spans['db']['parent_id'], spans['list packages']['span_id'])
+        self.assertEqual(spans['list packages']['parent_id'], trace['root_span_id'])
+
+    @override_settings(TRACING_SAMPLE_RATE=1)
+    def test_sampled_request_is_exported(self):
+        self.request()
+        self.assertEqual([trace['reason'] for trace in RecordingExporter.exported], ['sampled'])
+
+    def test_sampled_caller_is_followed(self):
+        trace_id, parent_id = 'a' * 32, 'b' * 16
+        response = self.request(HTTP_TRACEPARENT=f'00-{trace_id}-{parent_id}-01')
+        self.assertEqual(response['X-Trace-Id'], trace_id)
+        [trace] = RecordingExporter.exported
+        root = next(s for s in trace['spans'] if s['span_id'] == trace['root_span_id'])
+        self.assertEqual(root['parent_id'], parent_id)
+
+        RecordingExporter.exported = []
+        self.request(HTTP_TRACEPARENT=f'00-{trace_id}-{parent_id}-00')
+        self.assertEqual(RecordingExporter.exported, [])
+
+    @override_settings(TRACING_SLOW_MS=0, TRACING_MAX_SPANS=2)
+    def test_spans_over_the_limit_are_dropped(self):
+        self.request()
+        [trace] = RecordingExporter.exported
+        self.assertEqual(len(trace['spans']), 2)
+        self.assertEqual(trace['dropped_spans'], 1)
+
+    def test_span_outside_of_a_trace_is_a_noop(self):
+        with tracing.span('untraced') as s:
+            s.set('key', 'value')
+        self.assertIs(s, tracing.NOOP_SPAN)
+
+    def test_exporter_must_implement_export(self):
+        with self.assertRaises(TypeError):
+            tracing.BaseExporter()
+
+
+class TraceStorageTests(TestCase):
+    def trace(self, started_at: datetime, **fields: Any) -> tracing.TraceData:
+        return {
+            'trace_id': os.urandom(16).hex(), 'name': 'GET package-latest', 'root_span_id': 'a' * 16,
+            'start_unix_nano': int(started_at.timestamp() * 1e9), 'duration_ms': 812.5, 'dropped_spans': 0,
+            'method': 'GET', 'path': '/api/packages/aegis/latest/', 'route': 'package-latest',
+            'status_code': 200, 'reason': 'slow',
+            'spans': [
+                {'span_id': 'a' * 16, 'parent_id': None, 'name': 'GET package-latest', 'offset_ms': 0,
+                 'duration_ms': 812.5, 'attributes': {'http.status_code': 200}, 'error': None},
+                {'span_id': 'b' * 16, 'parent_id': 'a' * 16, 'name': 'db', 'offset_ms': 1.5,
+                 'duration_ms': 800, 'attributes': {'sql': 'SELECT 1'}, 'error': 'OperationalError'},
+            ],
+            **fields,
+        }
+
+    @override_settings(TRACING_RETENTION_DAYS=7)
+    def test_database_exporter_prunes_old_traces(self):
+        now = datetime.now(dt_timezone.utc)
+        exporter = tracing.DatabaseExporter()
+        exporter.prune_every = 2
+        exporter.export([self.trace(now - timedelta(days=8))])
+        self.assertEqual(RequestTrace.objects.count(), 1)
+
+        exporter.export([self.trace(now)])
+        self.assertEqual(list(RequestTrace.objects.values_list('started_at__date', flat=True)), [now.date()])
+
+    def test_admin_page(self):
+        stored = RequestTrace.from_trace(self.trace(datetime.now(dt_timezone.utc)))
+        stored.save()
+        self.client.force_login(User.objects.create_superuser(username='admin', email='admin@example.com', password='x'))
+
+        changelist = self.client.get('/admin/core/requesttrace/')
+        self.assertContains(changelist, '812.5 ms')
+        change = self.client.get(f'/admin/core/requesttrace/{stored.pk}/change/')
+        self.assertContains(change, 'db (OperationalError)')
+        self.assertContains(change, 'title="SELECT 1"')
+
+    def test_trace_collector_prints_otlp_payloads(self):
+        payload = tracing.to_otlp([self.trace(datetime.now(dt_timezone.utc))])
+        spans = payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual([s['kind'] for s in spans], [2, 1])
+        self.assertEqual(spans[1]['status'], {'code': 2, 'message': 'OperationalError'})
+
+        out = io.StringIO()
+        TraceCollector(stdout=out).print_payload(payload)
+        self.assertIn("GET package-latest", out.getvalue())
+        self.assertIn("812.5ms  1 span(s), 1 query", out.getvalue())
@@ -0,0 +1,342 @@
+"""
+Lightweight request tracing.
+
+TracingMiddleware records a trace for every request when TRACING_ENABLED: the request itself,
+the spans opened with `span()` / `@traced` (view stages, service layer) and one span per SQL query.
+Recording is a few perf_counter calls per span; the trace is kept (sampled) only when
+- the request took at least TRACING_SLOW_MS (every slow request is kept), or
+- it falls in the TRACING_SAMPLE_RATE random sample, or the caller's `traceparent` says it's sampled.
+Kept traces are handed to a background thread which calls the TRACING_EXPORTERS
+(database for the "Slow requests" admin page, JSON lines file, OTLP/HTTP collector).
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from contextlib import ExitStack
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import HttpRequest, HttpResponse
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('core.tracing')
+
+TraceData = Dict[str, Any]
+F = TypeVar('F', bound=Callable[..., Any])
+
+_current: ContextVar[Optional["Trace"]] = ContextVar('current_trace', default=None)
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, trace: "Trace", name: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id: Optional[str] = None
+        self.attributes = attributes
+        self.start_ns = self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        stack = self.trace.stack
+        self.parent_id = stack[-1].span_id if stack else self.trace.parent_id
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.end_ns = time.perf_counter_ns()
+        self.trace.stack.pop()
+        self.trace.spans.append(self)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+
+
+class _NoopSpan:
+    """Returned by span() outside of a trace: same interface, does nothing."""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    def __init__(self, trace_id: Optional[str] = None, parent_id: Optional[str] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.parent_id = parent_id  # Span of the caller (traceparent), if any
+        self.start_unix_ns = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+        self.stack: List[Span] = []
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def to_dict(self, root: Span, **fields: Any) -> TraceData:
+        """Serializable form shared by the exporters (offsets and durations in ms from the trace start)."""
+        return {
+            'trace_id': self.trace_id,
+            'name': root.name,
+            'root_span_id': root.span_id,
+            'start_unix_nano': self.start_unix_ns,
+            'duration_ms': round((root.end_ns - root.start_ns) / 1e6, 3),
+            'dropped_spans': self.dropped,
+            **fields,
+            'spans': [
+                {
+                    'span_id': s.span_id,
+                    'parent_id': s.parent_id,
+                    'name': s.name,
+                    'offset_ms': round((s.start_ns - self.start_ns) / 1e6, 3),
+                    'duration_ms': round((s.end_ns - s.start_ns) / 1e6, 3),
+                    'attributes': s.attributes,
+                    'error': s.error,
+                }
+                for s in sorted(self.spans, key=lambda s: s.start_ns)
+            ],
+        }
+
+
+def span(name: str, **attributes: Any):
+    """`with span('match file', os=...) as s:` times a stage of the current request (no-op when untraced)."""
+    trace = _current.get()
+    if trace is None:
+        return NOOP_SPAN
+    if len(trace.spans) + len(trace.stack) >= settings.TRACING_MAX_SPANS:
+        trace.dropped += 1
+        return NOOP_SPAN
+    return Span(trace, name, attributes)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator version of span(), for the service layer."""
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+
+def _trace_query(execute: Callable, sql: str, params: Any, many: bool, context: Dict[str, Any]) -> Any:
+    with span('db', alias=context['connection'].alias, sql=sql[:500], many=many):
+        return execute(sql, params, many, context)
+
+
+def parse_traceparent(header: str) -> Optional[Dict[str, Any]]:
+    """W3C trace context: `00-<trace id>-<parent span id>-<flags>`."""
+    parts = header.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return {'trace_id': parts[1], 'parent_id': parts[2], 'sampled': bool(flags & 1)}
+
+
+class TracingMiddleware:
+    """Traces the request (see the module docstring); the trace id is returned in X-Trace-Id."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.TRACING_ENABLED:
+            return self.get_response(request)
+
+        parent = parse_traceparent(request.headers.get('traceparent', ''))
+        trace = Trace(parent['trace_id'], parent['parent_id']) if parent else Trace()
+        token = _current.set(trace)
+        root = Span(trace, f'{request.method} {request.path}', {'http.method': request.method})
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_trace_query))
+                with root:
+                    response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        match = request.resolver_match
+        route = match.view_name if match else ''
+        root.name = f'{request.method} {route or request.path}'
+        root.attributes.update({'http.target': request.path, 'http.status_code': response.status_code})
+        response.headers['X-Trace-Id'] = trace.trace_id
+
+        duration_ms = (root.end_ns - root.start_ns) / 1e6
+        if duration_ms >= settings.TRACING_SLOW_MS:
+            reason = 'slow'
+        elif (parent and parent['sampled']) or random.random() < settings.TRACING_SAMPLE_RATE:
+            reason = 'sampled'
+        else:
+            return response
+
+        export(trace.to_dict(
+            root, method=request.method, path=request.path, route=route,
+            status_code=response.status_code, reason=reason,
+        ))
+        return response
+
+
+# --- Exporters ----------------------------------------------------------------
+
+class BaseExporter(ABC):
+    """Receives the kept traces in batches, on the background export thread."""
+
+    @abstractmethod
+    def export(self, traces: List[TraceData]) -> None:
+        ...
+
+
+class DatabaseExporter(BaseExporter):
+    """Stores the traces for the "Slow requests" admin page, older than TRACING_RETENTION_DAYS are pruned."""
+
+    prune_every = 100
+
+    def __init__(self):
+        self.exported = 0
+
+    def export(self, traces: List[TraceData]) -> None:
+        from core.models import RequestTrace
+
+        RequestTrace.objects.bulk_create([RequestTrace.from_trace(trace) for trace in traces])
+        self.exported += len(traces)
+        if self.exported >= self.prune_every:
+            self.exported = 0
+            limit = datetime.now(dt_timezone.utc) - timedelta(days=settings.TRACING_RETENTION_DAYS)
+            RequestTrace.objects.filter(started_at__lt=limit).delete()
+
+
+class FileExporter(BaseExporter):
+    """One JSON object per line in TRACING_FILE."""
+
+    def export(self, traces: List[TraceData]) -> None:
+        with open(settings.TRACING_FILE, 'a') as f:
+            for trace in traces:
+                f.write(json.dumps(trace, default=str) + '\n')
+
+
+class OTLPExporter(BaseExporter):
+    """OTLP/HTTP with the JSON encoding, to a collector (or `trace_collector`) at TRACING_OTLP_ENDPOINT."""
+
+    timeout = 5
+
+    def export(self, traces: List[TraceData]) -> None:
+        request = urllib.request.Request(
+            settings.TRACING_OTLP_ENDPOINT,
+            data=json.dumps(to_otlp(traces)).encode(),
+            method='POST',
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(traces: List[TraceData]) -> Dict[str, Any]:
+    spans = []
+    for trace in traces:
+        for s in trace['spans']:
+            start = trace['start_unix_nano'] + int(s['offset_ms'] * 1e6)
+            otlp_span = {
+                'traceId': trace['trace_id'],
+                'spanId': s['span_id'],
+                'name': s['name'],
+                'kind': 2 if s['span_id'] == trace['root_span_id'] else 1,  # SERVER / INTERNAL
+                'startTimeUnixNano': str(start),
+                'endTimeUnixNano': str(start + int(s['duration_ms'] * 1e6)),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in s['attributes'].items()],
+            }
+            if s['parent_id']:
+                otlp_span['parentSpanId'] = s['parent_id']
+            if s['error']:
+                otlp_span['status'] = {'code': 2, 'message': s['error']}
+            spans.append(otlp_span)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': settings.TRACING_SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': 'core.tracing'}, 'spans': spans}],
+    }]}
+
+
+# --- Background export --------------------------------------------------------
+
+_queue: "queue.Queue[TraceData]" = queue.Queue(maxsize=1000)
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+EXPORT_BATCH_SIZE = 50
+
+
+@functools.lru_cache(maxsize=None)
+def get_exporters() -> List[BaseExporter]:
+    return [import_string(path)() for path in settings.TRACING_EXPORTERS]
+
+
+def export(trace: TraceData) -> None:
+    """Queues a trace for the exporters; dropped when the queue is full (the request never waits)."""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_export_loop, name='trace-exporter', daemon=True)
+                _worker.start()
+    try:
+        _queue.put_nowait(trace)
+    except queue.Full:
+        logger.warning("trace queue full, trace %s dropped", trace['trace_id'])
+
+
+def flush(timeout: float = 5.0) -> None:
+    """Waits until the queued traces are exported (tests, management commands)."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _export_loop() -> None:
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < EXPORT_BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        for exporter in get_exporters():
+            try:
+                exporter.export(batch)
+            except Exception:
+                logger.exception("%s failed to export %d trace(s)", type(exporter).__name__, len(batch))
+        close_old_connections()
+        for _ in batch:
+            _queue.task_done()
@@ -57,6 +57,18 @@ UNFOLD = {
                         "link": reverse_lazy("admin:packages_packagefile_changelist")
                     }
                 ]
+            },
+            {
+                "title": "Monitoring",
+                "separator": True,
+                "collapsible": True,
+                "items": [
+                    {
+                        "title": "Slow requests",
+                        "icon": "speed",
+                        "link": reverse_lazy("admin:core_requesttrace_changelist")
+                    }
+                ]
             }
         ]
     }
@@ -1,20 +1,24 @@
-from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from packages.api_views import PackageViewSet
+from packages.api_views import AuthorViewSet, PackageViewSet
 
 router = DefaultRouter()
 router.register(r"packages", PackageViewSet)
+router.register(r"authors", AuthorViewSet, basename="author")
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     path('', include('packages.urls')),
     path('auth/', include('authentication.urls'))
 ]
 
+if settings.ENABLE_ADMIN:
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     
\ No newline at end of file
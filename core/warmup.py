@@ -0,0 +1,78 @@
+import logging
+import time
+from typing import Callable, Dict, List, Tuple
+
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger('core.warmup')
+
+# Templates of the public pages, compiled once by the cached loader
+WARMUP_TEMPLATES = [
+    'layout.html',
+    'index.html',
+    'packages/list.html',
+    'packages/detail.html',
+    'partials/package_card.html',
+]
+
+
+def _urlconf() -> None:
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict  # Remplit les tables de reverse() pour tous les namespaces
+
+
+def _templates() -> None:
+    for name in WARMUP_TEMPLATES:
+        get_template(name)
+
+
+def _dependency_graph() -> None:
+    from packages.resolver import get_graph
+    get_graph()
+
+
+def _suggest_index() -> None:
+    from packages.suggest import get_index
+    get_index()
+
+
+def _markdown() -> None:
+    # Importe markdown et pygments (codehilite), chargés paresseusement sinon au premier README
+    from packages.services import PackageService
+    PackageService.render_markdown("```python\nprint('warm-up')\n```")
+
+
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ('urlconf', _urlconf),
+    ('templates', _templates),
+    ('markdown', _markdown),
+    ('dependency graph', _dependency_graph),
+    ('suggest index', _suggest_index),
+]
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Primes the per-process caches before the worker accepts traffic.
+    A failing step (database not reachable yet...) is logged and skipped, it never blocks the boot.
+    Returns the duration of each step in milliseconds.
+    """
+    timings: Dict[str, float] = {}
+    try:
+        for name, step in STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                logger.warning("Warm-up step '%s' failed", name, exc_info=True)
+            timings[name] = (time.perf_counter() - start) * 1000
+    finally:
+        # Avec gunicorn --preload le warm-up tourne dans le master :
+        # aucune connexion ne doit être héritée par les workers après le fork
+        connections.close_all()
+
+    logger.info("Warm-up done in %.0fms", sum(timings.values()))
+    return timings
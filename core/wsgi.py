@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Optional warm-up before the worker accepts traffic (runs once in the master with gunicorn --preload)
+from django.conf import settings
+
+if settings.WARMUP_ON_BOOT:
+    from core.warmup import warm_up
+    warm_up()
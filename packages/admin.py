@@ -1,5 +1,7 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin, TabularInline
+from unfold.contrib.filters.admin import AutocompleteSelectFilter, RangeDateFilter
+from core.paginator import EstimatedCountPaginator
 from .models import Package, PackageVersion, PackageFile
 
 
@@ -8,6 +10,8 @@ class PackageFileInline(TabularInline):
     model = PackageFile
     extra = 1  # Propose une ligne vide par défaut pour uploader un fichier
     tab = True # Optionnel Unfold : rend l'inline plus joli
+    per_page = 20  # Pagine les fichiers au lieu de tous les charger
+    ordering = ["-uploaded_at"]
     fields = ["file", "os", "architecture", "uploaded_at"]
     readonly_fields = ["uploaded_at"]
 
@@ -17,27 +21,46 @@ class PackageVersionInline(TabularInline):
     model = PackageVersion
     extra = 0
     tab = True
+    per_page = 20
     show_change_link = True 
     fields = ["version_number", "created_at"]
     readonly_fields = ["created_at"]
 
 
+# Les tables de packages peuvent contenir des centaines de milliers de lignes :
+# - jointures faites en une requête (list_select_related)
+# - clés étrangères en autocomplete plutôt qu'en <select> de toute la table
+# - comptage estimé et pas de second COUNT(*) pour le "total" non filtré
+class LargeTableAdmin(ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_filter_submit = True
+
+
 @admin.register(Package)
-class PackageAdmin(ModelAdmin):
+class PackageAdmin(LargeTableAdmin):
     list_display = ["name", "author", "description", "created_at"]
+    list_select_related = ["author"]
+    ordering = ["-updated_at"]
     search_fields = ["name", "author__username"]
+    autocomplete_fields = ["author"]
     inlines = [PackageVersionInline]
 
 
 @admin.register(PackageVersion)
-class PackageVersionAdmin(ModelAdmin):
+class PackageVersionAdmin(LargeTableAdmin):
     list_display = ["package", "version_number", "created_at"]
-    list_filter = ["package", "created_at"]
+    list_select_related = ["package"]
+    list_filter = [("package", AutocompleteSelectFilter), ("created_at", RangeDateFilter)]
     search_fields = ["package__name", "version_number"]
+    autocomplete_fields = ["package"]
     inlines = [PackageFileInline]
 
 
 @admin.register(PackageFile)
-class PackageFileAdmin(ModelAdmin):
+class PackageFileAdmin(LargeTableAdmin):
     list_display = ["version__package", "version__version_number", "os", "architecture", "uploaded_at"]
-    
\ No newline at end of file
+    list_select_related = ["version__package"]
+    list_filter = ["os", "architecture", ("uploaded_at", RangeDateFilter)]
+    search_fields = ["version__package__name", "version__version_number"]
+    autocomplete_fields = ["version"]
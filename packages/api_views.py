@@ -1,14 +1,43 @@
-import zipfile
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.core.files.storage import default_storage
 from django.http import HttpRequest
-from django.db.models import F
-from typing import Optional
+from django.shortcuts import get_object_or_404
+from typing import Any, Dict, Optional
+import hashlib
+
+from authentication.models import User
+from core.tracing import span
+from . import indexing
+from .archives import InvalidArchive, inspect_archive
+from .deltas import find_delta
+from .models import Package, PackageVersion, PackageFile, PackageOS, PackageArch, Dependency, PublishIdempotencyKey, compute_sha256
+from .platforms import asset_type, rank_files
+from .resolver import PackageNotFound, ResolutionError, resolve, select_files
+from .serializers import (
+    PackageSerializer, PackageUploadSerializer, ResolveSerializer, LockfileSerializer, VersionStatusSerializer,
+    serialize_packages
+)
+from .services import PackageService
+from .suggest import add_suggestion, find_suggestions
+
+
+IDEMPOTENCY_KEY_MAX_LENGTH = PublishIdempotencyKey._meta.get_field('key').max_length
+PROVIDES_DEFAULT_LIMIT = 50
+PROVIDES_MAX_LIMIT = 200
+
+
+class DependentsPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
 
-from .models import Package, PackageVersion, PackageFile, PackageOS, PackageArch
-from .serializers import PackageSerializer, PackageUploadSerializer
 
 class PackageViewSet(viewsets.ModelViewSet):
     queryset = Package.objects.all()
@@ -17,88 +46,190 @@ class PackageViewSet(viewsets.ModelViewSet):
 
     parser_classes = (MultiPartParser, FormParser)
 
+    def initial(self, request: HttpRequest, *args, **kwargs) -> None:
+        # Authentication, permissions and throttling
+        with span('drf.initial'):
+            super().initial(request, *args, **kwargs)
+
+    def get_object(self) -> Package:
+        with span('get_object'):
+            return super().get_object()
+
+    def list(self, request: HttpRequest, *args, **kwargs) -> Response:
+        """Same payload as ModelViewSet.list, built from `.values()` rows (see serialize_packages)."""
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        return Response(serialize_packages(queryset))
+
+    def retrieve(self, request: HttpRequest, *args, **kwargs) -> Response:
+        """Same payload as ModelViewSet.retrieve; get_object() runs the lookup and the object permission checks."""
+        package = self.get_object()
+        return Response(serialize_packages(Package.objects.filter(pk=package.pk))[0])
+
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def publish(self, request: HttpRequest) -> Response:
         """
         Endpoint global de publication.
         Crée le paquet s'il n'existe pas.
         Ajoute une version s'il existe.
+        Re-uploading a file already published for the platform answers 200 when the archive is
+        identical and 409 when it differs, so CI jobs can retry safely.
+        An `Idempotency-Key` header makes a retry replay the first response.
         """
         serializer = PackageUploadSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
+        target_os = data.get('os', PackageOS.ANY)
+        target_arch = data.get('architecture', PackageArch.ANY)
+        with span('hash upload', size=data['file'].size):
+            digest = compute_sha256(data['file'])
+
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key is None:
+            return self._publish(request, data, target_os, target_arch, digest)
+
+        if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response({"error": "Idempotency-Key is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = hashlib.sha256(
+            '\n'.join([data['name'], data['version'], target_os, target_arch, digest]).encode()
+        ).hexdigest()
+        previous = PackageService.claim_idempotency_key(request.user, idempotency_key, fingerprint)
+        if previous is not None:
+            if previous.fingerprint != fingerprint:
+                return Response(
+                    {"error": "Idempotency-Key already used for a different upload"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if previous.status_code is None:
+                return Response(
+                    {"error": "A publish with this Idempotency-Key is still in progress"},
+                    status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'}
+                )
+            return Response(previous.response, status=previous.status_code, headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            response = self._publish(request, data, target_os, target_arch, digest)
+        except BaseException:
+            PackageService.release_idempotency_key(request.user, idempotency_key)
+            raise
+        # Les erreurs de validation ne sont pas mémorisées : le client peut corriger et réessayer
+        if response.status_code < 400 or response.status_code == status.HTTP_409_CONFLICT:
+            PackageService.save_idempotent_response(request.user, idempotency_key, response.status_code, response.data)
+        else:
+            PackageService.release_idempotency_key(request.user, idempotency_key)
+        return response
+
+    def _publish(self, request: HttpRequest, data: Dict[str, Any], target_os: str, target_arch: str, digest: str) -> Response:
         package_name = data['name']
 
+        # 0. ARCHIVE METADATA (README + manifest), validated before writing anything
+        try:
+            with span('inspect archive'):
+                archive = inspect_archive(data['file'])
+        except InvalidArchive as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # 1. GET OR CREATE PACKAGE
         # On essaie de récupérer le paquet, ou on le crée avec l'utilisateur courant comme auteur
-        package, created = Package.objects.get_or_create(
-            name=package_name,
-            defaults={
-                'author': request.user,
-                'description': data.get('description', '')
-            }
-        )
+        # (get_or_create rattrape l'IntegrityError si un autre upload l'a créé en même temps)
+        with span('get or create package'):
+            package, created = Package.objects.get_or_create(
+                name=package_name,
+                defaults={
+                    'author': request.user,
+                    'description': data.get('description', '')
+                }
+            )
 
         # 2. VÉRIFICATION DE SÉCURITÉ
         # Si le paquet existait déjà, on vérifie que c'est bien le bon auteur
-        if not created and package.author != request.user:
+        if not created and package.author_id != request.user.pk:
             return Response(
                 {"error": f"You are not the author of '{package_name}'."}, 
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # 3. GESTION DE LA VERSION (Identique à avant)
-        version, ver_created = PackageVersion.objects.get_or_create(
-            package=package,
-            version_number=data['version']
-        )
+        # 3. GESTION DE LA VERSION
+        # Version and dependencies are committed together: a concurrent upload of another
+        # platform waits on the unique index, then sees the version with its dependencies
+        with span('get or create version'), transaction.atomic():
+            version, ver_created = PackageVersion.objects.get_or_create(
+                package=package,
+                version_number=data['version']
+            )
+
+            # Dependencies are declared once per version (the first uploaded platform wins)
+            if ver_created and archive.dependencies:
+                Dependency.objects.bulk_create([
+                    Dependency(version=version, name=dep_name, requirement=requirement)
+                    for dep_name, requirement in archive.dependencies.items()
+                ])
+
+        # The dependency graph is invalidated by the post_save signal of the version
+        if ver_created and archive.dependencies:
+            PackageService.refresh_dependents_count(archive.dependencies)
 
         # Extraction README (si besoin)
-        if ver_created or not version.readme:
-            readme_content = self._extract_readme_from_zip(data['file'])
-            if readme_content:
-                version.readme = readme_content
-                version.save()
+        if (ver_created or not version.readme) and archive.readme:
+            version.readme = archive.readme
+            version.save(update_fields=['readme'])
 
-        # 4. GESTION DU FICHIER (Identique à avant)
-        target_os = data.get('os', PackageOS.ANY)
-        target_arch = data.get('architecture', PackageArch.ANY)
+        # A new package may already be required by others
+        if created:
+            PackageService.refresh_dependents_count([package_name])
+            add_suggestion(package_name)
 
-        if PackageFile.objects.filter(version=version, os=target_os, architecture=target_arch).exists():
-            return Response({
-                "error": f"File for {target_os}/{target_arch} already exists in v{data['version']}"
-            }, status=status.HTTP_409_CONFLICT)
-
-        PackageFile.objects.create(
-            version=version,
-            file=data['file'],
-            os=target_os,
-            architecture=target_arch
+        # 4. GESTION DU FICHIER
+        package_file, file_created = PackageService.store_package_file(
+            version, data['file'], target_os, target_arch, digest
         )
-        
-        # Update timestamp
-        package.save()
+        if not file_created:
+            if package_file.sha256 != digest:
+                return Response({
+                    "error": f"File for {target_os}/{target_arch} already exists in v{data['version']} with a different digest",
+                    "sha256": package_file.sha256,
+                }, status=status.HTTP_409_CONFLICT)
+            # Même archive : l'upload est un doublon (retry CI), rien à écrire
+            return Response({
+                "status": "Already published",
+                "package": package_name,
+                "version": data['version'],
+                "sha256": digest,
+            }, status=status.HTTP_200_OK)
+
+        # The contents index reads the whole archive: built after the response (see indexing.py)
+        indexing.schedule(package_file)
+
+        # Update timestamp (only: counters may have moved since the package was loaded)
+        package.save(update_fields=['updated_at'])
+        # The dependencies' pages show their dependents count
+        PackageService.purge_pages([package_name, *(archive.dependencies if ver_created else ())])
 
         action_msg = "Package created and published" if created else "New version published"
         return Response({
             "status": action_msg,
             "package": package_name,
-            "version": data['version']
+            "version": data['version'],
+            "sha256": digest,
         }, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=["get"])
     def latest(self, request: HttpRequest, name: Optional[str] = None) -> Response:
         """
         Retrieves the download URL for the latest version.
-        Accepts ?os=...&architecture=... to target a specific binary.
+        Accepts ?os=...&architecture=... to target a specific binary,
+        and ?from=<installed version> to also get a delta archive when one is available.
         Increments download counts.
         """
         package: Package = self.get_object()
         
-        # 1. Find latest version
-        latest_version: PackageVersion = package.versions.order_by('-created_at').first()
+        # 1. Find latest version (yanked versions are skipped)
+        with span('find latest version'):
+            latest_version: PackageVersion = package.versions.filter(is_yanked=False).order_by('-created_at').first()
         if not latest_version:
             return Response({"error": "No versions found"}, status=status.HTTP_404_NOT_FOUND)
         
@@ -108,20 +239,13 @@ class PackageViewSet(viewsets.ModelViewSet):
 
         # 3. Resolution Strategy
         
-        # A. Exact Match (Optimized Binary)
-        target_file = PackageFile.objects.filter(
-            version=latest_version, 
-            os=req_os, 
-            architecture=req_arch
-        ).first()
-
-        # B. Fallback: Source Code (Any/Any)
-        if not target_file:
-            target_file = PackageFile.objects.filter(
-                version=latest_version,
-                os=PackageOS.ANY,
-                architecture=PackageArch.ANY
-            ).first()
+        # Best compatible asset in one query: exact match, then the fallback chain down to the source (any/any)
+        with span('match file', os=req_os, architecture=req_arch) as matching:
+            target_file = rank_files(
+                PackageFile.objects.filter(version=latest_version), req_os, req_arch
+            ).order_by('platform_rank').first()
+            if target_file:
+                matching.set('rank', target_file.platform_rank)
         
         # C. Total Failure
         if not target_file:
@@ -130,49 +254,257 @@ class PackageViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_404_NOT_FOUND)
         
         # --- STATS INCREMENT ---
-        # We use F expressions to avoid race conditions
-        Package.objects.filter(pk=package.pk).update(download_count=F('download_count') + 1)
-        PackageVersion.objects.filter(pk=latest_version.pk).update(download_count=F('download_count') + 1)
-        PackageFile.objects.filter(pk=target_file.pk).update(download_count=F('download_count') + 1)
+        PackageService.record_download(package, latest_version, target_file)
 
         # 4. Response
-        return Response({
+        with span('build_absolute_uri'):
+            url = request.build_absolute_uri(target_file.file.url)
+        payload = {
             "version": latest_version.version_number,
-            "url": request.build_absolute_uri(target_file.file.url),
-            "asset_type": "binary" if target_file.os != PackageOS.ANY else "source"
+            "url": url,
+            "asset_type": asset_type(target_file),
+            "os": target_file.os,
+            "architecture": target_file.architecture,
+        }
+        if latest_version.is_deprecated:
+            payload["deprecated"] = latest_version.deprecation_message or "deprecated"
+
+        # 5. Upgrade: offer the delta from the installed version when it's small enough
+        from_version = request.query_params.get('from')
+        if from_version and from_version != latest_version.version_number:
+            with span('find delta'):
+                delta = find_delta(target_file, from_version, settings.DELTA_MAX_RATIO)
+            if delta:
+                payload["delta"] = {
+                    "from": from_version,
+                    "url": request.build_absolute_uri(delta.file.url),
+                    "size": delta.size,
+                }
+
+        return Response(payload)
+
+    @action(detail=False, methods=["get"], authentication_classes=[], permission_classes=[permissions.AllowAny])
+    def suggest(self, request: HttpRequest) -> Response:
+        """
+        Search box autocomplete: /api/packages/suggest/?prefix=ht&limit=10
+        Served from the in-process prefix index (no database query), most downloaded first.
+        """
+        try:
+            limit = max(int(request.query_params.get('limit', settings.SUGGEST_MAX_RESULTS)), 1)
+        except ValueError:
+            return Response({"error": "'limit' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        prefix = request.query_params.get('prefix', '')
+        return Response({
+            "prefix": prefix,
+            "suggestions": [
+                {"name": name, "download_count": downloads}
+                for name, downloads in find_suggestions(prefix, limit)
+            ],
         })
 
-    def _extract_readme_from_zip(self, uploaded_file) -> Optional[str]:
+    @action(detail=False, methods=["get"])
+    def provides(self, request: HttpRequest) -> Response:
         """
-        Helper method to open the uploaded zip and find a README file.
-        Returns the content string or None.
+        Which packages ship a file, from the archive contents index (no archive is opened).
+        One of ?path=src/http/client.aeg (exact), ?prefix=src/http/ or ?name=client.aeg, and &limit=50.
         """
+        lookups = {key: request.query_params.get(key, '').strip() for key in ('path', 'prefix', 'name')}
+        if sum(1 for value in lookups.values() if value) != 1:
+            return Response({"error": "Give exactly one of 'path', 'prefix' or 'name'"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            # We must verify it's a valid zip
-            if not zipfile.is_zipfile(uploaded_file):
-                return None
-            
-            with zipfile.ZipFile(uploaded_file, 'r') as z:
-                # Look for files containing 'readme' (case insensitive)
-                # We prioritize root files, but accept nested ones if needed
-                for filename in z.namelist():
-                    if "readme" in filename.lower() and (filename.endswith('.md') or filename.endswith('.txt')):
-                        
-                        # Read and decode
-                        with z.open(filename) as f:
-                            content = f.read().decode('utf-8', errors='ignore')
-                            
-                        # Important: Reset file pointer for the subsequent save() model call
-                        uploaded_file.seek(0)
-                        return content
-                        
-            # Reset pointer even if nothing found
-            uploaded_file.seek(0)
-        except Exception as e:
-            print(f"Error extracting readme: {e}")
-            # Ensure pointer is reset in case of error
-            uploaded_file.seek(0)
-            return None
-        
-        return None
-    
\ No newline at end of file
+            limit = min(max(int(request.query_params.get('limit', PROVIDES_DEFAULT_LIMIT)), 1), PROVIDES_MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "'limit' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            **{key: value for key, value in lookups.items() if value},
+            "results": PackageService.find_providers(limit=limit, **lookups),
+        })
+
+    @action(detail=True, methods=["get"])
+    def contents(self, request: HttpRequest, name: Optional[str] = None) -> Response:
+        """
+        File listing of an archive, served from the contents index:
+        ?version=1.2.3 (latest by default) and ?os=...&architecture=... (same fallback chain as `latest`).
+        """
+        package: Package = self.get_object()
+        version_number = request.query_params.get('version')
+        versions = package.versions.all()
+        version = (versions.filter(version_number=version_number) if version_number else
+                   versions.filter(is_yanked=False).order_by('-created_at')).first()
+        if not version:
+            return Response({"error": "Version not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        req_os = request.query_params.get('os', PackageOS.ANY)
+        req_arch = request.query_params.get('architecture', PackageArch.ANY)
+        package_file = rank_files(PackageFile.objects.filter(version=version), req_os, req_arch).order_by('platform_rank').first()
+        if not package_file:
+            return Response({
+                "error": f"No compatible asset found for {req_os}/{req_arch} in version {version.version_number}"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "version": version.version_number,
+            "os": package_file.os,
+            "architecture": package_file.architecture,
+            # Fresh archives are listed once indexed in the background (see indexing.py)
+            "indexed": package_file.indexed_at is not None,
+            "files": PackageService.get_file_listing(package_file),
+        })
+
+    @action(detail=False, methods=["post"], parser_classes=[JSONParser])
+    def resolve(self, request: HttpRequest) -> Response:
+        """
+        Resolves the full transitive closure of a set of dependencies in one request.
+        Body: {"dependencies": {"http": "^1.2.0"}, "os": "linux", "architecture": "x86_64"}
+        Returns the packages in install order (dependencies first) with their download URL.
+        Increments download counts.
+        """
+        serializer = ResolveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        try:
+            nodes = resolve(data['dependencies'])
+        except PackageNotFound as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except ResolutionError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        files = select_files(nodes, data['os'], data['architecture'])
+        missing = [f"{node.package} v{node.version}" for node in nodes if node.id not in files]
+        if missing:
+            return Response({
+                "error": f"No compatible asset found for {data['os']}/{data['architecture']} in {', '.join(missing)}"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        PackageService.record_downloads(list(files.values()))
+
+        packages = []
+        for node in nodes:
+            entry = {
+                "name": node.package,
+                "version": node.version,
+                "url": request.build_absolute_uri(files[node.id].file.url),
+                "asset_type": asset_type(files[node.id]),
+                "os": files[node.id].os,
+                "architecture": files[node.id].architecture,
+                "dependencies": node.dependencies,
+            }
+            # Only present when relevant, to keep the payload compact
+            if node.yanked:
+                entry["yanked"] = True
+            if node.deprecation:
+                entry["deprecated"] = node.deprecation
+            packages.append(entry)
+
+        return Response({"packages": packages})
+
+    @action(detail=False, methods=["post"], parser_classes=[JSONParser])
+    def verify(self, request: HttpRequest) -> Response:
+        """
+        Verifies a whole lockfile in one request.
+        Body: {"entries": [{"name", "version", "os", "architecture", "digest"}, ...]}
+        Returns a verdict per entry (same order) and its download URL when the file exists.
+        """
+        serializer = LockfileSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        verdicts = PackageService.verify_lockfile(serializer.validated_data['entries'])
+        for verdict in verdicts:
+            file_name = verdict.pop('file', None)
+            if file_name:
+                verdict['url'] = request.build_absolute_uri(default_storage.url(file_name))
+
+        summary = Counter(verdict['status'] for verdict in verdicts)
+        return Response({
+            "ok": summary["ok"] == len(verdicts),
+            "summary": summary,
+            "entries": verdicts,
+        })
+
+    @action(detail=True, methods=["get"])
+    def dependents(self, request: HttpRequest, name: Optional[str] = None) -> Response:
+        """
+        Paginated list of the packages depending on this one (?page=N).
+        """
+        package: Package = self.get_object()
+        queryset = PackageService.get_dependents(package).order_by('-download_count', 'name')
+
+        paginator = DependentsPagination()
+        page = paginator.paginate_queryset(queryset.values(
+            'name', 'description', 'download_count', 'dependents_count'
+        ), request, view=self)
+        return paginator.get_paginated_response(page)
+
+    @action(detail=True, methods=["post"], parser_classes=[JSONParser], permission_classes=[permissions.IsAuthenticated])
+    def yank(self, request: HttpRequest, name: Optional[str] = None) -> Response:
+        """
+        Yanks a version: {"version": "1.2.3", "reason": "..."}.
+        Default resolution skips it, exact pins (lockfiles) still download it.
+        """
+        return self._update_version_status(request, yank=True)
+
+    @action(detail=True, methods=["post"], parser_classes=[JSONParser], permission_classes=[permissions.IsAuthenticated])
+    def unyank(self, request: HttpRequest, name: Optional[str] = None) -> Response:
+        return self._update_version_status(request, yank=False)
+
+    @action(detail=True, methods=["post"], parser_classes=[JSONParser], permission_classes=[permissions.IsAuthenticated])
+    def deprecate(self, request: HttpRequest, name: Optional[str] = None) -> Response:
+        """
+        Deprecates a version: {"version": "1.2.3", "reason": "use 2.x"}.
+        Send {"version": "1.2.3", "undo": true} to remove the deprecation.
+        """
+        return self._update_version_status(request, deprecate=True)
+
+    def _update_version_status(self, request: HttpRequest, yank: Optional[bool] = None, deprecate: bool = False) -> Response:
+        package: Package = self.get_object()
+        if package.author != request.user:
+            return Response(
+                {"error": f"You are not the author of '{package.name}'."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        serializer = VersionStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        version = package.versions.filter(version_number=data['version']).first()
+        if not version:
+            return Response({"error": f"Version {data['version']} not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if deprecate:
+            PackageService.set_deprecated(version, not data['undo'], data['reason'])
+        else:
+            PackageService.set_yanked(version, yank, data['reason'])
+
+        return Response({
+            "package": package.name,
+            "version": version.version_number,
+            "yanked": version.is_yanked,
+            "deprecated": version.is_deprecated,
+        })
+
+
+class AuthorViewSet(viewsets.ViewSet):
+    """
+    Public stats of an author: /api/authors/<username>/?days=30
+    Totals, daily downloads and latest version of each package, in a constant number of queries.
+    """
+    lookup_field = 'username'
+    lookup_value_regex = '[^/]+'
+
+    MAX_DAYS = 365
+
+    def retrieve(self, request: HttpRequest, username: Optional[str] = None) -> Response:
+        author = get_object_or_404(User, username=username)
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), self.MAX_DAYS)
+        except ValueError:
+            return Response({"error": "'days' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(PackageService.get_author_stats(author, days))
+
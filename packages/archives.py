@@ -0,0 +1,132 @@
+"""
+Reads the metadata of an uploaded package archive (zip) in a single pass:
+README content and the dependencies declared in the `aegis.toml` manifest.
+`list_archive` reads its file listing (path, size, SHA-256) for the contents index.
+
+Manifest format:
+
+    [dependencies]
+    http = "^1.2.0"
+    json = "*"
+"""
+import hashlib
+import re
+import tomllib
+import zipfile
+from dataclasses import dataclass, field
+from typing import IO, Dict, List, Optional
+
+from .resolver import parse_requirement
+
+MANIFEST_NAME = 'aegis.toml'
+DEPENDENCY_NAME_REGEX = re.compile(r'^[a-z0-9_]+$')
+
+
+class InvalidArchive(ValueError):
+    """The archive is readable but its manifest is invalid."""
+
+
+@dataclass
+class ArchiveEntry:
+    path: str
+    size: int
+    sha256: str
+
+
+@dataclass
+class ArchiveInfo:
+    readme: Optional[str] = None
+    dependencies: Dict[str, str] = field(default_factory=dict)
+
+
+def inspect_archive(uploaded_file: IO[bytes]) -> ArchiveInfo:
+    """
+    Extracts the README and the manifest dependencies.
+    Unreadable zips yield an empty ArchiveInfo (same leniency as before for the README),
+    an invalid manifest raises InvalidArchive.
+    The file pointer is always reset for the subsequent save() model call.
+    """
+    info = ArchiveInfo()
+    try:
+        if not zipfile.is_zipfile(uploaded_file):
+            return info
+
+        with zipfile.ZipFile(uploaded_file, 'r') as z:
+            names = z.namelist()
+
+            # Look for files containing 'readme' (case insensitive)
+            for filename in names:
+                if "readme" in filename.lower() and (filename.endswith('.md') or filename.endswith('.txt')):
+                    with z.open(filename) as f:
+                        info.readme = f.read().decode('utf-8', errors='ignore')
+                    break
+
+            # Manifest at the root, or in the top-level folder of the archive
+            manifests = sorted(
+                (name for name in names if name == MANIFEST_NAME or name.endswith('/' + MANIFEST_NAME)),
+                key=lambda name: name.count('/'),
+            )
+            if manifests:
+                with z.open(manifests[0]) as f:
+                    info.dependencies = _parse_dependencies(f.read())
+    except zipfile.BadZipFile:
+        return info
+    finally:
+        uploaded_file.seek(0)
+
+    return info
+
+
+def _parse_dependencies(raw: bytes) -> Dict[str, str]:
+    try:
+        manifest = tomllib.loads(raw.decode('utf-8'))
+    except (UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        raise InvalidArchive(f"Invalid {MANIFEST_NAME}: {e}")
+
+    dependencies = manifest.get('dependencies', {})
+    if not isinstance(dependencies, dict):
+        raise InvalidArchive(f"[dependencies] in {MANIFEST_NAME} must be a table.")
+
+    parsed: Dict[str, str] = {}
+    for name, requirement in dependencies.items():
+        if not DEPENDENCY_NAME_REGEX.match(name):
+            raise InvalidArchive(f"Invalid dependency name '{name}'.")
+        if not isinstance(requirement, str):
+            raise InvalidArchive(f"Dependency '{name}' must be a version requirement string.")
+        requirement = requirement.strip() or '*'
+        try:
+            parse_requirement(requirement)
+        except ValueError as e:
+            raise InvalidArchive(f"Dependency '{name}': {e}")
+        parsed[name] = requirement
+    return parsed
+
+
+def list_archive(uploaded_file: IO[bytes], max_entries: int, max_path_length: int) -> List[ArchiveEntry]:
+    """
+    File listing of the archive (directories are implied by the paths), at most `max_entries`
+    entries; paths longer than `max_path_length` are skipped. Unreadable zips yield an empty list.
+    The file pointer is reset afterwards, like inspect_archive.
+    """
+    entries: List[ArchiveEntry] = []
+    try:
+        if not zipfile.is_zipfile(uploaded_file):
+            return entries
+
+        with zipfile.ZipFile(uploaded_file, 'r') as z:
+            for info in z.infolist():
+                if info.is_dir() or len(info.filename) > max_path_length:
+                    continue
+                if len(entries) >= max_entries:
+                    break
+                digest = hashlib.sha256()
+                with z.open(info) as f:
+                    while chunk := f.read(64 * 1024):
+                        digest.update(chunk)
+                entries.append(ArchiveEntry(path=info.filename, size=info.file_size, sha256=digest.hexdigest()))
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, RuntimeError):
+        return []  # Archive corrompue, chiffrée ou compression non supportée : pas d'index
+    finally:
+        uploaded_file.seek(0)
+
+    return entries
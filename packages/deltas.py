@@ -0,0 +1,116 @@
+"""
+Per-entry zip deltas between two versions of a package archive.
+
+A delta is itself a zip archive containing:
+- every entry that was added or modified in the target archive,
+- a `.aegis-delta.json` manifest listing the removed entries.
+
+Applying it: extract the source archive, delete the `removed` paths,
+then extract the delta (minus the manifest) on top of it.
+Entries are compared on their CRC32 and size from the zip central directory,
+so unchanged entries are never decompressed.
+"""
+import io
+import json
+import zipfile
+from typing import IO, Dict, Optional
+
+from django.core.files.base import ContentFile
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import PackageFile, PackageFileDelta
+
+MANIFEST_NAME = '.aegis-delta.json'
+DELTA_FORMAT = 1
+
+
+def build_zip_delta(source: IO[bytes], target: IO[bytes], from_version: str, to_version: str) -> bytes:
+    """Returns the delta archive upgrading `source` into `target`."""
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(source) as source_zip, zipfile.ZipFile(target) as target_zip:
+        source_entries: Dict[str, zipfile.ZipInfo] = {
+            info.filename: info for info in source_zip.infolist() if not info.is_dir()
+        }
+        target_entries: Dict[str, zipfile.ZipInfo] = {
+            info.filename: info for info in target_zip.infolist() if not info.is_dir()
+        }
+
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as delta_zip:
+            for name, info in target_entries.items():
+                previous = source_entries.get(name)
+                if previous and previous.CRC == info.CRC and previous.file_size == info.file_size:
+                    continue
+                delta_zip.writestr(info, target_zip.read(info), compress_type=zipfile.ZIP_DEFLATED)
+
+            removed = sorted(name for name in source_entries if name not in target_entries)
+            delta_zip.writestr(MANIFEST_NAME, json.dumps({
+                'format': DELTA_FORMAT,
+                'from': from_version,
+                'to': to_version,
+                'removed': removed,
+            }))
+
+    return buffer.getvalue()
+
+
+def get_previous_file(target: PackageFile) -> Optional[PackageFile]:
+    """The same package/os/architecture asset in the version published just before."""
+    return PackageFile.objects.filter(
+        version__package_id=target.version.package_id,
+        os=target.os,
+        architecture=target.architecture,
+        version__created_at__lt=target.version.created_at,
+    ).select_related('version').order_by('-version__created_at').first()
+
+
+def get_pending_files() -> QuerySet[PackageFile]:
+    """Files build_deltas hasn't handled yet."""
+    return PackageFile.objects.filter(delta_checked_at__isnull=True).select_related('version').order_by('pk')
+
+
+def build_delta_for(target: PackageFile) -> Optional[PackageFileDelta]:
+    """
+    Builds and stores the delta from the previous version of `target`, then marks the file as checked.
+    Returns None when there is no previous version or when the delta isn't smaller than the full archive
+    (the file is marked too: it isn't read again on the next run).
+    """
+    delta = _build_delta(target)
+    PackageFile.objects.filter(pk=target.pk).update(delta_checked_at=timezone.now())
+    return delta
+
+
+def _build_delta(target: PackageFile) -> Optional[PackageFileDelta]:
+    source = get_previous_file(target)
+    if source is None:
+        return None
+    # Built by a run interrupted before marking the file
+    existing = PackageFileDelta.objects.filter(source=source, target=target).first()
+    if existing is not None:
+        return existing
+
+    with source.file.open('rb') as source_blob, target.file.open('rb') as target_blob:
+        content = build_zip_delta(
+            source_blob, target_blob,
+            source.version.version_number, target.version.version_number,
+        )
+
+    if len(content) >= target.size:
+        return None
+
+    delta = PackageFileDelta(source=source, target=target, size=len(content))
+    name = f"{target.version.package_id}-{source.version.version_number}-{target.version.version_number}-{target.os}-{target.architecture}.zip"
+    delta.file.save(name, ContentFile(content), save=False)
+    delta.save()
+    return delta
+
+
+def find_delta(target: PackageFile, from_version: str, max_ratio: float) -> Optional[PackageFileDelta]:
+    """Delta from `from_version` to `target`, only when it's worth downloading instead of the full archive."""
+    delta = PackageFileDelta.objects.filter(
+        target=target, source__version__version_number=from_version
+    ).first()
+    if delta is None or delta.size > target.size * max_ratio:
+        return None
+    return delta
@@ -0,0 +1,78 @@
+"""
+Archive contents indexing, off the publish request.
+
+A published file stays unindexed (indexed_at NULL) until its listing is indexed by
+PackageService.index_package_file: once the publish is committed, the file is queued for a background
+thread which reads the blob back from the storage. Files whose indexing was lost (queue full, process
+stopped, storage error) are picked up by the `index_archives` command.
+With ARCHIVE_INDEX_BACKGROUND = False the file is indexed right after the commit, in the request
+(tests, single-process development).
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from core.routers import read_from_primary
+from .models import PackageFile
+from .services import PackageService
+
+logger = logging.getLogger('packages.indexing')
+
+_queue: "queue.Queue[int]" = queue.Queue(maxsize=1000)
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def schedule(package_file: PackageFile) -> None:
+    """Indexes the archive of `package_file` once the current transaction is committed."""
+    if settings.ARCHIVE_INDEX_BACKGROUND:
+        transaction.on_commit(lambda: _enqueue(package_file.pk))
+    else:
+        transaction.on_commit(lambda: index(package_file.pk))
+
+
+def index(file_id: int) -> None:
+    package_file = PackageFile.objects.filter(pk=file_id).first()
+    if package_file is None or package_file.indexed_at is not None:
+        return  # Deleted or indexed since
+    with package_file.file.open('rb') as blob:
+        PackageService.index_package_file(package_file, blob)
+
+
+def _enqueue(file_id: int) -> None:
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_index_loop, name='archive-indexer', daemon=True)
+                _worker.start()
+    try:
+        _queue.put_nowait(file_id)
+    except queue.Full:
+        logger.warning("archive index queue full, PackageFile #%s left to index_archives", file_id)
+
+
+def flush(timeout: float = 10.0) -> None:
+    """Waits until the queued files are indexed (tests, management commands)."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _index_loop() -> None:
+    # The files were just committed: a lagging replica may not have them yet
+    read_from_primary()
+    while True:
+        file_id = _queue.get()
+        try:
+            index(file_id)
+        except Exception:
+            logger.exception("indexing PackageFile #%s failed, left to index_archives", file_id)
+        finally:
+            close_old_connections()
+            _queue.task_done()
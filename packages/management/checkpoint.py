@@ -0,0 +1,31 @@
+import json
+import os
+from typing import Any, Dict
+
+
+class CheckpointMixin:
+    """
+    JSON checkpoint of a resumable management command, stored in the file given by its
+    `--checkpoint` option (no file: the run can't be resumed, nothing is written).
+    """
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        path = self.options['checkpoint']
+        if path and os.path.exists(path):
+            with open(path) as f:
+                checkpoint = json.load(f)
+            self.stdout.write(f"Resuming from checkpoint {path}")
+            return checkpoint
+        return {}
+
+    def _save_checkpoint(self) -> None:
+        path = self.options['checkpoint']
+        if path:
+            with open(path, 'w') as f:
+                json.dump(self.checkpoint, f)
+
+    def _clear_checkpoint(self) -> None:
+        # A complete run starts from scratch next time
+        path = self.options['checkpoint']
+        if path and os.path.exists(path):
+            os.remove(path)
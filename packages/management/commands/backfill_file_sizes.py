@@ -0,0 +1,43 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from packages.models import PackageFile, RegistryStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the size of the files published before sizes were stored (one storage call per blob). "
+        "Keyset-paginated; an interrupted run resumes where it stopped since sized files are skipped. "
+        "Blobs that can't be read are left at 0 and reported by reconcile_storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Files loaded per query.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        files = PackageFile.objects.filter(size=0).only('id', 'file')
+
+        last_pk = 0
+        sized = failed = 0
+        while True:
+            batch = list(files.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+            if not batch:
+                break
+            added = 0
+            for package_file in batch:
+                try:
+                    size = package_file.file.size
+                except (OSError, ValueError) as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"{package_file.file.name}: {e}"))
+                    continue
+                PackageFile.objects.filter(pk=package_file.pk).update(size=size)
+                added += size
+                sized += 1
+            # These files were counted with a size of 0 in total_bytes
+            RegistryStats.bump(total_bytes=added)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"{sized} file(s) sized")
+
+        self.stdout.write(self.style.SUCCESS(f"\n{sized} file(s) sized, {failed} unreadable."))
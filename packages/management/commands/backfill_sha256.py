@@ -0,0 +1,40 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from packages.models import PackageFile, compute_sha256
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes the SHA-256 of the archives published before digests were stored (reads every such blob). "
+        "Keyset-paginated; an interrupted run resumes where it stopped since hashed files are skipped. "
+        "Blobs that can't be read are left blank and reported by reconcile_storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Files loaded per query.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        files = PackageFile.objects.filter(sha256='').only('id', 'file')
+
+        last_pk = 0
+        hashed = failed = 0
+        while True:
+            batch = list(files.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+            if not batch:
+                break
+            for package_file in batch:
+                try:
+                    with package_file.file.open('rb') as blob:
+                        digest = compute_sha256(blob)
+                except OSError as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"{package_file.file.name}: {e}"))
+                    continue
+                PackageFile.objects.filter(pk=package_file.pk).update(sha256=digest)
+                hashed += 1
+            last_pk = batch[-1].pk
+            self.stdout.write(f"{hashed} archive(s) hashed")
+
+        self.stdout.write(self.style.SUCCESS(f"\n{hashed} archive(s) hashed, {failed} unreadable."))
@@ -0,0 +1,44 @@
+import zipfile
+from datetime import timedelta
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from packages.deltas import build_delta_for, get_pending_files
+
+
+class Command(BaseCommand):
+    help = "Builds the per-entry zip deltas between consecutive versions (meant to run from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=int, default=7, help="Only files uploaded in the last N days (0 = all).")
+        parser.add_argument('--package', help="Restrict to one package name.")
+        parser.add_argument('--limit', type=int, default=0, help="Stop after N deltas built (0 = no limit).")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        files = get_pending_files()
+        if options['since']:
+            files = files.filter(uploaded_at__gte=timezone.now() - timedelta(days=options['since']))
+        if options['package']:
+            files = files.filter(version__package__name=options['package'])
+
+        built = skipped = 0
+        for target in files.iterator(chunk_size=200):
+            try:
+                delta = build_delta_for(target)
+            except (OSError, zipfile.BadZipFile) as e:
+                # Missing or corrupted blob: reported, the other files are still processed
+                self.stderr.write(self.style.ERROR(f"{target}: {e}"))
+                continue
+
+            if delta is None:
+                skipped += 1
+                continue
+
+            built += 1
+            self.stdout.write(f"{delta}: {delta.size} bytes (full archive: {target.size} bytes)")
+            if options['limit'] and built >= options['limit']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"{built} delta(s) built, {skipped} file(s) skipped (no previous version or delta not smaller)."))
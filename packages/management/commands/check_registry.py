@@ -0,0 +1,220 @@
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import (
+    BooleanField, ExpressionWrapper, F, IntegerField, Max, OuterRef, Q, QuerySet, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from packages.archives import InvalidArchive, inspect_archive
+from packages.management.checkpoint import CheckpointMixin
+from packages.models import Package, PackageFile, PackageVersion, RegistryStats
+from packages.services import PackageService
+
+Row = Dict[str, Any]
+
+# The admin saves a package before its inline versions: a few ms of lag are not drift
+UPDATED_AT_TOLERANCE = timedelta(minutes=1)
+
+
+def files_downloads() -> Coalesce:
+    """Sum of the file counters of the version `OuterRef('pk')`."""
+    total = (
+        PackageFile.objects.filter(version=OuterRef('pk'))
+        .values('version').annotate(total=Sum('download_count')).values('total')
+    )
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def versions_downloads() -> Coalesce:
+    """Sum of the version counters of the package `OuterRef('pk')`."""
+    total = (
+        PackageVersion.objects.filter(package=OuterRef('pk')).order_by()
+        .values('package').annotate(total=Sum('download_count')).values('total')
+    )
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+class Command(CheckpointMixin, BaseCommand):
+    help = (
+        "Checks the denormalized data of the registry in keyset-paginated batches: "
+        "download counters (file <= version <= package), package updated_at vs its versions, "
+        "dependents counts, registry stats and, with --readmes, missing READMEs. "
+        "Report only unless --repair is given; resumable with --checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows checked per query.")
+        parser.add_argument('--repair', action='store_true', help="Fix the inconsistencies found.")
+        parser.add_argument('--readmes', action='store_true',
+                            help="Also open the archive of the versions without README (reads blobs).")
+        parser.add_argument('--checkpoint', help="JSON file used to resume an interrupted run.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.options = options
+        self.checkpoint: Dict[str, Any] = self._load_checkpoint()
+        # Saved with the checkpoint: the drift found before an interruption is still reported on resume
+        self.issues: Dict[str, int] = self.checkpoint.setdefault('issues', {})
+
+        # Des fichiers vers les paquets : une version réparée est prise en compte par la passe des paquets
+        passes: List[Tuple[str, Callable[[], None]]] = [
+            ('versions', self._check_versions),
+            ('packages', self._check_packages),
+            ('stats', self._check_stats),
+        ]
+        for name, check in passes:
+            if self.checkpoint.get(f'{name}_done'):
+                continue
+            check()
+            self.checkpoint[f'{name}_done'] = True
+            self._save_checkpoint()
+
+        self._clear_checkpoint()
+
+        total = sum(self.issues.values())
+        summary = ", ".join(f"{kind}={count}" for kind, count in sorted(self.issues.items()))
+        if not total:
+            self.stdout.write(self.style.SUCCESS("\nThe registry is consistent."))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f"\n{total} inconsistency(ies) repaired: {summary}."))
+        else:
+            raise CommandError(f"{total} inconsistency(ies) found ({summary}), run with --repair to fix them.")
+
+    # --- Passes -------------------------------------------------------------
+
+    def _check_versions(self) -> None:
+        """
+        A version counts at least the downloads of its files (a deleted file keeps its downloads
+        in the version total). With --readmes, versions without README are re-read from their archive.
+        """
+        queryset = PackageVersion.objects.annotate(
+            files_downloads=files_downloads(),
+            missing_readme=ExpressionWrapper(Q(readme=''), output_field=BooleanField()),
+        ).values('pk', 'package__name', 'version_number', 'download_count', 'files_downloads', 'missing_readme')
+
+        def check(rows: List[Row]) -> None:
+            behind = [row for row in rows if row['download_count'] < row['files_downloads']]
+            for row in behind:
+                self._report('version_downloads', f"{row['package__name']} v{row['version_number']}: "
+                             f"download_count={row['download_count']} < files total={row['files_downloads']}")
+            if behind and self.options['repair']:
+                PackageVersion.objects.filter(pk__in=[row['pk'] for row in behind]).update(
+                    download_count=Greatest(F('download_count'), files_downloads())
+                )
+
+            if self.options['readmes']:
+                self._check_readmes([row for row in rows if row['missing_readme']])
+
+        self._paginate('versions', queryset, check)
+
+    def _check_readmes(self, rows: List[Row]) -> None:
+        """The README is extracted at publish time from the first uploaded archive containing one."""
+        files = PackageFile.objects.filter(version__in=[row['pk'] for row in rows]).order_by('version', 'pk')
+        names = {row['pk']: f"{row['package__name']} v{row['version_number']}" for row in rows}
+        found = set()
+        for package_file in files.only('pk', 'version', 'file'):
+            if package_file.version_id in found:
+                continue
+            try:
+                with package_file.file.open('rb') as blob:
+                    readme = inspect_archive(blob).readme
+            except (OSError, InvalidArchive):
+                continue  # Blob manquant ou manifeste invalide : signalé par reconcile_storage, pas ici
+            if not readme:
+                continue
+            found.add(package_file.version_id)
+            self._report('missing_readme', f"{names[package_file.version_id]}: README in {package_file.file.name}")
+            if self.options['repair']:
+                PackageVersion.objects.filter(pk=package_file.version_id, readme='').update(readme=readme)
+
+    def _check_packages(self) -> None:
+        """
+        A package counts at least the downloads of its versions, was updated no earlier than
+        its latest version was published, and its dependents count matches the dependency index.
+        """
+        last_version_at = PackageVersion.objects.filter(package=OuterRef('pk')).order_by().values('package').annotate(
+            last=Max('created_at')
+        ).values('last')
+        queryset = Package.objects.annotate(
+            versions_downloads=versions_downloads(),
+            last_version_at=Subquery(last_version_at),
+            actual_dependents=PackageService.dependents_count(),
+        ).values(
+            'pk', 'name', 'download_count', 'versions_downloads',
+            'updated_at', 'last_version_at', 'dependents_count', 'actual_dependents',
+        )
+
+        def check(rows: List[Row]) -> None:
+            behind, stale, dependents_drift = [], [], []
+            for row in rows:
+                if row['download_count'] < row['versions_downloads']:
+                    behind.append(row['pk'])
+                    self._report('package_downloads', f"{row['name']}: download_count={row['download_count']} "
+                                 f"< versions total={row['versions_downloads']}")
+                if row['last_version_at'] and row['updated_at'] < row['last_version_at'] - UPDATED_AT_TOLERANCE:
+                    stale.append(row['pk'])
+                    self._report('package_updated_at', f"{row['name']}: updated_at={row['updated_at']:%Y-%m-%d %H:%M:%S} "
+                                 f"before its latest version ({row['last_version_at']:%Y-%m-%d %H:%M:%S})")
+                if row['dependents_count'] != row['actual_dependents']:
+                    dependents_drift.append(row['name'])
+                    self._report('dependents_count', f"{row['name']}: dependents_count={row['dependents_count']} "
+                                 f"actual={row['actual_dependents']}")
+
+            if not self.options['repair']:
+                return
+            with transaction.atomic():
+                if behind:
+                    Package.objects.filter(pk__in=behind).update(
+                        download_count=Greatest(F('download_count'), versions_downloads())
+                    )
+                if stale:
+                    # update() ne déclenche pas auto_now : updated_at prend la date de la dernière version
+                    latest = PackageVersion.objects.filter(package=OuterRef('pk')).order_by('-created_at').values('created_at')
+                    Package.objects.filter(pk__in=stale).update(updated_at=Subquery(latest[:1]))
+                PackageService.refresh_dependents_count(dependents_drift)
+            repaired = {*behind, *stale}
+            if repaired or dependents_drift:
+                PackageService.purge_pages(
+                    row['name'] for row in rows if row['pk'] in repaired or row['name'] in dependents_drift
+                )
+
+        self._paginate('packages', queryset, check)
+
+    def _check_stats(self) -> None:
+        """Registry-wide counters: one aggregate per counter, rebuilt like reconcile_stats."""
+        stats = RegistryStats.load()
+        actual = RegistryStats.compute()
+        # Refreshed periodically by `reconcile_stats --downloads`: lagging behind is not drift
+        del actual['total_downloads']
+        drifted = {field: expected for field, expected in actual.items() if getattr(stats, field) != expected}
+        for field, expected in drifted.items():
+            self._report('registry_stats', f"{field}: stored={getattr(stats, field)} actual={expected}")
+        if drifted and self.options['repair']:
+            RegistryStats.objects.filter(pk=RegistryStats.SINGLETON_ID).update(**actual)
+        self.stdout.write(f"stats: {len(actual)} counter(s) checked")
+
+    # --- Helpers ------------------------------------------------------------
+
+    def _paginate(self, name: str, queryset: QuerySet, check: Callable[[List[Row]], None]) -> None:
+        """
+        Keyset pagination on the primary key (no OFFSET: every batch is an index range scan),
+        with the last checked key saved after each batch.
+        """
+        last_pk: int = self.checkpoint.get(f'{name}_last_pk', 0)
+        checked = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:self.options['batch_size']])
+            if not rows:
+                break
+            check(rows)
+            checked += len(rows)
+            last_pk = rows[-1]['pk']
+            self.checkpoint[f'{name}_last_pk'] = last_pk
+            self._save_checkpoint()
+        self.stdout.write(f"{name}: {checked} row(s) checked")
+
+    def _report(self, kind: str, message: str) -> None:
+        self.issues[kind] = self.issues.get(kind, 0) + 1
+        self.stdout.write(self.style.WARNING(f"{kind}: {message}"))
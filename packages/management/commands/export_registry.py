@@ -0,0 +1,107 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from authentication.models import User
+from packages.models import Dependency, Package, PackageFile, PackageVersion
+from packages.transfer import BLOBS_DIR, FORMAT, FORMAT_VERSION, SECTIONS, ChunkWriter, write_manifest
+
+QUERYSETS = {
+    'users': lambda: User.objects.all(),
+    'packages': lambda: Package.objects.all(),
+    'versions': lambda: PackageVersion.objects.all(),
+    'dependencies': lambda: Dependency.objects.all(),
+    'files': lambda: PackageFile.objects.all(),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports users, packages, versions, dependencies and files (with their blobs) "
+        "to a chunked archive directory, streamed with bounded memory. See packages/transfer.py for the format."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output directory (created, must be empty).")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Records per chunk file.")
+        parser.add_argument('--workers', type=int, default=8, help="Parallel blob copies.")
+        parser.add_argument('--no-blobs', action='store_true', help="Export the metadata only.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        root: str = options['path']
+        if os.path.isdir(root) and os.listdir(root):
+            raise CommandError(f"{root} is not empty.")
+        os.makedirs(os.path.join(root, BLOBS_DIR), exist_ok=True)
+
+        self.root = root
+        self.options = options
+        manifest: Dict[str, Any] = {
+            'format': FORMAT,
+            'version': FORMAT_VERSION,
+            'created_at': timezone.now(),
+            'blobs': not options['no_blobs'],
+            'sections': {},
+        }
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            self.executor = executor
+            for section, fields in SECTIONS.items():
+                manifest['sections'][section] = self._export_section(section, fields)
+
+        write_manifest(root, manifest)
+        self.stdout.write(self.style.SUCCESS(f"Registry exported to {root}."))
+
+    def _export_section(self, section: str, fields: List[str]) -> Dict[str, Any]:
+        chunk_size: int = self.options['chunk_size']
+        copy_blobs = section == 'files' and not self.options['no_blobs']
+        writer = ChunkWriter(self.root, section, chunk_size)
+        blob_names: List[str] = []
+        started = time.monotonic()
+
+        rows = QUERYSETS[section]().order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size)
+        try:
+            for row in rows:
+                record = dict(zip(fields, row))
+                writer.write(record)
+                if copy_blobs:
+                    blob_names.append(record['file'])
+                    if len(blob_names) >= chunk_size:
+                        self._copy_blobs(blob_names)
+                        blob_names = []
+                if writer.count % chunk_size == 0:
+                    self._progress(section, writer.count, started)
+            if blob_names:
+                self._copy_blobs(blob_names)
+        finally:
+            writer.close()
+
+        if writer.count % chunk_size:
+            self._progress(section, writer.count, started)
+        return {'count': writer.count, 'chunks': writer.chunks}
+
+    def _copy_blobs(self, names: List[str]) -> None:
+        # map() est consommé en entier : au plus un lot de copies en vol
+        missing = [name for name in self.executor.map(self._copy_blob, names) if name]
+        for name in missing:
+            self.stderr.write(self.style.WARNING(f"Missing blob, not exported: {name}"))
+
+    def _copy_blob(self, name: str) -> str:
+        """Copies one blob out of the storage, returns its name when it doesn't exist."""
+        target = os.path.join(self.root, BLOBS_DIR, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with default_storage.open(name, 'rb') as source, open(target, 'wb') as out:
+                shutil.copyfileobj(source, out, length=1024 * 1024)
+        except FileNotFoundError:
+            return name
+        return ''
+
+    def _progress(self, section: str, count: int, started: float) -> None:
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(f"{section}: {count} exported ({count / elapsed:.0f}/s)")
@@ -0,0 +1,193 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Type
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+
+from authentication.models import User
+from packages.models import Dependency, Package, PackageFile, PackageVersion, RegistryStats, compute_sha256
+from packages.resolver import invalidate_graph
+from packages.services import PackageService
+from packages.transfer import BLOBS_DIR, FORMAT, FORMAT_VERSION, preserve_timestamps, read_manifest, read_section
+
+VersionKey = Tuple[str, str]
+RowBuilder = Callable[[List[Dict[str, Any]]], List[models.Model]]
+
+
+def batched(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(records)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports an `export_registry` archive. Rows are inserted with bulk_create in batches "
+        "(existing usernames, packages, versions and files are kept), constraint checks are deferred "
+        "to the end and the blobs of the imported files are copied to the storage in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Directory written by export_registry.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk_create.")
+        parser.add_argument('--workers', type=int, default=8, help="Parallel blob copies.")
+        parser.add_argument('--no-blobs', action='store_true', help="Import the metadata only.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.root: str = options['path']
+        self.options = options
+        try:
+            manifest = read_manifest(self.root)
+        except FileNotFoundError:
+            raise CommandError(f"{self.root} is not a registry export (no manifest).")
+        if manifest.get('format') != FORMAT or manifest.get('version') != FORMAT_VERSION:
+            raise CommandError(f"Unsupported export format: {manifest.get('format')} v{manifest.get('version')}.")
+
+        self.sections: Dict[str, Dict[str, Any]] = manifest['sections']
+        self.copy_blobs = manifest.get('blobs') and not options['no_blobs']
+        importers: Dict[str, Tuple[Type[models.Model], RowBuilder]] = {
+            'users': (User, self._build_users),
+            'packages': (Package, self._build_packages),
+            'versions': (PackageVersion, self._build_versions),
+            'dependencies': (Dependency, self._build_dependencies),
+            'files': (PackageFile, self._build_files),
+        }
+        model_classes = [model for model, _ in importers.values()]
+
+        # Comme loaddata : clés étrangères vérifiées une seule fois à la fin plutôt qu'à chaque ligne
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor, \
+                preserve_timestamps(*model_classes), connection.constraint_checks_disabled():
+            self.executor = executor
+            for section, (model, build) in importers.items():
+                self._import_section(section, model, build)
+
+        connection.check_constraints(table_names=[model._meta.db_table for model in model_classes])
+
+        self._refresh_derived_data()
+        self.stdout.write(self.style.SUCCESS(f"Registry imported from {self.root}."))
+
+    def _import_section(self, section: str, model: Type[models.Model], build: RowBuilder) -> None:
+        info = self.sections.get(section, {'count': 0, 'chunks': []})
+        started = time.monotonic()
+        done = 0
+
+        for batch in batched(read_section(self.root, info['chunks']), self.options['batch_size']):
+            rows = build(batch)
+            if section == 'files':
+                rows = self._new_files(rows)
+                if self.copy_blobs:
+                    # Blob names are chosen by the uploader: each row gets the name its blob was saved under
+                    names = self.executor.map(self._copy_blob, rows)
+                    for row, name in zip(rows, names):
+                        row.file.name = name
+
+            with transaction.atomic():
+                model.objects.bulk_create(rows, ignore_conflicts=True)
+
+            done += len(batch)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f"{section}: {done}/{info['count']} imported ({done / elapsed:.0f}/s)")
+
+    # --- Row builders -------------------------------------------------------
+
+    def _build_users(self, batch: List[Dict[str, Any]]) -> List[models.Model]:
+        return [User(**record) for record in batch]
+
+    def _build_packages(self, batch: List[Dict[str, Any]]) -> List[models.Model]:
+        authors = dict(
+            User.objects.filter(username__in={r['author__username'] for r in batch}).values_list('username', 'id')
+        )
+        packages = []
+        for record in batch:
+            author = record.pop('author__username')
+            packages.append(Package(author_id=authors[author], **record))
+        return packages
+
+    def _build_versions(self, batch: List[Dict[str, Any]]) -> List[models.Model]:
+        package_ids = dict(
+            Package.objects.filter(name__in={r['package__name'] for r in batch}).values_list('name', 'id')
+        )
+        versions = []
+        for record in batch:
+            package = record.pop('package__name')
+            versions.append(PackageVersion(package_id=package_ids[package], **record))
+        return versions
+
+    def _build_dependencies(self, batch: List[Dict[str, Any]]) -> List[models.Model]:
+        version_ids = self._version_ids(batch)
+        return [
+            Dependency(version_id=version_ids[self._pop_version_key(record)], **record)
+            for record in batch
+        ]
+
+    def _build_files(self, batch: List[Dict[str, Any]]) -> List[models.Model]:
+        version_ids = self._version_ids(batch)
+        return [
+            PackageFile(version_id=version_ids[self._pop_version_key(record)], **record)
+            for record in batch
+        ]
+
+    @staticmethod
+    def _version_ids(batch: List[Dict[str, Any]]) -> Dict[VersionKey, int]:
+        rows = PackageVersion.objects.filter(
+            package__name__in={r['version__package__name'] for r in batch},
+            version_number__in={r['version__version_number'] for r in batch},
+        ).values_list('package__name', 'version_number', 'id')
+        return {(name, number): pk for name, number, pk in rows}
+
+    @staticmethod
+    def _pop_version_key(record: Dict[str, Any]) -> VersionKey:
+        return record.pop('version__package__name'), record.pop('version__version_number')
+
+    # --- Blobs and derived data ---------------------------------------------
+
+    @staticmethod
+    def _new_files(rows: List[PackageFile]) -> List[PackageFile]:
+        """The rows bulk_create will insert: files already in the registry (version, os, arch) are kept."""
+        existing = set(
+            PackageFile.objects.filter(version_id__in={row.version_id for row in rows})
+            .values_list('version_id', 'os', 'architecture')
+        )
+        new = []
+        for row in rows:
+            key = (row.version_id, row.os, row.architecture)
+            if key not in existing:
+                existing.add(key)
+                new.append(row)
+        return new
+
+    def _copy_blob(self, row: PackageFile) -> str:
+        """
+        Copies the blob of an imported file into the storage and returns the name it was saved under.
+        A blob already stored under that name is reused only when it's the same archive (re-run of an
+        import), otherwise the storage picks another name (get_available_name).
+        """
+        name = row.file.name
+        source = os.path.join(self.root, BLOBS_DIR, name)
+        if not os.path.exists(source):
+            self.stdout.write(self.style.WARNING(f"blob missing from the export: {name}"))
+            return name
+        with open(source, 'rb') as f:
+            digest = row.sha256 or compute_sha256(File(f))
+            if default_storage.exists(name) and default_storage.size(name) == row.size:
+                with default_storage.open(name, 'rb') as stored:
+                    if compute_sha256(stored) == digest:
+                        return name
+            return default_storage.save(name, File(f))
+
+    def _refresh_derived_data(self) -> None:
+        """Counters maintained by signals and publish are not touched by bulk_create."""
+        self.stdout.write("Refreshing dependents counts and registry stats...")
+        # Paquets importés et paquets (existants ou non) dont dépendent les versions importées
+        for section in ('packages', 'dependencies'):
+            records = read_section(self.root, self.sections.get(section, {}).get('chunks', []))
+            for batch in batched(records, self.options['batch_size']):
+                PackageService.refresh_dependents_count(record['name'] for record in batch)
+
+        RegistryStats.objects.update_or_create(pk=RegistryStats.SINGLETON_ID, defaults=RegistryStats.compute())
+        invalidate_graph()
@@ -0,0 +1,144 @@
+import json
+import re
+import uuid
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q, QuerySet
+
+from packages.models import Package, PackageVersion, PackageFile, PackageOS, PackageArch
+from packages.services import PackageService
+
+
+# Placeholder values: EXPLAIN only needs a plan, the rows don't have to exist.
+SAMPLE_AUTHOR_ID = uuid.UUID(int=0)
+SAMPLE_PACKAGE_ID = 0
+SAMPLE_VERSION_ID = 0
+
+# `SCAN <table> [USING [COVERING ]INDEX <index> [(<constraint>)]]` in EXPLAIN QUERY PLAN
+SQLITE_SCAN = re.compile(r'^SCAN (\S+)(?: USING (?:COVERING )?INDEX (\S+)( \(.+\))?)?')
+
+
+def get_hot_queries() -> List[Tuple[str, Callable[[], QuerySet]]]:
+    """
+    The queries executed on the hot paths of the registry (home page, list view,
+    profile page, detail page and the `latest` API action).
+    Built lazily so that each one is evaluated against the selected database.
+    """
+    return [
+        ("index: recent packages", lambda: PackageService.get_recent_packages(limit=6)),
+        ("list: sort by updated", lambda: Package.objects.order_by('-updated_at')[:10]),
+        ("list: sort by downloads", lambda: Package.objects.order_by('-download_count')[:10]),
+        ("list: sort by name", lambda: Package.objects.order_by('name')[:10]),
+        ("list: search", lambda: Package.objects.filter(
+            Q(name__icontains='aegis') | Q(description__icontains='aegis')
+        ).order_by('-updated_at')[:10]),
+        ("profile: author packages", lambda: Package.objects.filter(
+            author_id=SAMPLE_AUTHOR_ID
+        ).order_by('-updated_at')),
+        ("detail: versions", lambda: PackageVersion.objects.filter(
+            package_id=SAMPLE_PACKAGE_ID
+        ).order_by('-created_at')),
+        ("api latest: latest version", lambda: PackageVersion.objects.filter(
+            package_id=SAMPLE_PACKAGE_ID, is_yanked=False
+        ).order_by('-created_at')[:1]),
+        ("api latest: file match", lambda: PackageFile.objects.filter(
+            version_id=SAMPLE_VERSION_ID, os=PackageOS.LINUX, architecture=PackageArch.X86_64
+        )[:1]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the registry hot queries and flags full scans and filesorts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to explain against.")
+        parser.add_argument('--verbose-plan', action='store_true', help="Print the raw query plans.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        alias: str = options['database']
+        if alias not in connections:
+            raise CommandError(f"Unknown database alias '{alias}'.")
+
+        vendor: str = connections[alias].vendor
+        if vendor not in ('mysql', 'sqlite'):
+            raise CommandError(f"Unsupported backend '{vendor}' (expected mysql or sqlite).")
+
+        self.stdout.write(f"Explaining hot queries on '{alias}' ({vendor})\n")
+        hot_queries = get_hot_queries()
+        flagged = 0
+
+        for label, build in hot_queries:
+            queryset: QuerySet = build().using(alias)
+            if vendor == 'mysql':
+                plan = queryset.explain(format='json')
+                problems = self._analyze_mysql(json.loads(plan))
+            else:
+                plan = queryset.explain()
+                problems = self._analyze_sqlite(plan, bounded=self._is_bounded(queryset))
+
+            if problems:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f"[WARN] {label}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"[ OK ] {label}"))
+
+            if options['verbose_plan']:
+                self.stdout.write(f"{plan}\n")
+
+        summary = f"\n{flagged} of {len(hot_queries)} queries flagged."
+        self.stdout.write(self.style.WARNING(summary) if flagged else self.style.SUCCESS(summary))
+
+    @staticmethod
+    def _is_bounded(queryset: QuerySet) -> bool:
+        """An unfiltered, limited query only reads the first rows of the index it walks in order."""
+        return queryset.query.high_mark is not None and not queryset.query.where
+
+    @staticmethod
+    def _analyze_sqlite(plan: str, bounded: bool = False) -> List[str]:
+        """
+        Parses `EXPLAIN QUERY PLAN` output.
+        'SEARCH' lines use an index constraint. A 'SCAN <table>' reads the whole table and
+        'SCAN <table> USING INDEX <index>' the whole index, unless the index has a constraint
+        or the query is `bounded` (walks the index in order and stops at the LIMIT).
+        'USE TEMP B-TREE FOR ORDER BY' is SQLite's equivalent of a filesort.
+        """
+        problems: List[str] = []
+        for line in plan.splitlines():
+            detail = line.split(' ', 3)[-1]
+            scan = SQLITE_SCAN.match(detail)
+            if scan:
+                table, index, constraint = scan.groups()
+                if index is None:
+                    problems.append(f"full scan ({table})")
+                elif not constraint and not bounded:
+                    problems.append(f"full index scan ({table} using {index})")
+            if 'USE TEMP B-TREE' in detail:
+                problems.append("filesort (temp b-tree)")
+        return problems
+
+    @staticmethod
+    def _analyze_mysql(plan: Dict[str, Any]) -> List[str]:
+        """
+        Walks the `EXPLAIN FORMAT=JSON` tree looking for
+        access_type ALL (full scan), using_filesort and using_temporary_table.
+        """
+        problems: List[str] = []
+
+        def walk(node: Any) -> None:
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    problems.append(f"full scan ({node.get('table_name', '?')})")
+                if node.get('using_filesort'):
+                    problems.append("filesort")
+                if node.get('using_temporary_table'):
+                    problems.append("temporary table")
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(plan)
+        return problems
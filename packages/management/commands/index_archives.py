@@ -0,0 +1,47 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from packages.models import PackageFile
+from packages.services import PackageService
+
+
+class Command(BaseCommand):
+    help = (
+        "Indexes the file listing of the archives not indexed yet (published before the contents index, "
+        "imported with import_registry, background indexing lost: see packages/indexing.py). Keyset-paginated; an interrupted run resumes where it stopped "
+        "since indexed files are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Files loaded per query.")
+        parser.add_argument('--reindex', action='store_true', help="Also re-index the files already indexed.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        files = PackageFile.objects.select_related('version__package').only(
+            'id', 'file', 'version__version_number', 'version__package__name'
+        )
+        if not options['reindex']:
+            files = files.filter(indexed_at__isnull=True)
+
+        last_pk = 0
+        indexed = failed = entries = 0
+        while True:
+            batch = list(files.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+            if not batch:
+                break
+            for package_file in batch:
+                try:
+                    with package_file.file.open('rb') as blob:
+                        entries += PackageService.index_package_file(package_file, blob)
+                except OSError as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"{package_file}: {e}"))
+                    continue
+                indexed += 1
+            last_pk = batch[-1].pk
+            self.stdout.write(f"{indexed} archive(s) indexed, {entries} entries")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{indexed} archive(s) indexed ({entries} entries), {failed} unreadable."
+        ))
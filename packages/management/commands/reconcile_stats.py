@@ -0,0 +1,53 @@
+from typing import Any, Dict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from packages.models import RegistryStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the registry stats singleton from scratch and reports drift. "
+        "With --downloads, only refreshes total_downloads (not maintained per download): "
+        "meant to run periodically, e.g. every few minutes from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drift, don't write.")
+        parser.add_argument('--downloads', action='store_true', help="Only refresh total_downloads.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options['downloads']:
+            total = RegistryStats.refresh_downloads()
+            self.stdout.write(self.style.SUCCESS(f"total_downloads: {total}"))
+            return
+
+        with transaction.atomic():
+            stats: RegistryStats = RegistryStats.objects.select_for_update().filter(
+                pk=RegistryStats.SINGLETON_ID
+            ).first() or RegistryStats(pk=RegistryStats.SINGLETON_ID)
+            actual: Dict[str, int] = RegistryStats.compute()
+
+            drifted = 0
+            for field, expected in actual.items():
+                stored: int = getattr(stats, field)
+                if stored != expected:
+                    drifted += 1
+                    self.stdout.write(self.style.WARNING(
+                        f"{field}: stored={stored} actual={expected} drift={stored - expected:+d}"
+                    ))
+                else:
+                    self.stdout.write(f"{field}: {expected}")
+                setattr(stats, field, expected)
+
+            if options['dry_run']:
+                self.stdout.write(f"\n{drifted} counter(s) drifted (dry run, nothing written).")
+                return
+
+            stats.save()
+
+        if drifted:
+            self.stdout.write(self.style.SUCCESS(f"\n{drifted} counter(s) drifted, stats rebuilt."))
+        else:
+            self.stdout.write(self.style.SUCCESS("\nNo drift, stats are consistent."))
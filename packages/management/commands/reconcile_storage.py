@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from packages.management.checkpoint import CheckpointMixin
+from packages.models import PackageFile, PackageFileDelta
+
+# Storage prefixes owned by the registry (see the upload_to of PackageFile and PackageFileDelta)
+MANAGED_PREFIXES = ['packages', 'deltas']
+QUARANTINE_PREFIX = 'quarantine'
+
+
+def split_path(path: str) -> Tuple[str, ...]:
+    return tuple(path.split('/'))
+
+
+class Command(CheckpointMixin, BaseCommand):
+    help = (
+        "Streams the storage tree against PackageFile/PackageFileDelta rows to find orphan blobs "
+        "(deleted packages, failed publishes) and rows whose blob is missing. "
+        "Report only unless --delete or --quarantine is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Paths/rows checked per query.")
+        parser.add_argument('--min-age', type=int, default=60,
+                            help="Ignore blobs younger than N minutes (uploads in flight).")
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--delete', action='store_true', help="Delete orphan blobs.")
+        action.add_argument('--quarantine', action='store_true',
+                            help=f"Move orphan blobs under '{QUARANTINE_PREFIX}/' instead of deleting them.")
+        parser.add_argument('--checkpoint', help="JSON file used to resume an interrupted run.")
+        parser.add_argument('--skip-orphans', action='store_true', help="Only look for missing blobs.")
+        parser.add_argument('--skip-missing', action='store_true', help="Only look for orphan blobs.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.options = options
+        self.checkpoint: Dict[str, Any] = self._load_checkpoint()
+
+        if not options['skip_orphans'] and not self.checkpoint.get('orphans_done'):
+            self._find_orphans()
+            self.checkpoint['orphans_done'] = True
+            self._save_checkpoint()
+
+        if not options['skip_missing'] and not self.checkpoint.get('missing_done'):
+            self._find_missing()
+            self.checkpoint['missing_done'] = True
+            self._save_checkpoint()
+
+        self._clear_checkpoint()
+
+    # --- Orphan blobs -------------------------------------------------------
+
+    def _find_orphans(self) -> None:
+        resume_after: Optional[Tuple[str, ...]] = (
+            split_path(self.checkpoint['last_path']) if self.checkpoint.get('last_path') else None
+        )
+        min_age = timezone.now() - timedelta(minutes=self.options['min_age'])
+        scanned = orphans = 0
+        batch: List[str] = []
+
+        for path in self._walk_prefixes(resume_after):
+            batch.append(path)
+            if len(batch) >= self.options['batch_size']:
+                scanned += len(batch)
+                orphans += self._process_batch(batch, min_age)
+                batch = []
+        if batch:
+            scanned += len(batch)
+            orphans += self._process_batch(batch, min_age)
+
+        self.stdout.write(self.style.SUCCESS(f"Orphans: {orphans} orphan blob(s) in {scanned} scanned."))
+
+    def _walk_prefixes(self, resume_after: Optional[Tuple[str, ...]]) -> Iterator[str]:
+        for prefix in sorted(MANAGED_PREFIXES):
+            if resume_after is not None and split_path(prefix) < resume_after[:1]:
+                continue
+            if default_storage.exists(prefix):
+                yield from self._walk(prefix, resume_after)
+
+    def _walk(self, directory: str, resume_after: Optional[Tuple[str, ...]]) -> Iterator[str]:
+        """
+        Yields the blob paths under `directory` in lexicographic order (per path segment),
+        holding a single directory listing per level in memory.
+        With `resume_after`, subtrees entirely before the checkpointed path are skipped.
+        """
+        dirs, files = default_storage.listdir(directory)
+        entries = sorted([(name, True) for name in dirs] + [(name, False) for name in files])
+        for name, is_dir in entries:
+            path = f"{directory}/{name}" if directory else name
+            segments = split_path(path)
+            if resume_after is not None:
+                if is_dir and segments < resume_after[:len(segments)]:
+                    continue
+                if not is_dir and segments <= resume_after:
+                    continue
+            if is_dir:
+                yield from self._walk(path, resume_after)
+            else:
+                yield path
+
+    def _process_batch(self, paths: List[str], min_age: datetime) -> int:
+        """Handles the orphans of one batch of paths, then checkpoints the last path."""
+        referenced: Set[str] = set(
+            PackageFile.objects.filter(file__in=paths).values_list('file', flat=True)
+        ) | set(
+            PackageFileDelta.objects.filter(file__in=paths).values_list('file', flat=True)
+        )
+
+        orphans = 0
+        for path in paths:
+            if path in referenced:
+                continue
+            if default_storage.get_modified_time(path) > min_age:
+                continue
+            orphans += 1
+            if self.options['delete']:
+                default_storage.delete(path)
+                self.stdout.write(f"deleted {path}")
+            elif self.options['quarantine']:
+                self._quarantine(path)
+                self.stdout.write(f"quarantined {path}")
+            else:
+                self.stdout.write(f"orphan {path}")
+
+        self.checkpoint['last_path'] = paths[-1]
+        self._save_checkpoint()
+        return orphans
+
+    @staticmethod
+    def _quarantine(path: str) -> None:
+        # Storage API only (no os.rename): works the same on local disk and object storage
+        with default_storage.open(path, 'rb') as blob:
+            default_storage.save(f"{QUARANTINE_PREFIX}/{path}", blob)
+        default_storage.delete(path)
+
+    # --- Missing blobs ------------------------------------------------------
+
+    def _find_missing(self) -> None:
+        """Keyset-paginated pass over PackageFile rows, checking that each blob exists."""
+        last_pk: int = self.checkpoint.get('last_pk', 0)
+        checked = missing = 0
+
+        while True:
+            rows = list(
+                PackageFile.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'file')[:self.options['batch_size']]
+            )
+            if not rows:
+                break
+            for pk, name in rows:
+                if not default_storage.exists(name):
+                    missing += 1
+                    self.stdout.write(self.style.WARNING(f"missing blob for PackageFile #{pk}: {name}"))
+            checked += len(rows)
+            last_pk = rows[-1][0]
+            self.checkpoint['last_pk'] = last_pk
+            self._save_checkpoint()
+
+        self.stdout.write(self.style.SUCCESS(f"Missing: {missing} missing blob(s) in {checked} file row(s)."))
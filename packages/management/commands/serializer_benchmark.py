@@ -0,0 +1,96 @@
+import statistics
+import time
+from typing import Any, Callable, List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from authentication.models import User
+from packages.models import Package, PackageVersion
+from packages.serializers import PackageSerializer, serialize_packages
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares PackageSerializer with the values()-based read path on a generated dataset "
+        "(created in a transaction rolled back at the end) and checks that both render the same bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=10000, help="Packages generated for the run.")
+        parser.add_argument('--versions', type=int, default=3, help="Versions per generated package.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per serializer.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            with transaction.atomic():
+                self._seed(options['packages'], options['versions'])
+                self._compare(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, package_count: int, version_count: int) -> None:
+        author, _ = User.objects.get_or_create(username='serializer-benchmark')
+        Package.objects.bulk_create(
+            [Package(name=f'bench-{i}', author=author, description=f'Benchmark package {i}') for i in range(package_count)],
+            batch_size=1000,
+        )
+        package_ids = Package.objects.filter(name__startswith='bench-').values_list('id', flat=True)
+        PackageVersion.objects.bulk_create(
+            [
+                PackageVersion(package_id=package_id, version_number=f'1.{minor}.0')
+                for package_id in package_ids.iterator()
+                for minor in range(version_count)
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"Dataset: {package_count} packages, {package_count * version_count} versions\n")
+
+    def _compare(self, repeat: int) -> None:
+        queryset = Package.objects.filter(name__startswith='bench-').order_by('id')
+        renderer = JSONRenderer()
+
+        def model_serializer() -> bytes:
+            return renderer.render(PackageSerializer(queryset, many=True).data)
+
+        def prefetched_serializer() -> bytes:
+            prefetched = queryset.select_related('author').prefetch_related('versions')
+            return renderer.render(PackageSerializer(prefetched, many=True).data)
+
+        def values_serializer() -> bytes:
+            return renderer.render(serialize_packages(queryset))
+
+        expected = model_serializer()
+        if prefetched_serializer() != expected or values_serializer() != expected:
+            raise CommandError("Outputs differ, the values() read path is not byte-identical.")
+
+        # Le premier est le comportement actuel de l'endpoint (une requête de versions par paquet)
+        runs = [
+            ("PackageSerializer", model_serializer),
+            ("+ prefetch_related", prefetched_serializer),
+            ("serialize_packages", values_serializer),
+        ]
+        timings = {label: self._time(func, repeat) for label, func in runs}
+        for label, median in timings.items():
+            self.stdout.write(f"{label:<20} median={median:.1f}ms")
+
+        fast = timings["serialize_packages"]
+        self.stdout.write(self.style.SUCCESS(
+            f"\nIdentical output, {timings['PackageSerializer'] / fast:.1f}x faster than the current endpoint, "
+            f"{timings['+ prefetch_related'] / fast:.1f}x faster than a prefetched ModelSerializer."
+        ))
+
+    @staticmethod
+    def _time(func: Callable[[], bytes], repeat: int) -> float:
+        timings: List[float] = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
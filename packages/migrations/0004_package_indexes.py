@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0003_alter_packageversion_options_package_download_count_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['-updated_at'], name='package_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['-download_count'], name='package_downloads_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['author', '-updated_at'], name='package_author_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packageversion',
+            index=models.Index(fields=['package', '-created_at'], name='version_package_created_idx'),
+        ),
+    ]
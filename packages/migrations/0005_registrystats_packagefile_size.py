@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0004_package_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_packages', models.BigIntegerField(default=0)),
+                ('total_versions', models.BigIntegerField(default=0)),
+                ('total_files', models.BigIntegerField(default=0)),
+                ('total_downloads', models.BigIntegerField(default=0)),
+                ('total_bytes', models.BigIntegerField(default=0, help_text='Bytes stored across all package files')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Registry stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='packagefile',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0, help_text='Archive size in bytes'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 12:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0005_registrystats_packagefile_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageFileDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='deltas/%Y/%m/')),
+                ('size', models.PositiveBigIntegerField(default=0, help_text='Delta size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deltas_from', to='packages.packagefile')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deltas_to', to='packages.packagefile')),
+            ],
+            options={
+                'unique_together': {('target', 'source')},
+            },
+        ),
+        migrations.AddField(
+            model_name='packagefile',
+            name='delta_checked_at',
+            field=models.DateTimeField(blank=True, help_text='When build_deltas last handled the file (delta built or not worth it)', null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 12:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0006_packagefiledelta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Dependency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(help_text='Name of the required package', max_length=100)),
+                ('requirement', models.CharField(default='*', help_text='Version requirement, e.g. ^1.2.0', max_length=50)),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dependencies', to='packages.packageversion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['name', 'version'], name='dependency_reverse_idx')],
+                'unique_together': {('version', 'name')},
+            },
+        ),
+    ]
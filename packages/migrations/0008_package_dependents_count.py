@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-19 12:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def compute_dependents_count(apps, schema_editor):
+    Package = apps.get_model('packages', 'Package')
+    Dependency = apps.get_model('packages', 'Dependency')
+    counts = Dependency.objects.values('name').annotate(total=Count('version__package', distinct=True))
+    for row in counts.iterator():
+        Package.objects.filter(name=row['name']).update(dependents_count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0007_dependency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='dependents_count',
+            field=models.PositiveIntegerField(default=0, help_text='Packages depending on this one (maintained on publish/delete)'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['-dependents_count'], name='package_dependents_idx'),
+        ),
+        migrations.RunPython(compute_dependents_count, migrations.RunPython.noop),
+    ]
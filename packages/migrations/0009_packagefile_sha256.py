@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0008_package_dependents_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagefile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, help_text='Hex digest of the archive', max_length=64),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0009_packagefile_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packageversion',
+            name='deprecation_message',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='packageversion',
+            name='is_deprecated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='packageversion',
+            name='is_yanked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='packageversion',
+            name='yank_reason',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='packageversion',
+            name='yanked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='packageversion',
+            index=models.Index(fields=['package', 'is_yanked', '-created_at'], name='version_resolvable_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-19 12:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0010_packageversion_yank_deprecate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DownloadStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_stats', to='packages.package')),
+            ],
+            options={
+                'unique_together': {('package', 'date')},
+            },
+        ),
+    ]
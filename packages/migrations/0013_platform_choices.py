@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0012_publishidempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='packagefile',
+            name='architecture',
+            field=models.CharField(choices=[('x86_64', 'x86_64 (Intel/AMD 64-bit)'), ('arm64', 'ARM64 (Apple Silicon, RPi)'), ('riscv64', 'RISC-V 64-bit'), ('any', 'Any / Universal')], default='any', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='packagefile',
+            name='os',
+            field=models.CharField(choices=[('linux', 'Linux'), ('windows', 'Windows'), ('macos', 'macOS'), ('linux-musl', 'Linux (musl, e.g. Alpine)'), ('any', 'Any / Source')], default='any', max_length=20),
+        ),
+    ]
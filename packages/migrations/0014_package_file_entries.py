@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-19 12:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0013_platform_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagefile',
+            name='indexed_at',
+            field=models.DateTimeField(blank=True, help_text='When the archive listing was indexed (PackageFileEntry)', null=True),
+        ),
+        migrations.CreateModel(
+            name='PackageFileEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='Path inside the archive, e.g. src/http/client.aeg', max_length=255)),
+                ('name', models.CharField(help_text='Last segment of the path, e.g. client.aeg', max_length=255)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('sha256', models.CharField(max_length=64)),
+                ('package_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='packages.packagefile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['path'], name='entry_path_idx'), models.Index(fields=['name'], name='entry_name_idx')],
+                'unique_together': {('package_file', 'path')},
+            },
+        ),
+    ]
@@ -1,16 +1,29 @@
+import hashlib
+from typing import Any, Dict
 from django.db import models
+from django.db.models import Count, F, Sum
 from authentication.models import User
 
 
+def compute_sha256(file: Any) -> str:
+    """Hex SHA-256 of a Django File, read in chunks (File.chunks() rewinds it first)."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
 class PackageOS(models.TextChoices):
     LINUX = 'linux', 'Linux'
     WINDOWS = 'windows', 'Windows'
     MACOS = 'macos', 'macOS'
+    LINUX_MUSL = 'linux-musl', 'Linux (musl, e.g. Alpine)'
     ANY = 'any', 'Any / Source' # Pour le code source pur ou universel
 
 class PackageArch(models.TextChoices):
     X86_64 = 'x86_64', 'x86_64 (Intel/AMD 64-bit)'
     ARM64 = 'arm64', 'ARM64 (Apple Silicon, RPi)'
+    RISCV64 = 'riscv64', 'RISC-V 64-bit'
     ANY = 'any', 'Any / Universal'
 
 
@@ -24,11 +37,31 @@ class Package(models.Model):
     website = models.URLField(blank=True, null=True)
     
     download_count = models.PositiveIntegerField(default=0)
+    dependents_count = models.PositiveIntegerField(default=0, help_text="Packages depending on this one (maintained on publish/delete)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Home page / list view default sort ("Recently Updated")
+            models.Index(fields=['-updated_at'], name='package_updated_idx'),
+            # List view "Most Downloads" sort
+            models.Index(fields=['-download_count'], name='package_downloads_idx'),
+            # Profile page: author's packages, most recent first
+            models.Index(fields=['author', '-updated_at'], name='package_author_updated_idx'),
+            # List view "Most Dependents" sort
+            models.Index(fields=['-dependents_count'], name='package_dependents_idx'),
+        ]
+
     def __str__(self):
         return self.name
+
+    def _get_latest(self):
+        """Latest non-yanked version, read from prefetch_related('versions') when available (ordered by -created_at)."""
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('versions')
+        if prefetched is not None:
+            return next((v for v in prefetched if not v.is_yanked), None)
+        return self.versions.filter(is_yanked=False).order_by('-created_at').first()
     
     @property
     def latest_version(self):
@@ -36,7 +69,10 @@ class Package(models.Model):
         Helper pour les templates: {{ package.latest_version }}
         Retourne le numéro de version de la dernière release.
         """
-        latest = self.versions.order_by('-created_at').first()
+        # Annotated by PackageService.with_latest_version() on list querysets (no extra query)
+        if hasattr(self, 'latest_version_number'):
+            return self.latest_version_number or "0.0.0"
+        latest = self._get_latest()
         return latest.version_number if latest else "0.0.0"
     
     @property
@@ -45,7 +81,7 @@ class Package(models.Model):
         Helper pour les templates: {{ package.readme }}
         Affiche le README de la dernière version.
         """
-        latest = self.versions.order_by('-created_at').first()
+        latest = self._get_latest()
         return latest.readme if latest else ""
     
 
@@ -58,14 +94,49 @@ class PackageVersion(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     download_count = models.PositiveIntegerField(default=0)
 
+    # Yanked versions are skipped by default resolution (latest, ranges) but exact pins still get them
+    is_yanked = models.BooleanField(default=False)
+    yank_reason = models.CharField(max_length=255, blank=True)
+    yanked_at = models.DateTimeField(null=True, blank=True)
+
+    # Deprecated versions still resolve, clients only get a warning
+    is_deprecated = models.BooleanField(default=False)
+    deprecation_message = models.CharField(max_length=255, blank=True)
+
     class Meta:
         unique_together = ('package', 'version_number')
         ordering = ['-created_at']
+        indexes = [
+            # package.versions.order_by('-created_at') (latest version lookups)
+            models.Index(fields=['package', '-created_at'], name='version_package_created_idx'),
+            # Default resolution: latest non-yanked version of a package
+            models.Index(fields=['package', 'is_yanked', '-created_at'], name='version_resolvable_idx'),
+        ]
 
     def __str__(self):
         return f"{self.package.name} v{self.version_number}"
     
 
+class Dependency(models.Model):
+    """
+    Edge of the dependency graph, declared in the archive manifest (aegis.toml) at publish time.
+    `name` is a plain package name: the dependency may not be published yet.
+    """
+    version = models.ForeignKey(PackageVersion, related_name='dependencies', on_delete=models.CASCADE)
+    name = models.SlugField(max_length=100, help_text="Name of the required package")
+    requirement = models.CharField(max_length=50, default='*', help_text="Version requirement, e.g. ^1.2.0")
+
+    class Meta:
+        unique_together = ('version', 'name')
+        indexes = [
+            # Reverse dependency index: "who depends on <name>" without touching the version rows
+            models.Index(fields=['name', 'version'], name='dependency_reverse_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.version} -> {self.name} {self.requirement}"
+    
+
 class PackageFile(models.Model):
     version = models.ForeignKey(PackageVersion, related_name='files', on_delete=models.CASCADE)
     file = models.FileField(upload_to='packages/%Y/%m/')
@@ -80,12 +151,174 @@ class PackageFile(models.Model):
         default=PackageArch.ANY
     )
 
+    size = models.PositiveBigIntegerField(default=0, help_text="Archive size in bytes")
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, help_text="Hex digest of the archive")
+
     download_count = models.PositiveIntegerField(default=0)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    delta_checked_at = models.DateTimeField(
+        null=True, blank=True, help_text="When build_deltas last handled the file (delta built or not worth it)"
+    )
+    indexed_at = models.DateTimeField(null=True, blank=True, help_text="When the archive listing was indexed (PackageFileEntry)")
 
     class Meta:
         unique_together = ('version', 'os', 'architecture')
 
     def __str__(self):
         return f"{self.version} - {self.os} ({self.architecture})"
+
+    def save(self, *args, **kwargs):
+        if self.file and not self.size:
+            self.size = self.file.size
+        if self.file and not self.sha256:
+            self.sha256 = compute_sha256(self.file)
+        super().save(*args, **kwargs)
+
+
+class PackageFileDelta(models.Model):
+    """
+    Derived artifact: upgrades an install of `source` into `target`
+    (consecutive versions of the same package, os and architecture).
+    Built in the background by the `build_deltas` command, see deltas.py for the format.
+    """
+    source = models.ForeignKey(PackageFile, related_name='deltas_from', on_delete=models.CASCADE)
+    target = models.ForeignKey(PackageFile, related_name='deltas_to', on_delete=models.CASCADE)
+    file = models.FileField(upload_to='deltas/%Y/%m/')
+    size = models.PositiveBigIntegerField(default=0, help_text="Delta size in bytes")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('target', 'source')
+
+    def __str__(self):
+        return f"{self.source.version.version_number} -> {self.target}"
+
+
+class DownloadStat(models.Model):
+    """
+    Downloads of a package on a given day (UTC), maintained by PackageService.record_download(s).
+    Feeds the "downloads over time" of the author stats without scanning any log.
+    """
+    package = models.ForeignKey(Package, related_name='download_stats', on_delete=models.CASCADE)
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('package', 'date')
+
+    def __str__(self):
+        return f"{self.package} {self.date}: {self.count}"
+
+
+class PackageFileEntry(models.Model):
+    """
+    One file of a package archive, indexed in the background after publish (see indexing.py):
+    answers "which package provides this path/module" and serves listings without opening the blob.
+    """
+    package_file = models.ForeignKey(PackageFile, related_name='entries', on_delete=models.CASCADE)
+    path = models.CharField(max_length=255, help_text="Path inside the archive, e.g. src/http/client.aeg")
+    name = models.CharField(max_length=255, help_text="Last segment of the path, e.g. client.aeg")
+    size = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('package_file', 'path')
+        indexes = [
+            # Exact path and prefix lookups (LIKE 'src/http/%' is an index range scan)
+            models.Index(fields=['path'], name='entry_path_idx'),
+            # Module lookups by file name, wherever it sits in the archive
+            models.Index(fields=['name'], name='entry_name_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.package_file} : {self.path}"
+
+
+class PublishIdempotencyKey(models.Model):
+    """
+    Response of a publish request sent with an `Idempotency-Key` header.
+    The row is inserted before publishing (reservation) and completed with the response:
+    a retry with the same key and the same upload replays it instead of publishing again,
+    the same key with a different upload is refused.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of name, version, platform and archive digest")
+    status_code = models.PositiveSmallIntegerField(null=True, help_text="Empty while the first request is publishing")
+    response = models.JSONField(null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.user} {self.key}"
+
+
+class RegistryStats(models.Model):
+    """
+    Singleton row holding the registry-wide counters shown on the home page.
+    Maintained incrementally by the signals in signals.py, rebuilt from scratch by the
+    `reconcile_stats` command. total_downloads is not bumped per download (every download
+    would wait on the lock of this row): `reconcile_stats --downloads` refreshes it periodically.
+    """
+    SINGLETON_ID = 1
+
+    total_packages = models.BigIntegerField(default=0)
+    total_versions = models.BigIntegerField(default=0)
+    total_files = models.BigIntegerField(default=0)
+    total_downloads = models.BigIntegerField(default=0)
+    total_bytes = models.BigIntegerField(default=0, help_text="Bytes stored across all package files")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Registry stats"
+
+    def __str__(self):
+        return "Registry stats"
+
+    @classmethod
+    def compute(cls) -> Dict[str, int]:
+        """Computes every counter from the source tables (full scans, used for reconciliation)."""
+        package_totals = Package.objects.aggregate(count=Count('id'), downloads=Sum('download_count'))
+        file_totals = PackageFile.objects.aggregate(count=Count('id'), size=Sum('size'))
+        return {
+            'total_packages': package_totals['count'],
+            'total_versions': PackageVersion.objects.count(),
+            'total_files': file_totals['count'],
+            'total_downloads': package_totals['downloads'] or 0,
+            'total_bytes': file_totals['size'] or 0,
+        }
+
+    @classmethod
+    def load(cls) -> "RegistryStats":
+        """Returns the singleton, building it from scratch the first time."""
+        stats = cls.objects.filter(pk=cls.SINGLETON_ID).first()
+        if stats is None:
+            stats, _ = cls.objects.get_or_create(pk=cls.SINGLETON_ID, defaults=cls.compute())
+        return stats
+
+    @classmethod
+    def refresh_downloads(cls) -> int:
+        """Recomputes total_downloads from the package counters (one aggregate over Package)."""
+        total = Package.objects.aggregate(total=Sum('download_count'))['total'] or 0
+        if not cls.objects.filter(pk=cls.SINGLETON_ID).update(total_downloads=total):
+            cls.load()
+        return total
+
+    @classmethod
+    def bump(cls, **deltas: int) -> None:
+        """
+        Atomically adds the given deltas, e.g. bump(total_files=1, total_bytes=size).
+        F expressions keep concurrent updates safe.
+        """
+        updates: Dict[str, Any] = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if not updates:
+            return
+        if not cls.objects.filter(pk=cls.SINGLETON_ID).update(**updates):
+            # First write ever: computing from scratch already accounts for this change
+            cls.load()
     
\ No newline at end of file
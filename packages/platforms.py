@@ -0,0 +1,68 @@
+"""
+Platform compatibility graph: which assets can be installed on a target os/architecture, by preference.
+
+The default chain of a target is its exact match, then the OS-generic then the arch-generic assets,
+then the source: linux/arm64 -> linux/any -> any/arm64 -> any/any.
+Some platforms also run the binaries of another one; those extra edges (PLATFORM_FALLBACKS
+in the settings, merged over DEFAULT_FALLBACKS) are tried right after the exact match:
+macos/arm64 -> macos/x86_64 (Rosetta) -> macos/any -> ...
+"""
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Q, QuerySet, Value, When
+
+from .models import PackageArch, PackageFile, PackageOS
+
+Platform = Tuple[str, str]  # (os, architecture)
+
+DEFAULT_FALLBACKS: Dict[str, List[str]] = {
+    # Rosetta 2
+    'macos/arm64': ['macos/x86_64'],
+}
+
+
+def parse_platform(value: str) -> Platform:
+    target_os, _, target_arch = value.partition('/')
+    return target_os, target_arch or PackageArch.ANY
+
+
+def default_chain(target_os: str, target_arch: str) -> List[Platform]:
+    chain: List[Platform] = []
+    for os_ in (target_os, PackageOS.ANY):
+        for arch in (target_arch, PackageArch.ANY):
+            if (os_, arch) not in chain:
+                chain.append((os_, arch))
+    return chain
+
+
+@lru_cache(maxsize=256)
+def compatible_platforms(target_os: str, target_arch: str) -> Tuple[Platform, ...]:
+    """Platforms whose assets can be installed on the target, most preferred first."""
+    extra = {**DEFAULT_FALLBACKS, **settings.PLATFORM_FALLBACKS}.get(f'{target_os}/{target_arch}', [])
+    chain = default_chain(target_os, target_arch)
+    ordered = chain[:1]
+    for platform in [parse_platform(value) for value in extra] + chain[1:]:
+        if platform not in ordered:
+            ordered.append(platform)
+    return tuple(ordered)
+
+
+def rank_files(queryset: QuerySet, target_os: str, target_arch: str) -> QuerySet:
+    """
+    Restricts a PackageFile queryset to the assets compatible with the target, annotated with their
+    `platform_rank` (0 = preferred) so the best asset is picked by ordering, in the same query.
+    """
+    platforms = compatible_platforms(target_os, target_arch)
+    compatible = Q()
+    for os_, arch in platforms:
+        compatible |= Q(os=os_, architecture=arch)
+    return queryset.filter(compatible).annotate(platform_rank=Case(
+        *[When(os=os_, architecture=arch, then=Value(rank)) for rank, (os_, arch) in enumerate(platforms)],
+        output_field=IntegerField(),
+    ))
+
+
+def asset_type(package_file: PackageFile) -> str:
+    return "source" if package_file.os == PackageOS.ANY and package_file.architecture == PackageArch.ANY else "binary"
@@ -0,0 +1,243 @@
+"""
+Server-side dependency resolution.
+
+The whole dependency graph (every version and its declared dependencies) is loaded in two
+queries and kept in memory by each process, then transitive closures are resolved in memory.
+The graph itself is not put in the shared cache (unpickled on every resolve, and a large registry
+exceeds memcached's 1MB item limit): only a version key is, which invalidate_graph() changes
+so every process reloads its copy on its next resolve.
+Version selection is greedy: for each package the most recent version (by publication date,
+like the `latest` action) matching the first requirement met wins, later requirements on the same
+package must be satisfied by that choice or the resolution fails with a conflict.
+Yanked versions are only selected by exact pins.
+"""
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Dependency, PackageFile, PackageVersion
+from .platforms import rank_files
+
+GRAPH_VERSION_CACHE_KEY = 'packages:dependency_graph:version'
+
+VERSION_REGEX = re.compile(r'^(\d+)\.(\d+)\.(\d+)(?:-([a-zA-Z0-9]+))?$')
+EXACT_PIN_REGEX = re.compile(r'^=?\s*\d+\.\d+\.\d+(?:-[a-zA-Z0-9]+)?$')
+CONSTRAINT_REGEX = re.compile(r'^(\^|~|>=|<=|>|<|=)?\s*(\S+)$')
+
+VersionKey = Tuple[int, int, int, int, str]
+
+
+class ResolutionError(Exception):
+    """The requested set of packages can't be resolved (conflict or cycle)."""
+
+
+class PackageNotFound(ResolutionError):
+    pass
+
+
+def parse_version(value: str) -> VersionKey:
+    """Sortable key for a SemVer string (pre-releases sort before the release)."""
+    match = VERSION_REGEX.match(value)
+    if not match:
+        raise ValueError(f"Invalid version '{value}'.")
+    major, minor, patch, pre = match.groups()
+    return (int(major), int(minor), int(patch), 0 if pre else 1, pre or '')
+
+
+def parse_requirement(requirement: str) -> List[Callable[[VersionKey], bool]]:
+    """
+    Compiles a requirement into a list of predicates (all must match).
+    Supports '*', exact ('1.2.3' or '=1.2.3'), caret ('^1.2.3'), tilde ('~1.2.3')
+    and comparisons ('>=1.0.0, <2.0.0').
+    """
+    requirement = requirement.strip()
+    if requirement in ('', '*'):
+        return []
+
+    predicates: List[Callable[[VersionKey], bool]] = []
+    for part in requirement.split(','):
+        match = CONSTRAINT_REGEX.match(part.strip())
+        if not match:
+            raise ValueError(f"Invalid requirement '{requirement}'.")
+        operator, raw_version = match.groups()
+        bound = parse_version(raw_version)
+        major, minor = bound[0], bound[1]
+
+        if operator in (None, '='):
+            predicates.append(lambda v, b=bound: v == b)
+        elif operator == '^':
+            upper = (major + 1, 0, 0, 0, '') if major else (0, minor + 1, 0, 0, '')
+            predicates.append(lambda v, b=bound, u=upper: b <= v < u)
+        elif operator == '~':
+            upper = (major, minor + 1, 0, 0, '')
+            predicates.append(lambda v, b=bound, u=upper: b <= v < u)
+        elif operator == '>=':
+            predicates.append(lambda v, b=bound: v >= b)
+        elif operator == '>':
+            predicates.append(lambda v, b=bound: v > b)
+        elif operator == '<=':
+            predicates.append(lambda v, b=bound: v <= b)
+        else:
+            predicates.append(lambda v, b=bound: v < b)
+    return predicates
+
+
+def is_exact_pin(requirement: str) -> bool:
+    """Exact pins ('1.2.3', '=1.2.3') are the only requirements allowed to select a yanked version."""
+    return bool(EXACT_PIN_REGEX.match(requirement.strip()))
+
+
+def satisfies(version: str, requirement: str) -> bool:
+    key = parse_version(version)
+    return all(predicate(key) for predicate in parse_requirement(requirement))
+
+
+@dataclass
+class VersionNode:
+    id: int
+    package: str
+    version: str
+    yanked: bool = False
+    deprecation: str = ''
+    dependencies: Dict[str, str] = field(default_factory=dict)
+
+
+# package name -> versions, most recent first
+DependencyGraph = Dict[str, List[VersionNode]]
+
+
+def load_graph() -> DependencyGraph:
+    """Builds the full graph in two queries."""
+    nodes: Dict[int, VersionNode] = {}
+    graph: DependencyGraph = defaultdict(list)
+    rows = PackageVersion.objects.order_by('-created_at').values_list(
+        'id', 'package__name', 'version_number', 'is_yanked', 'is_deprecated', 'deprecation_message'
+    )
+    for version_id, package_name, version_number, yanked, deprecated, message in rows.iterator(chunk_size=2000):
+        node = VersionNode(
+            id=version_id, package=package_name, version=version_number,
+            yanked=yanked, deprecation=(message or 'deprecated') if deprecated else '',
+        )
+        nodes[version_id] = node
+        graph[package_name].append(node)
+
+    edges = Dependency.objects.values_list('version_id', 'name', 'requirement')
+    for version_id, name, requirement in edges.iterator(chunk_size=2000):
+        if version_id in nodes:
+            nodes[version_id].dependencies[name] = requirement
+
+    return dict(graph)
+
+
+# (version key, loaded at (monotonic), graph) of this process
+_graph: Optional[Tuple[str, float, DependencyGraph]] = None
+_graph_lock = threading.Lock()
+
+
+def get_graph_version() -> str:
+    version: Optional[str] = cache.get(GRAPH_VERSION_CACHE_KEY)
+    if version is None:
+        # add() so that concurrent processes agree on the same key
+        cache.add(GRAPH_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(GRAPH_VERSION_CACHE_KEY) or ''
+    return version
+
+
+def get_graph() -> DependencyGraph:
+    """The graph of this process, reloaded when invalidated or older than DEPENDENCY_GRAPH_TTL."""
+    global _graph
+    version = get_graph_version()
+    current = _graph
+    if current is not None and current[0] == version and time.monotonic() - current[1] < settings.DEPENDENCY_GRAPH_TTL:
+        return current[2]
+    with _graph_lock:
+        # Another thread may have reloaded it while we waited
+        current = _graph
+        if current is None or current[0] != version or time.monotonic() - current[1] >= settings.DEPENDENCY_GRAPH_TTL:
+            current = (version, time.monotonic(), load_graph())
+            _graph = current
+    return current[2]
+
+
+def invalidate_graph() -> None:
+    cache.set(GRAPH_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def resolve(roots: Dict[str, str], graph: Optional[DependencyGraph] = None) -> List[VersionNode]:
+    """
+    Resolves the transitive closure of `roots` ({name: requirement}).
+    Returns the selected versions in install order (dependencies before their dependents).
+    """
+    graph = get_graph() if graph is None else graph
+    selected: Dict[str, VersionNode] = {}
+    required_by: Dict[str, str] = {}
+    ordered: List[VersionNode] = []
+    path: List[str] = []
+
+    def visit(name: str, requirement: str, parent: str) -> None:
+        if name in path:
+            cycle = path[path.index(name):] + [name]
+            raise ResolutionError(f"Dependency cycle detected: {' -> '.join(cycle)}")
+
+        if name in selected:
+            if not satisfies(selected[name].version, requirement):
+                raise ResolutionError(
+                    f"Version conflict on '{name}': {parent} requires '{requirement}' "
+                    f"but {required_by[name]} selected v{selected[name].version}"
+                )
+            return
+
+        candidates = graph.get(name)
+        if not candidates:
+            raise PackageNotFound(f"Package '{name}' not found (required by {parent}).")
+
+        predicates = parse_requirement(requirement)
+        allow_yanked = is_exact_pin(requirement)
+        node = next(
+            (
+                c for c in candidates
+                if (allow_yanked or not c.yanked) and all(predicate(parse_version(c.version)) for predicate in predicates)
+            ),
+            None,
+        )
+        if node is None:
+            raise PackageNotFound(f"No version of '{name}' matches '{requirement}' (required by {parent}).")
+
+        selected[name] = node
+        required_by[name] = parent
+        path.append(name)
+        for dependency, dependency_requirement in node.dependencies.items():
+            visit(dependency, dependency_requirement, f"{name} v{node.version}")
+        path.pop()
+        ordered.append(node)
+
+    for name, requirement in roots.items():
+        visit(name, requirement, 'the request')
+
+    return ordered
+
+
+def select_files(nodes: List[VersionNode], target_os: str, target_arch: str) -> Dict[int, PackageFile]:
+    """
+    Picks the asset of each resolved version for the target platform in one query:
+    the best ranked in the platform fallback chain, like the `latest` action.
+    Versions without a compatible asset are missing from the result.
+    """
+    files = rank_files(
+        PackageFile.objects.filter(version_id__in=[node.id for node in nodes]), target_os, target_arch
+    ).select_related('version').only(
+        # Only what the response and record_downloads need (not the version readme)
+        'id', 'file', 'os', 'architecture', 'version_id', 'version__package_id'
+    ).order_by('version_id', 'platform_rank')
+
+    chosen: Dict[int, PackageFile] = {}
+    for package_file in files:
+        chosen.setdefault(package_file.version_id, package_file)
+    return chosen
@@ -1,13 +1,27 @@
 import re
-from rest_framework import serializers
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from django.db.models import QuerySet
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from .models import Package, PackageVersion, PackageFile
+from .resolver import parse_requirement
 
 # Liste des noms réservés pour le système ou les futures libs standard
 RESERVED_NAMES = [
     'aegis', 'std', 'core', 'math', 'http', 'net', 'io', 'system', 
-    'admin', 'root', 'test', 'official', 'registry', 'config', 'user'
+    'admin', 'root', 'test', 'official', 'registry', 'config', 'user',
+    # Routes of the API actions on the collection: /api/packages/<name>/ would never reach these packages
+    'publish', 'suggest', 'provides', 'resolve', 'verify',
 ]
 
+# Upper bound of entries checked by a single 'verify' request
+LOCKFILE_MAX_ENTRIES = 5000
+
 class VersionSerializer(serializers.ModelSerializer):
     """
     Sert à afficher les versions imbriquées dans la liste des paquets.
@@ -94,4 +108,132 @@ class PackageUploadSerializer(serializers.Serializer):
             raise serializers.ValidationError(f"File too large. Size should not exceed {limit_mb} MB.")
              
         return value
-    
\ No newline at end of file
+    
+
+class ResolveSerializer(serializers.Serializer):
+    """
+    Input of the 'resolve' action: the root dependencies, in the same
+    shape as the [dependencies] table of aegis.toml, and the target platform.
+    """
+    dependencies = serializers.DictField(child=serializers.CharField(allow_blank=True), allow_empty=False)
+    os = serializers.CharField(required=False, default="any")
+    architecture = serializers.CharField(required=False, default="any")
+
+    def validate_dependencies(self, value):
+        for name, requirement in value.items():
+            try:
+                parse_requirement(requirement)
+            except ValueError as e:
+                raise serializers.ValidationError(f"{name}: {e}")
+        return value
+
+
+class LockEntrySerializer(serializers.Serializer):
+    """One entry of a lockfile, as written by the CLI."""
+    name = serializers.CharField(max_length=100)
+    version = serializers.CharField(max_length=20)
+    os = serializers.CharField(required=False, default="any")
+    architecture = serializers.CharField(required=False, default="any")
+    digest = serializers.CharField(required=False, allow_blank=True, default="")
+
+    def validate_digest(self, value):
+        """Accepts 'sha256:<hex>' or a bare hex digest."""
+        value = value.strip().lower()
+        if value.startswith('sha256:'):
+            value = value[len('sha256:'):]
+        return value
+
+
+class LockfileSerializer(serializers.Serializer):
+    """Input of the 'verify' action."""
+    entries = LockEntrySerializer(many=True, allow_empty=False, max_length=LOCKFILE_MAX_ENTRIES)
+
+
+class VersionStatusSerializer(serializers.Serializer):
+    """Input of the 'yank', 'unyank' and 'deprecate' actions."""
+    version = serializers.CharField(max_length=20)
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True, default="")
+    undo = serializers.BooleanField(required=False, default=False)
+
+
+# --- Read path ---------------------------------------------------------------
+# (output key, values() lookup, field) ; lookup None = nested serializer
+CompiledField = Tuple[str, Optional[str], Optional[serializers.Field]]
+Representer = Tuple[str, Optional[str], Optional[Callable[[Any], Any]]]
+
+
+@lru_cache(maxsize=None)
+def compile_fields(serializer_class: Type[serializers.ModelSerializer]) -> Tuple[CompiledField, ...]:
+    """
+    Builds the fields of a ModelSerializer once and keeps, for each readable field,
+    the `.values()` lookup of its source and the field itself.
+    """
+    compiled = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            compiled.append((name, None, None))
+        else:
+            compiled.append((name, field.source.replace('.', '__'), field))
+    return tuple(compiled)
+
+
+def _datetime_representation(field: serializers.DateTimeField) -> Callable[[Any], Any]:
+    """
+    DateTimeField.to_representation with the current timezone resolved once per call
+    instead of once per value (that lookup dominates when serializing thousands of rows).
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def represent(value: Any) -> Any:
+        if not isinstance(value, datetime) or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    return represent
+
+
+def _representers(serializer_class: Type[serializers.ModelSerializer]) -> Tuple[Representer, ...]:
+    return tuple(
+        (name, lookup, None if field is None else (
+            _datetime_representation(field) if isinstance(field, serializers.DateTimeField) else field.to_representation
+        ))
+        for name, lookup, field in compile_fields(serializer_class)
+    )
+
+
+def _represent(fields: Tuple[Representer, ...], row: Dict[str, Any], nested: Dict[str, Any]) -> Dict[str, Any]:
+    # None n'est jamais passé à to_representation, comme dans Serializer.to_representation
+    return {
+        name: nested[name] if lookup is None else (None if row[lookup] is None else represent(row[lookup]))
+        for name, lookup, represent in fields
+    }
+
+
+def serialize_packages(queryset: QuerySet[Package]) -> List[Dict[str, Any]]:
+    """
+    Read-only equivalent of `PackageSerializer(queryset, many=True).data` for the list and
+    retrieve endpoints: same keys, same order, same representation of each value, but rows are
+    fetched with `.values()` (2 queries whatever the number of packages) and turned into dicts
+    directly, without instantiating models nor per-object serializer fields.
+    """
+    package_fields = _representers(PackageSerializer)
+    version_fields = _representers(VersionSerializer)
+
+    rows = list(queryset.values('id', *(lookup for _, lookup, _ in package_fields if lookup)))
+    if not rows:
+        return []
+
+    versions: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    version_rows = PackageVersion.objects.filter(package_id__in=[row['id'] for row in rows]).values(
+        'package_id', *(lookup for _, lookup, _ in version_fields)
+    )
+    for row in version_rows:
+        versions[row['package_id']].append(_represent(version_fields, row, {}))
+
+    return [_represent(package_fields, row, {'versions': versions[row['id']]}) for row in rows]
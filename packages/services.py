@@ -1,7 +1,24 @@
-from typing import  Dict, Optional
-from django.db.models import Sum, QuerySet
-from .models import Package
-import markdown
+import time
+from datetime import timedelta
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, QuerySet, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from authentication.models import User
+from core import edge
+from core.tracing import span, traced
+from .archives import list_archive
+from .models import (
+    Package, PackageVersion, PackageFile, PackageFileEntry, PackageOS, PackageArch, Dependency, DownloadStat,
+    PublishIdempotencyKey, RegistryStats
+)
+from .platforms import compatible_platforms
+from .resolver import invalidate_graph
+
+# Seconds between two reads of a key reserved by an overlapping publish
+IDEMPOTENCY_POLL_INTERVAL = 0.1
 
 
 class PackageService:
@@ -16,15 +33,396 @@ class PackageService:
         result: Dict[str, int] = Package.objects.aggregate(total=Sum('download_count'))
         return result.get('total') or 0
 
+    @staticmethod
+    def get_registry_stats() -> RegistryStats:
+        """Registry-wide counters, maintained incrementally (no aggregate over Package)."""
+        return RegistryStats.load()
+
+    @staticmethod
+    @traced('PackageService.record_download')
+    def record_download(package: Package, version: PackageVersion, package_file: PackageFile) -> None:
+        """Increments every download counter. F expressions avoid race conditions."""
+        Package.objects.filter(pk=package.pk).update(download_count=F('download_count') + 1)
+        PackageVersion.objects.filter(pk=version.pk).update(download_count=F('download_count') + 1)
+        PackageFile.objects.filter(pk=package_file.pk).update(download_count=F('download_count') + 1)
+        PackageService.record_daily_downloads([package.pk])
+
+    @staticmethod
+    @traced('PackageService.record_downloads')
+    def record_downloads(package_files: List[PackageFile]) -> None:
+        """
+        Same as record_download for a batch of files (one per package),
+        in a constant number of queries.
+        """
+        if not package_files:
+            return
+        Package.objects.filter(pk__in=[f.version.package_id for f in package_files]).update(download_count=F('download_count') + 1)
+        PackageVersion.objects.filter(pk__in=[f.version_id for f in package_files]).update(download_count=F('download_count') + 1)
+        PackageFile.objects.filter(pk__in=[f.pk for f in package_files]).update(download_count=F('download_count') + 1)
+        PackageService.record_daily_downloads([f.version.package_id for f in package_files])
+
+    @staticmethod
+    @traced('PackageService.record_daily_downloads')
+    def record_daily_downloads(package_ids: List[int]) -> None:
+        """
+        Adds one download to today's DownloadStat row of each package.
+        The rows are created first (ignore_conflicts) so the increment stays a single atomic UPDATE.
+        """
+        today = timezone.now().date()
+        DownloadStat.objects.bulk_create(
+            [DownloadStat(package_id=package_id, date=today) for package_id in package_ids],
+            ignore_conflicts=True,
+        )
+        DownloadStat.objects.filter(package_id__in=package_ids, date=today).update(count=F('count') + 1)
+
+    @staticmethod
+    def with_latest_version(queryset: QuerySet[Package]) -> QuerySet[Package]:
+        """
+        Annotates each package with its latest version number and joins its author,
+        so that cards and lists render without one query per package.
+        """
+        latest = PackageVersion.objects.filter(package=OuterRef('pk'), is_yanked=False).order_by('-created_at')
+        return queryset.select_related('author').annotate(
+            latest_version_number=Subquery(latest.values('version_number')[:1])
+        )
+
     @staticmethod
     def get_recent_packages(limit: int = 6) -> QuerySet[Package]:
-        return Package.objects.order_by('-updated_at')[:limit]
+        return PackageService.with_latest_version(Package.objects.order_by('-updated_at'))[:limit]
+
+    @staticmethod
+    def get_author_stats(author: User, days: int = 30) -> Dict[str, Any]:
+        """
+        Dashboard of an author in 2 queries whatever the number of packages:
+        the packages with their latest version (annotated), totals summed from the same rows,
+        and the daily downloads of the last `days` days (zero-filled) from DownloadStat.
+        """
+        packages = list(
+            PackageService.with_latest_version(Package.objects.filter(author=author).order_by('-updated_at'))
+            .values('name', 'description', 'download_count', 'dependents_count', 'updated_at', 'latest_version_number')
+        )
+        for package in packages:
+            package['latest_version'] = package.pop('latest_version_number')
+
+        today = timezone.now().date()
+        since = today - timedelta(days=days - 1)
+        daily = dict(
+            DownloadStat.objects.filter(package__author=author, date__gte=since)
+            .values('date').annotate(total=Sum('count')).values_list('date', 'total')
+        )
+
+        return {
+            'username': author.username,
+            'total_packages': len(packages),
+            'total_downloads': sum(package['download_count'] for package in packages),
+            'downloads_over_time': [
+                {'date': since + timedelta(days=offset), 'downloads': daily.get(since + timedelta(days=offset), 0)}
+                for offset in range(days)
+            ],
+            'packages': packages,
+        }
+
+    @staticmethod
+    def get_dependents(package: Package) -> QuerySet[Package]:
+        """Packages with at least one version depending on `package` (reverse dependency index)."""
+        return Package.objects.filter(versions__dependencies__name=package.name).distinct()
+
+    @staticmethod
+    @traced('PackageService.refresh_dependents_count')
+    def refresh_dependents_count(names: Iterable[str]) -> None:
+        """
+        Recomputes Package.dependents_count for the given package names only,
+        in a single UPDATE driven by the reverse dependency index.
+        """
+        names = list(set(names))
+        if not names:
+            return
+        Package.objects.filter(name__in=names).update(dependents_count=PackageService.dependents_count())
+
+    @staticmethod
+    def dependents_count() -> Coalesce:
+        """Number of packages depending on the package `OuterRef('name')` (a version of them at least)."""
+        dependents = (
+            Dependency.objects.filter(name=OuterRef('name'))
+            .values('name')
+            .annotate(total=Count('version__package', distinct=True))
+            .values('total')
+        )
+        return Coalesce(Subquery(dependents), 0)
+
+    @staticmethod
+    @traced('PackageService.package_changed')
+    def package_changed(package: Package) -> None:
+        """
+        Propagates a change that doesn't go through publish (yank, deprecation):
+        touching updated_at expires the cached fragments, the dependency graph is rebuilt.
+        """
+        package.save(update_fields=['updated_at'])
+        invalidate_graph()
+        PackageService.purge_pages([package.name])
+
+    @staticmethod
+    def surrogate_key(name: str) -> str:
+        """Edge cache tag of the pages showing `name` in detail."""
+        return f'package-{name}'
+
+    @staticmethod
+    def purge_pages(names: Iterable[str]) -> None:
+        """
+        Purges the edge copies of the detail pages of `names`, and of the homepage and package list,
+        which show the latest packages, their versions and the registry counters.
+        """
+        edge.purge(['index', 'package-list', *(PackageService.surrogate_key(name) for name in names)])
+
+    @staticmethod
+    @traced('PackageService.store_package_file')
+    def store_package_file(version: PackageVersion, upload: Any, target_os: str, target_arch: str,
+                           digest: str) -> Tuple[PackageFile, bool]:
+        """
+        Creates the file of `version` for a platform, or returns the one already there (created=False).
+        Safe under concurrent uploads of the same platform without holding a lock during the upload:
+        the blob is written first, then the row is inserted in its own transaction; the loser of the
+        race (unique version/os/architecture) deletes its blob and gets the winner's row.
+        """
+        existing = PackageFile.objects.filter(version=version, os=target_os, architecture=target_arch).first()
+        if existing is not None:
+            return existing, False
+
+        package_file = PackageFile(version=version, os=target_os, architecture=target_arch, sha256=digest)
+        with span('save blob', size=upload.size):
+            package_file.file.save(upload.name, upload, save=False)
+        try:
+            with transaction.atomic():
+                package_file.save()
+        except IntegrityError:
+            package_file.file.delete(save=False)
+            return PackageFile.objects.get(version=version, os=target_os, architecture=target_arch), False
+        return package_file, True
+
+    @staticmethod
+    @traced('PackageService.index_package_file')
+    def index_package_file(package_file: PackageFile, archive: IO[bytes]) -> int:
+        """
+        Indexes the file listing of the archive of `package_file` (replacing a previous index)
+        and marks the file as indexed. Returns the number of entries.
+        """
+        entries = list_archive(
+            archive, settings.ARCHIVE_INDEX_MAX_ENTRIES, PackageFileEntry._meta.get_field('path').max_length
+        )
+        with transaction.atomic():
+            PackageFileEntry.objects.filter(package_file=package_file).delete()
+            PackageFileEntry.objects.bulk_create([
+                PackageFileEntry(
+                    package_file=package_file, path=entry.path, name=entry.path.rsplit('/', 1)[-1],
+                    size=entry.size, sha256=entry.sha256,
+                )
+                for entry in entries
+            ], batch_size=1000)
+            PackageFile.objects.filter(pk=package_file.pk).update(indexed_at=timezone.now())
+        return len(entries)
+
+    @staticmethod
+    def find_providers(path: str = '', prefix: str = '', name: str = '', limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Archive entries, across the registry, with this exact path, under this path prefix or with
+        this file name. Each lookup is a range scan of an index, returned in index order.
+        """
+        entries = PackageFileEntry.objects.all()
+        if path:
+            entries = entries.filter(path=path).order_by('pk')
+        elif prefix:
+            entries = entries.filter(path__startswith=prefix).order_by('path', 'pk')
+        else:
+            entries = entries.filter(name=name).order_by('pk')
+        rows = entries.values(
+            'path', 'size', 'sha256', 'package_file__os', 'package_file__architecture',
+            'package_file__version__version_number', 'package_file__version__package__name',
+        )[:limit]
+        return [
+            {
+                'package': row['package_file__version__package__name'],
+                'version': row['package_file__version__version_number'],
+                'os': row['package_file__os'],
+                'architecture': row['package_file__architecture'],
+                'path': row['path'],
+                'size': row['size'],
+                'sha256': row['sha256'],
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def get_file_listing(package_file: PackageFile) -> List[Dict[str, Any]]:
+        """Indexed listing of an archive, sorted like a file tree (no blob access)."""
+        entries = list(package_file.entries.values('path', 'size', 'sha256'))
+        entries.sort(key=lambda entry: entry['path'].split('/'))
+        return entries
+
+    @staticmethod
+    def get_file_tree(package: Package, limit: int) -> Dict[str, Any]:
+        """
+        File tree of the latest version (source archive preferred) for the detail page,
+        as flat rows with their depth: a directory row precedes its content.
+        """
+        latest = package._get_latest()
+        package_file = None
+        if latest is not None:
+            package_file = PackageFile.objects.filter(version=latest).order_by(
+                Case(When(os=PackageOS.ANY, architecture=PackageArch.ANY, then=Value(0)), default=Value(1)), 'pk'
+            ).first()
+        if package_file is None or package_file.indexed_at is None:
+            return {'rows': [], 'total': 0, 'indexed': False}
+
+        entries = PackageService.get_file_listing(package_file)
+        rows: List[Dict[str, Any]] = []
+        opened: List[str] = []
+        for entry in entries[:limit]:
+            *directories, file_name = entry['path'].split('/')
+            common = 0
+            while common < min(len(directories), len(opened)) and directories[common] == opened[common]:
+                common += 1
+            for depth in range(common, len(directories)):
+                rows.append({'name': directories[depth] + '/', 'depth': depth, 'is_dir': True})
+            opened = directories
+            rows.append({'name': file_name, 'depth': len(directories), 'is_dir': False, 'size': entry['size']})
+        return {
+            'rows': rows, 'total': len(entries), 'hidden': max(len(entries) - limit, 0), 'indexed': True,
+            'os': package_file.os, 'architecture': package_file.architecture,
+        }
+
+    @staticmethod
+    @traced('PackageService.claim_idempotency_key')
+    def claim_idempotency_key(user: User, key: str, fingerprint: str) -> Optional[PublishIdempotencyKey]:
+        """
+        Reserves a key before publishing: returns None when the caller holds the reservation (it must
+        publish, then save or release the key), otherwise the row of the request that used the key first.
+        A retry overlapping that request waits up to PUBLISH_IDEMPOTENCY_WAIT seconds for its response
+        (status_code stays None until then). Expired keys and reservations abandoned for longer than
+        the wait (crashed request) are taken over.
+        """
+        deadline = time.monotonic() + settings.PUBLISH_IDEMPOTENCY_WAIT
+        while True:
+            # The unique (user, key) index makes concurrent requests insert the reservation one at a time
+            stored, created = PublishIdempotencyKey.objects.get_or_create(
+                user=user, key=key, defaults={'fingerprint': fingerprint}
+            )
+            if created:
+                return None
+            now = timezone.now()
+            expired = stored.created_at < now - timedelta(hours=settings.PUBLISH_IDEMPOTENCY_TTL)
+            abandoned = stored.status_code is None and stored.created_at < now - timedelta(seconds=settings.PUBLISH_IDEMPOTENCY_WAIT)
+            if expired or abandoned:
+                # Conditional on the row being unchanged: a single request takes it over
+                if PublishIdempotencyKey.objects.filter(pk=stored.pk, created_at=stored.created_at).update(
+                    fingerprint=fingerprint, status_code=None, response=None, created_at=now
+                ):
+                    return None
+                continue
+            if stored.status_code is not None or stored.fingerprint != fingerprint or time.monotonic() >= deadline:
+                return stored
+            time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+    @staticmethod
+    @traced('PackageService.save_idempotent_response')
+    def save_idempotent_response(user: User, key: str, status_code: int, response: Dict[str, Any]) -> None:
+        """Stores the response of a reserved key, replayed to the retries."""
+        PublishIdempotencyKey.objects.filter(user=user, key=key).update(status_code=status_code, response=response)
+
+    @staticmethod
+    def release_idempotency_key(user: User, key: str) -> None:
+        """Drops the reservation of a publish that failed without a response worth replaying."""
+        PublishIdempotencyKey.objects.filter(user=user, key=key, status_code__isnull=True).delete()
+
+    @staticmethod
+    def set_yanked(version: PackageVersion, yanked: bool, reason: str = '') -> None:
+        version.is_yanked = yanked
+        version.yank_reason = reason if yanked else ''
+        version.yanked_at = timezone.now() if yanked else None
+        version.save(update_fields=['is_yanked', 'yank_reason', 'yanked_at'])
+        PackageService.package_changed(version.package)
+
+    @staticmethod
+    def set_deprecated(version: PackageVersion, deprecated: bool, message: str = '') -> None:
+        version.is_deprecated = deprecated
+        version.deprecation_message = message if deprecated else ''
+        version.save(update_fields=['is_deprecated', 'deprecation_message'])
+        PackageService.package_changed(version.package)
+
+    @staticmethod
+    @traced('PackageService.verify_lockfile')
+    def verify_lockfile(entries: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Checks every lockfile entry (name, version, os, architecture, digest) in two set-based queries.
+        Each verdict carries a 'status':
+        - ok: the file exists and its digest matches
+        - unverified: the file exists but one of the two digests is unknown
+        - yanked: the file exists (digest not mismatching) but the version has been yanked since
+        - digest_mismatch / missing_version / missing_file
+        and the stored file name ('file') when it exists.
+        The file of an entry is the one `latest`/`resolve` serve for its platform (fallback chain),
+        its platform is returned as 'file_os'/'file_architecture' when it's a fallback.
+        """
+        versions: Dict[tuple, Dict[str, Any]] = {
+            (row['package__name'], row['version_number']): row
+            for row in PackageVersion.objects.filter(
+                package__name__in={e['name'] for e in entries},
+                version_number__in={e['version'] for e in entries},
+            ).values('id', 'package__name', 'version_number', 'is_yanked', 'yank_reason')
+        }
+        files: Dict[tuple, Dict[str, Any]] = {
+            (row['version_id'], row['os'], row['architecture']): row
+            for row in PackageFile.objects.filter(version_id__in={v['id'] for v in versions.values()}).values(
+                'version_id', 'os', 'architecture', 'sha256', 'file'
+            )
+        }
+
+        verdicts: List[Dict[str, Any]] = []
+        for entry in entries:
+            verdict: Dict[str, Any] = {
+                'name': entry['name'],
+                'version': entry['version'],
+                'os': entry['os'],
+                'architecture': entry['architecture'],
+            }
+            version = versions.get((entry['name'], entry['version']))
+            row = None
+            if version is not None:
+                row = next(
+                    (files[(version['id'], *platform)] for platform in compatible_platforms(entry['os'], entry['architecture'])
+                     if (version['id'], *platform) in files),
+                    None,
+                )
+
+            if version is None:
+                verdict['status'] = 'missing_version'
+            elif row is None:
+                verdict['status'] = 'missing_file'
+            elif entry['digest'] and row['sha256'] and entry['digest'] != row['sha256']:
+                verdict['status'] = 'digest_mismatch'
+            elif version['is_yanked']:
+                # Still downloadable (exact pin), but the lockfile should be updated
+                verdict['status'] = 'yanked'
+                verdict['reason'] = version['yank_reason']
+            elif not entry['digest'] or not row['sha256']:
+                verdict['status'] = 'unverified'
+            else:
+                verdict['status'] = 'ok'
+
+            if row is not None:
+                verdict['file'] = row['file']
+                if (row['os'], row['architecture']) != (entry['os'], entry['architecture']):
+                    verdict['file_os'], verdict['file_architecture'] = row['os'], row['architecture']
+            verdicts.append(verdict)
+        return verdicts
 
     @staticmethod
     def render_markdown(text: Optional[str]) -> str:
         """Safely renders markdown content to HTML."""
         if not text:
             return ""
+        # Imported on first use: markdown + pygments (codehilite) are only needed by the detail page
+        import markdown
+
         # Using extensions for code highlighting and tables
         return markdown.markdown(text, extensions=['fenced_code', 'codehilite', 'tables'])
     
\ No newline at end of file
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from .models import Package, PackageVersion, PackageFile, RegistryStats
+from .resolver import invalidate_graph
+from .services import PackageService
+
+
+@receiver(post_save, sender=Package)
+def count_created_package(sender, instance=None, created=False, **kwargs):
+    if created:
+        RegistryStats.bump(total_packages=1)
+
+
+@receiver(post_delete, sender=Package)
+def count_deleted_package(sender, instance=None, **kwargs):
+    RegistryStats.bump(total_packages=-1)
+    PackageService.purge_pages([instance.name])
+
+
+@receiver(post_save, sender=PackageVersion)
+def count_created_version(sender, instance=None, created=False, **kwargs):
+    if created:
+        RegistryStats.bump(total_versions=1)
+        # After the commit: the dependencies are inserted in the same transaction as the version
+        transaction.on_commit(invalidate_graph)
+
+
+@receiver(pre_delete, sender=PackageVersion)
+def remember_dependencies(sender, instance=None, **kwargs):
+    # The Dependency rows are gone by post_delete: keep the names to refresh their dependents count
+    instance._dependency_names = list(instance.dependencies.values_list('name', flat=True))
+
+
+@receiver(post_delete, sender=PackageVersion)
+def count_deleted_version(sender, instance=None, **kwargs):
+    RegistryStats.bump(total_versions=-1)
+    PackageService.refresh_dependents_count(getattr(instance, '_dependency_names', []))
+    invalidate_graph()
+
+
+@receiver(post_save, sender=PackageFile)
+def count_created_file(sender, instance=None, created=False, **kwargs):
+    if created:
+        RegistryStats.bump(total_files=1, total_bytes=instance.size)
+
+
+@receiver(post_delete, sender=PackageFile)
+def count_deleted_file(sender, instance=None, **kwargs):
+    RegistryStats.bump(total_files=-1, total_bytes=-instance.size)
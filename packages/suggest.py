@@ -0,0 +1,107 @@
+import copy
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .models import Package
+
+# Préfixes courts précalculés : ce sont eux qui couvrent le plus de noms
+PRECOMPUTED_PREFIX_LENGTH = 3
+
+Suggestion = Tuple[str, int]  # (name, download_count)
+
+
+class SuggestIndex:
+    """
+    Immutable in-memory prefix index over the package names, weighted by download_count.
+    - Names are kept sorted: the names starting with a prefix are a contiguous slice found by bisection.
+    - The top results of every prefix up to PRECOMPUTED_PREFIX_LENGTH characters are precomputed,
+      since those prefixes match the largest slices.
+    """
+
+    def __init__(self, entries: List[Suggestion], limit: int):
+        entries = sorted(entries)
+        self.limit = limit
+        self.names: List[str] = [name for name, _ in entries]
+        self.downloads: List[int] = [downloads for _, downloads in entries]
+        self.top: Dict[str, List[Suggestion]] = {}
+
+        # Par téléchargements décroissants : les K premiers noms vus pour un préfixe sont son top K
+        for name, downloads in sorted(entries, key=lambda entry: (-entry[1], entry[0])):
+            for length in range(1, min(len(name), PRECOMPUTED_PREFIX_LENGTH) + 1):
+                top = self.top.setdefault(name[:length], [])
+                if len(top) < limit:
+                    top.append((name, downloads))
+
+    def lookup(self, prefix: str, limit: int) -> List[Suggestion]:
+        limit = min(limit, self.limit)
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            return self.top.get(prefix, [])[:limit]
+
+        start = bisect_left(self.names, prefix)
+        end = bisect_left(self.names, prefix + '\uffff', lo=start)
+        candidates = zip(self.names[start:end], self.downloads[start:end])
+        return heapq.nsmallest(limit, candidates, key=lambda entry: (-entry[1], entry[0]))
+
+    def with_package(self, name: str, downloads: int = 0) -> "SuggestIndex":
+        """
+        Copy of the index including a newly published package, without a full rebuild:
+        one insertion in the sorted names and in the precomputed tops of its short prefixes.
+        """
+        position = bisect_left(self.names, name)
+        if position < len(self.names) and self.names[position] == name:
+            return self
+
+        index = copy.copy(self)
+        index.names = self.names[:position] + [name] + self.names[position:]
+        index.downloads = self.downloads[:position] + [downloads] + self.downloads[position:]
+        index.top = dict(self.top)
+        for length in range(1, min(len(name), PRECOMPUTED_PREFIX_LENGTH) + 1):
+            prefix = name[:length]
+            candidates = self.top.get(prefix, []) + [(name, downloads)]
+            index.top[prefix] = sorted(candidates, key=lambda entry: (-entry[1], entry[0]))[:self.limit]
+        return index
+
+
+_index: Optional[SuggestIndex] = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def build_index() -> SuggestIndex:
+    return SuggestIndex(list(Package.objects.values_list('name', 'download_count')), settings.SUGGEST_MAX_RESULTS)
+
+
+def get_index() -> SuggestIndex:
+    """
+    Index of the current process, rebuilt (one query) when older than SUGGEST_INDEX_TTL.
+    Lookups in between never touch the database.
+    """
+    global _index, _built_at
+    if _index is None or time.monotonic() - _built_at > settings.SUGGEST_INDEX_TTL:
+        with _lock:
+            if _index is None or time.monotonic() - _built_at > settings.SUGGEST_INDEX_TTL:
+                _index = build_index()
+                _built_at = time.monotonic()
+    return _index
+
+
+def add_suggestion(name: str) -> None:
+    """
+    Makes a package published by this process suggestible right away.
+    Other processes pick it up at their next refresh.
+    """
+    global _index
+    with _lock:
+        if _index is not None:
+            _index = _index.with_package(name)
+
+
+def find_suggestions(prefix: str, limit: int) -> List[Suggestion]:
+    return get_index().lookup(prefix.strip().lower(), limit)
@@ -1,3 +1,1037 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from packages import indexing, suggest
+from packages.api_views import AuthorViewSet, PackageViewSet
+from packages.archives import inspect_archive
+from packages.deltas import MANIFEST_NAME as DELTA_MANIFEST, build_delta_for, build_zip_delta, get_pending_files
+from packages.management.commands.check_registry import Command as CheckRegistry
+from packages.management.commands.index_advisor import Command as IndexAdvisor
+from packages.models import DownloadStat, Package, PackageFile, PackageVersion, RegistryStats
+from packages.platforms import compatible_platforms
+from packages.serializers import RESERVED_NAMES, PackageSerializer, serialize_packages
+from packages.services import PackageService
+
+try:
+    import boto3
+    import requests
+    from boto3.s3.transfer import TransferConfig
+    from moto import mock_aws
+except ImportError:  # s3 extra / moto not installed
+    mock_aws = None
+
+
+def make_archive(name: str, dependencies: Dict[str, str] = None, filename: str = 'package.zip',
+                 payload: bytes = b'') -> SimpleUploadedFile:
+    """A minimal publishable archive: aegis.toml manifest and README (plus an optional stored `payload`)."""
+    manifest = f"[package]\nname = '{name}'\n[dependencies]\n"
+    manifest += ''.join(f'{dependency} = "{requirement}"\n' for dependency, requirement in (dependencies or {}).items())
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('aegis.toml', manifest)
+        archive.writestr('README.md', f'# {name}')
+        if payload:
+            archive.writestr('lib/payload.bin', payload, compress_type=zipfile.ZIP_STORED)
+    return SimpleUploadedFile(filename, buffer.getvalue(), content_type='application/zip')
+
+
+def slow(function: Callable, delay: float = 0.3) -> Callable:
+    """`function` taking `delay` more seconds, to make concurrent requests overlap."""
+    def wrapper(*args, **kwargs):
+        time.sleep(delay)
+        return function(*args, **kwargs)
+    return wrapper
+
+
+class MediaRootMixin:
+    """Stores the archives uploaded by the test in a temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class IndexAdvisorTests(SimpleTestCase):
+    def test_sqlite_scans(self):
+        analyze = IndexAdvisor._analyze_sqlite
+        self.assertEqual(analyze("2 0 0 SCAN packages_package"), ["full scan (packages_package)"])
+        self.assertEqual(
+            analyze("5 0 0 SCAN packages_package USING INDEX package_updated_idx"),
+            ["full index scan (packages_package using package_updated_idx)"],
+        )
+        self.assertEqual(analyze("5 0 0 SCAN packages_package USING INDEX package_updated_idx", bounded=True), [])
+        self.assertEqual(analyze("4 0 0 SEARCH packages_package USING INDEX package_author_updated_idx (author_id=?)"), [])
+        self.assertEqual(analyze("9 0 0 USE TEMP B-TREE FOR ORDER BY"), ["filesort (temp b-tree)"])
+
+
+class RegistryStatsTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+
+    def publish(self, name: str, version: str = '1.0.0') -> None:
+        response = self.client.post('/api/packages/publish/', {
+            'name': name, 'version': version, 'file': make_archive(name),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def stored(self) -> Dict[str, int]:
+        stats = RegistryStats.load()
+        return {field: getattr(stats, field) for field in RegistryStats.compute()}
+
+    def test_signals_keep_the_counters_in_sync(self):
+        self.publish('alpha')
+        self.publish('alpha', '1.1.0')
+        self.publish('beta')
+        self.assertEqual(self.stored(), RegistryStats.compute())
+        self.assertEqual(self.stored()['total_files'], 3)
+
+        Package.objects.get(name='beta').delete()
+        self.assertEqual(self.stored(), RegistryStats.compute())
+        self.assertEqual(self.stored()['total_packages'], 1)
+
+    def test_downloads_leave_the_stats_row_alone(self):
+        self.publish('alpha')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/packages/alpha/latest/').status_code, 200)
+        self.assertFalse([query for query in queries if 'registrystats' in query['sql']])
+        self.assertEqual(RegistryStats.load().total_downloads, 0)
+
+        call_command('reconcile_stats', downloads=True, stdout=io.StringIO())
+        self.assertEqual(RegistryStats.load().total_downloads, 1)
+
+    def test_reconcile_stats(self):
+        self.publish('alpha')
+        RegistryStats.objects.filter(pk=RegistryStats.SINGLETON_ID).update(total_packages=7)
+
+        out = io.StringIO()
+        call_command('reconcile_stats', dry_run=True, stdout=out)
+        self.assertIn("total_packages: stored=7 actual=1", out.getvalue())
+        self.assertEqual(RegistryStats.load().total_packages, 7)
+
+        call_command('reconcile_stats', stdout=io.StringIO())
+        self.assertEqual(self.stored(), RegistryStats.compute())
+
+    def test_backfill_file_sizes(self):
+        self.publish('alpha')
+        package_file = PackageFile.objects.get()
+        PackageFile.objects.update(size=0)
+        RegistryStats.objects.update(total_bytes=0)
+
+        call_command('backfill_file_sizes', stdout=io.StringIO())
+        self.assertEqual(PackageFile.objects.get().size, package_file.size)
+        self.assertEqual(RegistryStats.load().total_bytes, package_file.size)
+
+
+def zip_bytes(entries: Dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in entries.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class DeltaTests(MediaRootMixin, TestCase):
+    payload = os.urandom(20_000)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+
+    def publish(self, version: str, payload: bytes = payload) -> PackageFile:
+        response = self.client.post('/api/packages/publish/', {
+            'name': 'deltapkg', 'version': version, 'file': make_archive('deltapkg', payload=payload),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return PackageFile.objects.get(version__version_number=version)
+
+    def test_build_zip_delta(self):
+        source = {'keep.txt': b'same', 'change.txt': b'before', 'remove.txt': b'gone'}
+        target = {'keep.txt': b'same', 'change.txt': b'after', 'add/new.txt': b'new'}
+        delta = build_zip_delta(io.BytesIO(zip_bytes(source)), io.BytesIO(zip_bytes(target)), '1.0.0', '1.1.0')
+
+        with zipfile.ZipFile(io.BytesIO(delta)) as archive:
+            # Unchanged entries are left out
+            self.assertNotIn('keep.txt', archive.namelist())
+            manifest = json.loads(archive.read(DELTA_MANIFEST))
+            self.assertEqual(manifest, {'format': 1, 'from': '1.0.0', 'to': '1.1.0', 'removed': ['remove.txt']})
+            # Applying it: source minus the removed entries, plus the delta entries
+            applied = {name: content for name, content in source.items() if name not in manifest['removed']}
+            applied.update({name: archive.read(name) for name in archive.namelist() if name != DELTA_MANIFEST})
+        self.assertEqual(applied, target)
+
+    def test_build_deltas_handles_each_file_once(self):
+        first = self.publish('1.0.0')
+        second = self.publish('1.1.0')
+
+        out = io.StringIO()
+        call_command('build_deltas', stdout=out)
+        self.assertIn("1 delta(s) built, 1 file(s) skipped", out.getvalue())
+        # The first version has no previous version: marked as handled too
+        self.assertEqual(PackageFile.objects.filter(pk__in=[first.pk, second.pk], delta_checked_at__isnull=True).count(), 0)
+
+        out = io.StringIO()
+        call_command('build_deltas', stdout=out)
+        self.assertIn("0 delta(s) built, 0 file(s) skipped", out.getvalue())
+
+    def test_delta_not_smaller_is_not_retried(self):
+        self.publish('1.0.0')
+        target = self.publish('1.1.0')
+        with mock.patch('packages.deltas.build_zip_delta', return_value=b'x' * target.size):
+            self.assertIsNone(build_delta_for(target))
+        self.assertIsNotNone(PackageFile.objects.get(pk=target.pk).delta_checked_at)
+        self.assertNotIn(target, get_pending_files())
+
+    def test_latest_offers_the_delta(self):
+        self.publish('1.0.0')
+        target = self.publish('1.1.0')
+        delta = build_delta_for(target)
+
+        response = self.client.get('/api/packages/deltapkg/latest/?from=1.0.0')
+        self.assertEqual(response.data['version'], '1.1.0')
+        self.assertEqual(
+            (response.data['delta']['from'], response.data['delta']['size']), ('1.0.0', delta.size)
+        )
+        self.assertTrue(response.data['delta']['url'].endswith(delta.file.url))
+
+        for installed in ('1.1.0', '0.9.0'):
+            self.assertNotIn('delta', self.client.get(f'/api/packages/deltapkg/latest/?from={installed}').data)
+        with self.settings(DELTA_MAX_RATIO=delta.size / target.size / 2):
+            self.assertNotIn('delta', self.client.get('/api/packages/deltapkg/latest/?from=1.0.0').data)
+
+
+@override_settings(ARCHIVE_INDEX_BACKGROUND=False)
+class ArchiveIndexTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+
+    def publish(self, name: str, version: str, index: bool = True, **platform: str) -> PackageFile:
+        with self.captureOnCommitCallbacks(execute=index):
+            response = self.client.post('/api/packages/publish/', {
+                'name': name, 'version': version, 'file': make_archive(name, payload=name.encode()), **platform,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return PackageFile.objects.get(version__package__name=name, version__version_number=version, **platform)
+
+    def test_publish_leaves_the_file_unindexed_until_committed(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            package_file = self.publish('lazyidx', '1.0.0', index=False)
+        package_file.refresh_from_db()
+        self.assertIsNone(package_file.indexed_at)
+        self.assertEqual(package_file.entries.count(), 0)
+        self.assertEqual(
+            self.client.get('/api/packages/lazyidx/contents/').data | {'files': None},
+            {'version': '1.0.0', 'os': 'any', 'architecture': 'any', 'indexed': False, 'files': None},
+        )
+
+        for callback in callbacks:
+            callback()
+        package_file.refresh_from_db()
+        self.assertIsNotNone(package_file.indexed_at)
+        self.assertEqual(
+            sorted(package_file.entries.values_list('path', flat=True)), ['README.md', 'aegis.toml', 'lib/payload.bin']
+        )
+
+    def test_index_archives_picks_up_unindexed_files(self):
+        package_file = self.publish('leftover', '1.0.0', index=False)
+        out = io.StringIO()
+        call_command('index_archives', stdout=out)
+        self.assertIn("1 archive(s) indexed (3 entries), 0 unreadable.", out.getvalue())
+        package_file.refresh_from_db()
+        self.assertIsNotNone(package_file.indexed_at)
+
+    def test_find_providers(self):
+        self.publish('providera', '1.0.0')
+        self.publish('providerb', '1.0.0')
+        self.publish('providerb', '1.1.0', index=False)  # Not indexed yet: not listed
+
+        def providers(**lookup: str) -> List[Tuple[str, str, str]]:
+            response = self.client.get('/api/packages/provides/', lookup)
+            self.assertEqual(response.status_code, 200, response.data)
+            return [(row['package'], row['version'], row['path']) for row in response.data['results']]
+
+        self.assertEqual(providers(path='lib/payload.bin'), [
+            ('providera', '1.0.0', 'lib/payload.bin'), ('providerb', '1.0.0', 'lib/payload.bin'),
+        ])
+        self.assertEqual(providers(prefix='lib/', limit='1'), [('providera', '1.0.0', 'lib/payload.bin')])
+        self.assertEqual([row[0] for row in providers(name='payload.bin')], ['providera', 'providerb'])
+        self.assertEqual(providers(path='payload.bin'), [])
+
+        entry = PackageService.find_providers(path='lib/payload.bin', limit=1)[0]
+        self.assertEqual((entry['os'], entry['architecture'], entry['size']), ('any', 'any', len('providera')))
+        self.assertEqual(entry['sha256'], hashlib.sha256(b'providera').hexdigest())
+
+        for query in ({}, {'path': 'README.md', 'name': 'README.md'}, {'name': 'README.md', 'limit': 'ten'}):
+            self.assertEqual(self.client.get('/api/packages/provides/', query).status_code, 400)
+
+    def test_contents(self):
+        self.publish('listed', '1.0.0')
+        self.publish('listed', '1.1.0', os='linux', architecture='x86_64')
+
+        response = self.client.get('/api/packages/listed/contents/', {'version': '1.0.0', 'os': 'linux', 'architecture': 'x86_64'})
+        # Platform fallback: 1.0.0 only ships any/any
+        self.assertEqual((response.data['version'], response.data['os'], response.data['indexed']), ('1.0.0', 'any', True))
+        self.assertEqual([entry['path'] for entry in response.data['files']], ['README.md', 'aegis.toml', 'lib/payload.bin'])
+
+        response = self.client.get('/api/packages/listed/contents/', {'os': 'linux', 'architecture': 'x86_64'})
+        self.assertEqual((response.data['version'], response.data['os']), ('1.1.0', 'linux'))
+        self.assertEqual(self.client.get('/api/packages/listed/contents/').status_code, 404)  # No any/any in 1.1.0
+        self.assertEqual(self.client.get('/api/packages/listed/contents/', {'version': '9.9.9'}).status_code, 404)
+
+    def test_detail_page_file_tree(self):
+        self.publish('treepkg', '1.0.0', index=False)
+        self.assertFalse(self.client.get('/packages/treepkg/').context['file_tree']()['indexed'])
+
+        self.publish('treepkg', '1.1.0')
+        response = self.client.get('/packages/treepkg/')
+        tree = response.context['file_tree']()
+        self.assertEqual(
+            [(row['name'], row['depth'], row['is_dir']) for row in tree['rows']],
+            [('README.md', 0, False), ('aegis.toml', 0, False), ('lib/', 0, True), ('payload.bin', 1, False)],
+        )
+        self.assertEqual((tree['total'], tree['hidden']), (3, 0))
+        self.assertContains(response, 'payload.bin')
+
+        tree = PackageService.get_file_tree(Package.objects.get(name='treepkg'), 2)
+        self.assertEqual((len(tree['rows']), tree['hidden']), (2, 1))
+
+
+class ResolveTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+
+    def publish(self, name: str, version: str, dependencies: Dict[str, str] = None) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/packages/publish/', {
+                'name': name, 'version': version, 'file': make_archive(name, dependencies),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def resolve(self, dependencies: Dict[str, str]):
+        return self.client.post('/api/packages/resolve/', {'dependencies': dependencies}, format='json')
+
+    def test_publishing_a_leaf_version_invalidates_the_graph(self):
+        self.publish('leafpkg', '1.0.0')
+        self.assertEqual(self.resolve({'leafpkg': '*'}).data['packages'][0]['version'], '1.0.0')
+
+        self.publish('leafpkg', '1.1.0')
+        self.assertEqual(self.resolve({'leafpkg': '*'}).data['packages'][0]['version'], '1.1.0')
+
+    def test_new_leaf_package_is_resolvable(self):
+        self.assertEqual(self.resolve({'newleaf': '*'}).status_code, 404)
+        self.publish('newleaf', '0.1.0')
+        self.publish('newapp', '1.0.0', {'newleaf': '^0.1.0'})
+
+        response = self.resolve({'newapp': '*'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([entry['name'] for entry in response.data['packages']], ['newleaf', 'newapp'])
+
+
+class VerifyLockfileTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+        archive = make_archive('lockpkg')
+        self.digest = hashlib.sha256(archive.read()).hexdigest()
+        archive.seek(0)
+        response = self.client.post('/api/packages/publish/', {
+            'name': 'lockpkg', 'version': '1.0.0', 'file': archive,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def verify(self, *entries: Dict[str, str]):
+        response = self.client.post('/api/packages/verify/', {'entries': list(entries)}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_verdicts(self):
+        data = self.verify(
+            {'name': 'lockpkg', 'version': '1.0.0', 'digest': f'sha256:{self.digest.upper()}'},
+            {'name': 'lockpkg', 'version': '1.0.0', 'digest': '0' * 64},
+            {'name': 'lockpkg', 'version': '2.0.0', 'digest': self.digest},
+            {'name': 'unknown', 'version': '1.0.0'},
+            {'name': 'lockpkg', 'version': '1.0.0'},
+        )
+        self.assertEqual([entry['status'] for entry in data['entries']], [
+            'ok', 'digest_mismatch', 'missing_version', 'missing_version', 'unverified',
+        ])
+        self.assertEqual(data['summary'], {'ok': 1, 'digest_mismatch': 1, 'missing_version': 2, 'unverified': 1})
+        self.assertFalse(data['ok'])
+        # The file exists: its URL is returned, even for a mismatch
+        self.assertEqual(['url' in entry for entry in data['entries']], [True, True, False, False, True])
+
+    def test_file_without_a_stored_digest_is_unverified(self):
+        PackageFile.objects.update(sha256='')
+        [entry] = self.verify({'name': 'lockpkg', 'version': '1.0.0', 'digest': self.digest})['entries']
+        self.assertEqual(entry['status'], 'unverified')
+
+    def test_missing_file(self):
+        PackageFile.objects.all().delete()
+        data = self.verify({'name': 'lockpkg', 'version': '1.0.0', 'digest': self.digest})
+        self.assertEqual(data['entries'][0]['status'], 'missing_file')
+
+    def test_all_ok_in_two_queries(self):
+        data = self.verify({'name': 'lockpkg', 'version': '1.0.0', 'digest': self.digest})
+        self.assertTrue(data['ok'])
+        with self.assertNumQueries(2):
+            PackageService.verify_lockfile([
+                {'name': 'lockpkg', 'version': '1.0.0', 'os': 'any', 'architecture': 'any', 'digest': self.digest}
+            ] * 50)
+
+    def test_invalid_lockfile(self):
+        response = self.client.post('/api/packages/verify/', {'entries': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class YankTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+        self.digests = {}
+        for version in ('1.0.0', '1.1.0'):
+            archive = make_archive('yankpkg', payload=version.encode())
+            self.digests[version] = hashlib.sha256(archive.read()).hexdigest()
+            archive.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/packages/publish/', {
+                    'name': 'yankpkg', 'version': version, 'file': archive,
+                }, format='multipart')
+            self.assertEqual(response.status_code, 201, response.data)
+
+    def yank(self, version: str, action: str = 'yank'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/packages/yankpkg/{action}/', {'version': version, 'reason': 'broken'}, format='json')
+
+    def resolved(self, requirement: str) -> Dict[str, Any]:
+        response = self.client.post('/api/packages/resolve/', {'dependencies': {'yankpkg': requirement}}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['packages'][0]
+
+    def test_yanked_version_is_skipped_by_latest_and_resolve(self):
+        self.assertEqual(self.yank('1.1.0').data['yanked'], True)
+
+        self.assertEqual(self.client.get('/api/packages/yankpkg/latest/').data['version'], '1.0.0')
+        resolved = self.resolved('*')
+        self.assertEqual((resolved['version'], 'yanked' in resolved), ('1.0.0', False))
+        # Exact pins still select it, flagged
+        pinned = self.resolved('=1.1.0')
+        self.assertEqual((pinned['version'], pinned['yanked']), ('1.1.0', True))
+
+        self.yank('1.1.0', 'unyank')
+        self.assertEqual(self.client.get('/api/packages/yankpkg/latest/').data['version'], '1.1.0')
+        self.assertEqual(self.resolved('*')['version'], '1.1.0')
+
+    def test_all_versions_yanked(self):
+        self.yank('1.0.0')
+        self.yank('1.1.0')
+        self.assertEqual(self.client.get('/api/packages/yankpkg/latest/').status_code, 404)
+        response = self.client.post('/api/packages/resolve/', {'dependencies': {'yankpkg': '*'}}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_verify_accepts_a_yanked_version_of_an_existing_lockfile(self):
+        self.yank('1.1.0')
+        response = self.client.post('/api/packages/verify/', {'entries': [
+            {'name': 'yankpkg', 'version': '1.0.0', 'digest': self.digests['1.0.0']},
+            {'name': 'yankpkg', 'version': '1.1.0', 'digest': f"sha256:{self.digests['1.1.0']}"},
+        ]}, format='json')
+        ok, yanked = response.data['entries']
+        self.assertEqual(ok['status'], 'ok')
+        # Still installable, with a warning
+        self.assertEqual((yanked['status'], yanked['reason']), ('yanked', 'broken'))
+        self.assertIn('url', yanked)
+        self.assertFalse(response.data['ok'])
+
+    def test_only_the_author_yanks(self):
+        self.client.force_authenticate(User.objects.create_user(username='other', email='other@example.com'))
+        self.assertEqual(self.yank('1.1.0').status_code, 403)
+        self.assertFalse(PackageVersion.objects.get(version_number='1.1.0').is_yanked)
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author', email='author@example.com')
+        for name, downloads in (('http', 50), ('httpx', 80), ('http_client', 10), ('htmlkit', 30), ('json', 5)):
+            Package.objects.create(name=name, author=author, download_count=downloads)
+        # Each test starts without a process index
+        patcher = mock.patch.object(suggest, '_index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lookup(self):
+        index = suggest.build_index()
+        # Precomputed short prefix, and a bisected long one: most downloaded first
+        self.assertEqual(index.lookup('ht', 3), [('httpx', 80), ('http', 50), ('htmlkit', 30)])
+        self.assertEqual(index.lookup('http_', 10), [('http_client', 10)])
+        self.assertEqual(index.lookup('httpz', 10), [])
+        self.assertEqual(index.lookup('', 10), [])
+
+    def test_with_package_matches_a_rebuild(self):
+        index = suggest.build_index().with_package('htop')
+        Package.objects.create(name='htop', author=User.objects.get(), download_count=0)
+        rebuilt = suggest.build_index()
+        for prefix in ('h', 'ht', 'hto', 'htop', 'http'):
+            self.assertEqual(index.lookup(prefix, 10), rebuilt.lookup(prefix, 10), prefix)
+        self.assertIs(index.with_package('htop'), index)
+
+    def test_index_is_rebuilt_after_its_ttl(self):
+        self.assertEqual(suggest.find_suggestions('js', 10), [('json', 5)])
+        Package.objects.create(name='jsonpath', author=User.objects.get(), download_count=1)
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest.find_suggestions('js', 10), [('json', 5)])
+
+        # add_suggestion: visible in this process right away
+        suggest.add_suggestion('jsonpath')
+        self.assertEqual(suggest.find_suggestions('JS ', 10), [('json', 5), ('jsonpath', 0)])
+
+        Package.objects.filter(name='jsonpath').update(download_count=9)
+        with self.settings(SUGGEST_INDEX_TTL=-1), self.assertNumQueries(1):
+            self.assertEqual(suggest.find_suggestions('js', 10), [('jsonpath', 9), ('json', 5)])
+
+    def test_endpoint(self):
+        response = self.client.get('/api/packages/suggest/', {'prefix': 'htt', 'limit': 2})
+        self.assertEqual(response.json()['suggestions'], [
+            {'name': 'httpx', 'download_count': 80}, {'name': 'http', 'download_count': 50},
+        ])
+        self.assertEqual(self.client.get('/api/packages/suggest/', {'limit': 'x'}).status_code, 400)
+
+    def test_collection_actions_are_reserved_names(self):
+        actions = [action.url_path for action in PackageViewSet.get_extra_actions() if not action.detail]
+        self.assertEqual(set(actions) - set(RESERVED_NAMES), set())
+
+        client = APIClient()
+        client.force_authenticate(User.objects.get())
+        response = client.post('/api/packages/publish/', {
+            'name': 'suggest', 'version': '1.0.0', 'file': make_archive('suggest'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reserved', str(response.data['name']))
+
+
+class PlatformFallbackTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+        for target_os, target_arch in (('any', 'any'), ('linux', 'any'), ('linux', 'x86_64'), ('macos', 'x86_64')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/packages/publish/', {
+                    'name': 'nativepkg', 'version': '1.0.0', 'os': target_os, 'architecture': target_arch,
+                    'file': make_archive('nativepkg', filename=f'nativepkg-{target_os}-{target_arch}.zip'),
+                }, format='multipart')
+            self.assertEqual(response.status_code, 201, response.data)
+        compatible_platforms.cache_clear()
+        self.addCleanup(compatible_platforms.cache_clear)
+
+    def served(self, target_os: str, target_arch: str) -> Tuple[str, str]:
+        """Platform of the asset picked by latest, checked against resolve and verify."""
+        latest = self.client.get('/api/packages/nativepkg/latest/', {'os': target_os, 'architecture': target_arch}).data
+        resolved = self.client.post('/api/packages/resolve/', {
+            'dependencies': {'nativepkg': '*'}, 'os': target_os, 'architecture': target_arch,
+        }, format='json').data['packages'][0]
+        [verdict] = self.client.post('/api/packages/verify/', {'entries': [
+            {'name': 'nativepkg', 'version': '1.0.0', 'os': target_os, 'architecture': target_arch},
+        ]}, format='json').data['entries']
+        platform = (latest['os'], latest['architecture'])
+        self.assertEqual((resolved['os'], resolved['architecture']), platform)
+        self.assertEqual((verdict.get('file_os', target_os), verdict.get('file_architecture', target_arch)), platform)
+        return platform
+
+    def test_default_chain(self):
+        self.assertEqual(compatible_platforms('linux', 'arm64'), (
+            ('linux', 'arm64'), ('linux', 'any'), ('any', 'arm64'), ('any', 'any'),
+        ))
+        self.assertEqual(compatible_platforms('any', 'any'), (('any', 'any'),))
+
+    def test_fallback_order(self):
+        self.assertEqual(self.served('linux', 'x86_64'), ('linux', 'x86_64'))
+        self.assertEqual(self.served('linux', 'arm64'), ('linux', 'any'))
+        self.assertEqual(self.served('windows', 'x86_64'), ('any', 'any'))
+
+        PackageFile.objects.filter(os='linux', architecture='any').delete()
+        self.assertEqual(self.served('linux', 'arm64'), ('any', 'any'))
+
+    def test_extra_fallbacks(self):
+        # Rosetta: the x86_64 binary before the generic assets
+        self.assertEqual(self.served('macos', 'arm64'), ('macos', 'x86_64'))
+        with self.settings(PLATFORM_FALLBACKS={'linux/arm64': ['linux/x86_64']}):
+            compatible_platforms.cache_clear()
+            self.assertEqual(self.served('linux', 'arm64'), ('linux', 'x86_64'))
+
+
+class AuthorStatsTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com')
+        other = User.objects.create_user(username='other', email='other@example.com')
+        self.today = timezone.now().date()
+        first = Package.objects.create(name='first', author=self.author, download_count=7)
+        second = Package.objects.create(name='second', author=self.author, download_count=5)
+        foreign = Package.objects.create(name='foreign', author=other, download_count=100)
+        PackageVersion.objects.create(package=first, version_number='1.0.0')
+        PackageVersion.objects.create(package=first, version_number='1.1.0')
+        for package, days_ago, count in ((first, 0, 3), (second, 0, 2), (first, 2, 4), (second, 40, 1), (foreign, 0, 100)):
+            DownloadStat.objects.create(package=package, date=self.today - timedelta(days=days_ago), count=count)
+
+    def test_stats(self):
+        with self.assertNumQueries(2):
+            stats = PackageService.get_author_stats(self.author, days=3)
+        self.assertEqual((stats['total_packages'], stats['total_downloads']), (2, 12))
+        # Summed across the packages of the author, zero-filled, oldest first
+        self.assertEqual(
+            [(entry['date'], entry['downloads']) for entry in stats['downloads_over_time']],
+            [(self.today - timedelta(days=2), 4), (self.today - timedelta(days=1), 0), (self.today, 5)],
+        )
+        self.assertEqual(
+            {package['name']: package['latest_version'] for package in stats['packages']},
+            {'first': '1.1.0', 'second': None},
+        )
+
+    def test_endpoint_clamps_days(self):
+        for days, expected in (('0', 1), ('-5', 1), ('45', 45), ('1000', AuthorViewSet.MAX_DAYS)):
+            response = self.client.get('/api/authors/author/', {'days': days})
+            self.assertEqual(len(response.json()['downloads_over_time']), expected, days)
+        response = self.client.get('/api/authors/author/', {'days': '45'})
+        self.assertEqual(sum(entry['downloads'] for entry in response.json()['downloads_over_time']), 10)
+
+        self.assertEqual(len(self.client.get('/api/authors/author/').json()['downloads_over_time']), 30)
+        self.assertEqual(self.client.get('/api/authors/author/', {'days': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/authors/nobody/').status_code, 404)
+
+
+class ReconcileStorageTests(MediaRootMixin, TestCase):
+    orphans = ['deltas/2020/01/orphan.zip', 'packages/2020/01/orphan.zip']
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+        payload = os.urandom(20_000)
+        for version in ('1.0.0', '1.1.0'):
+            response = self.client.post('/api/packages/publish/', {
+                'name': 'storedpkg', 'version': version, 'file': make_archive('storedpkg', payload=payload),
+            }, format='multipart')
+            self.assertEqual(response.status_code, 201, response.data)
+        self.delta = build_delta_for(PackageFile.objects.get(version__version_number='1.1.0'))
+        self.assertIsNotNone(self.delta)
+
+        for name in self.orphans + ['quarantine/packages/old.zip', 'avatars/publisher.png']:
+            default_storage.save(name, ContentFile(b'blob'))
+        # Everything is old enough, except an upload still in flight
+        old = time.time() - 3 * 3600
+        for root, _, files in os.walk(settings.MEDIA_ROOT):
+            for name in files:
+                os.utime(os.path.join(root, name), (old, old))
+        default_storage.save('packages/2020/01/in-flight.zip', ContentFile(b'blob'))
+
+    def reconcile(self, **options: Any) -> str:
+        out = io.StringIO()
+        call_command('reconcile_storage', batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_report_flags_only_real_orphans(self):
+        out = self.reconcile()
+        self.assertEqual([line.split()[1] for line in out.splitlines() if line.startswith('orphan ')], self.orphans)
+        # 2 archives, 1 delta, 2 orphans and the upload in flight
+        self.assertIn("Orphans: 2 orphan blob(s) in 6 scanned.", out)
+        self.assertIn("Missing: 0 missing blob(s) in 2 file row(s).", out)
+        for name in self.orphans:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_missing_blob(self):
+        package_file = PackageFile.objects.get(version__version_number='1.0.0')
+        default_storage.delete(package_file.file.name)
+        out = self.reconcile(skip_orphans=True)
+        self.assertIn(f"missing blob for PackageFile #{package_file.pk}: {package_file.file.name}", out)
+        self.assertIn("Missing: 1 missing blob(s) in 2 file row(s).", out)
+        self.assertNotIn("Orphans:", out)
+
+    def test_quarantine_and_delete(self):
+        self.reconcile(quarantine=True, skip_missing=True)
+        for name in self.orphans:
+            self.assertFalse(default_storage.exists(name))
+            self.assertTrue(default_storage.exists(f'quarantine/{name}'))
+        self.assertIn("Orphans: 0 orphan blob(s)", self.reconcile(delete=True))
+
+        default_storage.save(self.orphans[0], ContentFile(b'blob'))
+        os.utime(default_storage.path(self.orphans[0]), (0, 0))
+        self.reconcile(delete=True, skip_missing=True)
+        self.assertFalse(default_storage.exists(self.orphans[0]))
+        for package_file in PackageFile.objects.all():
+            self.assertTrue(default_storage.exists(package_file.file.name))
+        self.assertTrue(default_storage.exists(self.delta.file.name))
+
+    def test_resume_from_checkpoint(self):
+        checkpoint = os.path.join(settings.MEDIA_ROOT, 'checkpoint.json')
+        with open(checkpoint, 'w') as f:
+            json.dump({'last_path': 'packages/2020/01/in-flight.zip'}, f)
+        out = self.reconcile(checkpoint=checkpoint)
+        # The delta orphan sorts before the checkpoint: already handled by the interrupted run
+        self.assertEqual([line.split()[1] for line in out.splitlines() if line.startswith('orphan ')], self.orphans[1:])
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+class DependentsCountTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+
+    def publish(self, name: str, version: str = '1.0.0', dependencies: Dict[str, str] = None) -> None:
+        response = self.client.post('/api/packages/publish/', {
+            'name': name, 'version': version, 'file': make_archive(name, dependencies),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def counts(self) -> Dict[str, int]:
+        return dict(Package.objects.values_list('name', 'dependents_count'))
+
+    def test_counts_follow_publish_and_delete(self):
+        self.publish('corelib')
+        self.publish('app_one', '1.0.0', {'corelib': '^1.0.0'})
+        # Another version of the same dependent isn't counted twice
+        self.publish('app_one', '1.1.0', {'corelib': '^1.0.0'})
+        self.publish('app_two', '1.0.0', {'corelib': '*', 'futurelib': '*'})
+        self.assertEqual(self.counts(), {'corelib': 2, 'app_one': 0, 'app_two': 0})
+
+        # A package published after its dependents starts with their count
+        self.publish('futurelib')
+        self.assertEqual(self.counts()['futurelib'], 1)
+
+        PackageVersion.objects.get(package__name='app_one', version_number='1.0.0').delete()
+        self.assertEqual(self.counts()['corelib'], 2)
+        Package.objects.get(name='app_two').delete()
+        self.assertEqual(self.counts(), {'corelib': 1, 'app_one': 0, 'futurelib': 0})
+
+        response = self.client.get('/api/packages/corelib/dependents/')
+        self.assertEqual([row['name'] for row in response.data['results']], ['app_one'])
+
+    def test_sort_by_dependents(self):
+        self.publish('corelib')
+        self.publish('utils')
+        self.publish('app_one', '1.0.0', {'corelib': '*', 'utils': '*'})
+        self.publish('app_two', '1.0.0', {'corelib': '*'})
+
+        response = self.client.get('/packages/?sort=dependents')
+        self.assertEqual([package.name for package in response.context['object_list']][:2], ['corelib', 'utils'])
+
+
+class RegistryTransferTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+        self.export_dir = os.path.join(tempfile.mkdtemp(), 'export')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.export_dir), ignore_errors=True)
+
+    def publish(self, name: str) -> PackageFile:
+        response = self.client.post('/api/packages/publish/', {
+            'name': name, 'version': '1.0.0', 'file': make_archive(name, filename='pkg.zip'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return PackageFile.objects.get(version__package__name=name)
+
+    def stored_blobs(self) -> int:
+        return sum(len(files) for _, _, files in os.walk(settings.MEDIA_ROOT))
+
+    def test_import_does_not_reuse_an_unrelated_blob(self):
+        exported = self.publish('alpha')
+        call_command('export_registry', self.export_dir, stdout=io.StringIO())
+        Package.objects.filter(name='alpha').delete()
+        # Another archive now lives under the same (uploader-chosen) name
+        default_storage.delete(exported.file.name)
+        default_storage.save(exported.file.name, ContentFile(b'unrelated'))
+
+        call_command('import_registry', self.export_dir, stdout=io.StringIO())
+        imported = PackageFile.objects.get(version__package__name='alpha')
+        self.assertNotEqual(imported.file.name, exported.file.name)
+        with default_storage.open(imported.file.name, 'rb') as blob:
+            self.assertEqual(hashlib.sha256(blob.read()).hexdigest(), exported.sha256)
+
+        # Re-run: the rows exist, nothing is copied again
+        blobs = self.stored_blobs()
+        call_command('import_registry', self.export_dir, stdout=io.StringIO())
+        self.assertEqual(self.stored_blobs(), blobs)
+
+    def test_import_reuses_the_same_blob(self):
+        exported = self.publish('alpha')
+        call_command('export_registry', self.export_dir, stdout=io.StringIO())
+        Package.objects.filter(name='alpha').delete()
+        blobs = self.stored_blobs()
+
+        call_command('import_registry', self.export_dir, stdout=io.StringIO())
+        self.assertEqual(PackageFile.objects.get(version__package__name='alpha').file.name, exported.file.name)
+        self.assertEqual(self.stored_blobs(), blobs)
+
+
+class DenyObjectPermission(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj) -> bool:
+        return False
+
+
+class PackageReadPathTests(TestCase):
+    """serialize_packages must render exactly what PackageSerializer renders."""
+
+    def setUp(self):
+        author = User.objects.create_user(username='publisher', email='publisher@example.com')
+        package = Package.objects.create(name='alpha', author=author, description='Parser', download_count=4)
+        PackageVersion.objects.create(package=package, version_number='1.0.0', download_count=1)
+        PackageVersion.objects.create(package=package, version_number='1.1.0', download_count=3)
+        # No version (no latest) and a blank description
+        Package.objects.create(name='empty', author=author)
+
+    def render(self, data) -> bytes:
+        return JSONRenderer().render(data)
+
+    def test_list(self):
+        expected = self.render(PackageSerializer(Package.objects.all(), many=True).data)
+        self.assertEqual(self.render(serialize_packages(Package.objects.all())), expected)
+        self.assertEqual(self.client.get('/api/packages/', HTTP_ACCEPT='application/json').content, expected)
+
+    def test_retrieve(self):
+        for package in Package.objects.all():
+            response = self.client.get(f'/api/packages/{package.name}/', HTTP_ACCEPT='application/json')
+            self.assertEqual(response.content, self.render(PackageSerializer(package).data))
+
+        response = self.client.get('/api/packages/missing/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': "No Package matches the given query."})
+
+    def test_retrieve_checks_object_permissions(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(username='publisher'))
+        with mock.patch.object(PackageViewSet, 'permission_classes', [DenyObjectPermission]):
+            response = client.get('/api/packages/alpha/')
+        self.assertEqual(response.status_code, 403)
+
+
+class CheckRegistryTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='publisher', email='publisher@example.com')
+        Package.objects.create(name='drifted', author=author)
+        Package.objects.filter(name='drifted').update(dependents_count=3)
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.checkpoint), ignore_errors=True)
+
+    def test_resumed_run_reports_the_drift_found_before_the_interruption(self):
+        with mock.patch.object(CheckRegistry, '_check_stats', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('check_registry', checkpoint=self.checkpoint, stdout=io.StringIO())
+
+        with self.assertRaisesMessage(CommandError, 'dependents_count=1'):
+            call_command('check_registry', checkpoint=self.checkpoint, stdout=io.StringIO())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+class ConcurrentPublishTests(MediaRootMixin, TransactionTestCase):
+    """
+    Parallel CI jobs publishing the same version: no 500, one file per platform, identical retries
+    answered 200, different archives 409, no orphan blob. Real threads and connections, hence
+    TransactionTestCase (the database is flushed after each test).
+    """
+
+    threads = 8
+    name = 'concurrent'
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='publisher', email='publisher@example.com')
+        self.token, _ = Token.objects.get_or_create(user=user)
+        # Published archives are indexed on a background thread: done before the database is flushed
+        self.addCleanup(indexing.flush)
+
+    def run_uploads(self, version: str, uploads: List[Tuple[bytes, str, str, Optional[str]]]) -> List[Tuple[int, bool]]:
+        """
+        Fires the uploads (archive, os, architecture, idempotency key) at once,
+        returns the sorted (status, replayed) of the responses.
+        """
+        statuses: List[Tuple[int, bool]] = []
+        errors: List[BaseException] = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(uploads))
+
+        def upload(archive: bytes, target_os: str, target_arch: str, key: Optional[str]) -> None:
+            client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            payload = SimpleUploadedFile(f'{self.name}.zip', archive, content_type='application/zip')
+            headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+            barrier.wait()
+            try:
+                response = client.post('/api/packages/publish/', {
+                    'name': self.name, 'version': version, 'os': target_os,
+                    'architecture': target_arch, 'file': payload,
+                }, **headers)
+                with lock:
+                    statuses.append((response.status_code, response.get('Idempotent-Replayed') == 'true'))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=upload, args=args) for args in uploads]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+        return sorted(statuses)
+
+    def archive(self, marker: str) -> bytes:
+        return make_archive(self.name, payload=marker.encode()).read()
+
+    def assertStatuses(self, statuses: List[Tuple[int, bool]], expected: Dict[int, int]) -> None:
+        self.assertEqual(Counter(status for status, _ in statuses), Counter(expected))
+
+    def assertFiles(self, version: str, count: int) -> None:
+        rows = PackageFile.objects.filter(version__package__name=self.name, version__version_number=version)
+        self.assertEqual(rows.count(), count)
+        # The losers of the race must have deleted their blob
+        referenced = {os.path.join(settings.MEDIA_ROOT, name) for name in
+                      PackageFile.objects.filter(version__package__name=self.name).values_list('file', flat=True)}
+        stored = {os.path.join(root, name) for root, _, names in os.walk(settings.MEDIA_ROOT) for name in names}
+        self.assertEqual(stored - referenced, set())
+
+    def test_same_archive_same_platform(self):
+        archive = self.archive('same')
+        statuses = self.run_uploads('1.0.0', [(archive, 'any', 'any', None)] * self.threads)
+        self.assertStatuses(statuses, {201: 1, 200: self.threads - 1})
+        self.assertFiles('1.0.0', 1)
+
+    def test_different_archives_same_platform(self):
+        uploads = [(self.archive(f'build {i}'), 'any', 'any', None) for i in range(self.threads)]
+        statuses = self.run_uploads('2.0.0', uploads)
+        self.assertStatuses(statuses, {201: 1, 409: self.threads - 1})
+        self.assertFiles('2.0.0', 1)
+
+    def test_one_platform_per_job(self):
+        platforms = [(os_, arch) for os_ in ('linux', 'windows', 'macos') for arch in ('x86_64', 'arm64')]
+        uploads = [(self.archive(f'{os_}-{arch}'), os_, arch, None) for os_, arch in platforms]
+        statuses = self.run_uploads('3.0.0', uploads)
+        self.assertStatuses(statuses, {201: len(uploads)})
+        self.assertFiles('3.0.0', len(uploads))
+        self.assertEqual(PackageVersion.objects.filter(package__name=self.name, version_number='3.0.0').count(), 1)
+
+    def test_retries_with_one_idempotency_key(self):
+        archive = self.archive('idempotent')
+        key = 'ci-job-42'
+        # A slow publish: the retries arrive while the first request still holds the key
+        with mock.patch('packages.api_views.inspect_archive', side_effect=slow(inspect_archive)):
+            statuses = self.run_uploads('4.0.0', [(archive, 'any', 'any', key)] * self.threads)
+        # They wait for its response and replay it
+        self.assertEqual(statuses, [(201, False)] + [(201, True)] * (self.threads - 1))
+        self.assertFiles('4.0.0', 1)
+
+        self.assertEqual(self.run_uploads('4.0.0', [(archive, 'any', 'any', key)]), [(201, True)])
+        self.assertEqual(self.run_uploads('4.0.0', [(self.archive('other'), 'any', 'any', key)]), [(422, False)])
+
+    def test_failed_publish_releases_its_idempotency_key(self):
+        key = 'ci-job-43'
+        invalid = make_archive(self.name, {'Invalid-Name': '*'}).read()
+        self.assertEqual(self.run_uploads('5.0.0', [(invalid, 'any', 'any', key)]), [(400, False)])
+        # The fixed upload is published, not refused as another upload with the same key
+        self.assertEqual(self.run_uploads('5.0.0', [(self.archive('fixed'), 'any', 'any', key)]), [(201, False)])
+
+
+@skipIf(mock_aws is None, "requires the s3 extra and moto")
+class S3StorageTests(TestCase):
+    """STORAGE_BACKEND=s3 (same S3Storage options as the settings) against moto's in-process S3."""
+
+    bucket = 'aegis-test'
+
+    def setUp(self):
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket=self.bucket)
+
+        storage_override = override_settings(STORAGES={**settings.STORAGES, 'default': {
+            'BACKEND': 'storages.backends.s3.S3Storage',
+            'OPTIONS': {
+                'bucket_name': self.bucket,
+                'region_name': 'us-east-1',
+                'access_key': 'testing',
+                'secret_key': 'testing',
+                'default_acl': 'private',
+                'file_overwrite': False,
+                'querystring_auth': True,
+                'signature_version': 's3v4',
+                'querystring_expire': 300,
+                'transfer_config': TransferConfig(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024),
+            },
+        }})
+        storage_override.enable()
+        self.addCleanup(storage_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='publisher', email='publisher@example.com'))
+
+    def publish(self, name: str, version: str, **archive) -> PackageFile:
+        upload = make_archive(name, **archive)
+        response = self.client.post('/api/packages/publish/', {'name': name, 'version': version, 'file': upload},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return PackageFile.objects.get(version__package__name=name, version__version_number=version)
+
+    def test_publish_and_presigned_download(self):
+        package_file = self.publish('s3pkg', '1.0.0')
+        self.assertTrue(default_storage.exists(package_file.file.name))
+        stored = self.s3.get_object(Bucket=self.bucket, Key=package_file.file.name)['Body'].read()
+        self.assertEqual(PackageFile.objects.get(pk=package_file.pk).sha256, hashlib.sha256(stored).hexdigest())
+
+        url = self.client.get('/api/packages/s3pkg/latest/').data['url']
+        self.assertIn(f'{self.bucket}', url)
+        self.assertIn(package_file.file.name, url)
+        self.assertIn('X-Amz-Signature=', url)
+        self.assertIn('X-Amz-Expires=300', url)
+        # moto also intercepts plain HTTP clients: the presigned URL serves the archive without credentials
+        self.assertEqual(requests.get(url).content, stored)
+
+    def test_large_archive_uses_multipart_upload(self):
+        package_file = self.publish('s3big', '1.0.0', payload=os.urandom(6 * 1024 * 1024))
+        head = self.s3.head_object(Bucket=self.bucket, Key=package_file.file.name)
+        self.assertGreater(head['ContentLength'], 6 * 1024 * 1024)
+        # Multipart objects have a '<digest>-<parts>' ETag
+        self.assertIn('-', head['ETag'])
+
+    def test_same_upload_name_does_not_overwrite(self):
+        first = self.publish('s3one', '1.0.0')
+        second = self.publish('s3two', '1.0.0')
+        self.assertNotEqual(first.file.name, second.file.name)
+        self.assertEqual(self.s3.list_objects_v2(Bucket=self.bucket)['KeyCount'], 2)
@@ -0,0 +1,127 @@
+"""
+Chunked archive format shared by the `export_registry` and `import_registry` commands.
+
+    <root>/manifest.json                  format, counts and chunk list per section
+    <root>/<section>-00000.jsonl.gz       one JSON record per line, `chunk_size` records per chunk
+    <root>/blobs/<storage name>           archive files, same relative names as in the storage
+
+Records reference each other by natural keys (username, package name, version number),
+never by primary key, so an export can be imported into a registry that already has data.
+"""
+
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Type
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils.dateparse import parse_datetime
+
+FORMAT = 'aegis-registry-export'
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+BLOBS_DIR = 'blobs'
+
+# Sections in dependency order: each one only references the previous ones
+SECTIONS: Dict[str, List[str]] = {
+    'users': [
+        'username', 'email', 'password', 'first_name', 'last_name',
+        'is_staff', 'is_superuser', 'is_active', 'date_joined', 'last_login',
+    ],
+    'packages': [
+        'name', 'author__username', 'description', 'license', 'repository', 'website',
+        'download_count', 'created_at', 'updated_at',
+    ],
+    'versions': [
+        'package__name', 'version_number', 'readme', 'created_at', 'download_count',
+        'is_yanked', 'yank_reason', 'yanked_at', 'is_deprecated', 'deprecation_message',
+    ],
+    'dependencies': [
+        'version__package__name', 'version__version_number', 'name', 'requirement',
+    ],
+    'files': [
+        'version__package__name', 'version__version_number', 'file', 'os', 'architecture',
+        'size', 'sha256', 'download_count', 'uploaded_at',
+    ],
+}
+
+DATETIME_FIELDS = {'date_joined', 'last_login', 'created_at', 'updated_at', 'yanked_at', 'uploaded_at'}
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    """Keeps the microseconds (DjangoJSONEncoder truncates to milliseconds), they order the versions."""
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class ChunkWriter:
+    """Writes the records of a section as gzipped JSON Lines, starting a new chunk every `chunk_size` records."""
+
+    def __init__(self, root: str, section: str, chunk_size: int):
+        self.root = root
+        self.section = section
+        self.chunk_size = chunk_size
+        self.chunks: List[str] = []
+        self.count = 0
+        self._file = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.count % self.chunk_size == 0:
+            self._roll()
+        self._file.write(json.dumps(record, cls=ExportEncoder).encode() + b'\n')
+        self.count += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _roll(self) -> None:
+        self.close()
+        name = f'{self.section}-{len(self.chunks):05d}.jsonl.gz'
+        self.chunks.append(name)
+        self._file = gzip.open(os.path.join(self.root, name), 'wb', compresslevel=6)
+
+
+def read_section(root: str, chunks: List[str]) -> Iterator[Dict[str, Any]]:
+    """Streams the records of a section, one chunk in memory at most."""
+    for name in chunks:
+        with gzip.open(os.path.join(root, name), 'rb') as f:
+            for line in f:
+                record = json.loads(line)
+                for field in DATETIME_FIELDS.intersection(record):
+                    if record[field] is not None:
+                        record[field] = parse_datetime(record[field])
+                yield record
+
+
+def read_manifest(root: str) -> Dict[str, Any]:
+    with open(os.path.join(root, MANIFEST)) as f:
+        return json.load(f)
+
+
+def write_manifest(root: str, manifest: Dict[str, Any]) -> None:
+    with open(os.path.join(root, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, cls=DjangoJSONEncoder)
+
+
+@contextmanager
+def preserve_timestamps(*model_classes: Type[models.Model]) -> Iterator[None]:
+    """Disables auto_now/auto_now_add so the imported rows keep their original dates."""
+    disabled = []
+    for model in model_classes:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                disabled.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in disabled:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
@@ -1,15 +1,21 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+from django.conf import settings
 from django.views.generic import TemplateView, ListView, DetailView
 from django.db.models import QuerySet, Q
 from django.shortcuts import get_object_or_404
 
+from core.edge import EdgeCacheMixin
+
 from .models import Package
 from .services import PackageService
 
 
-class IndexView(TemplateView):
+class IndexView(EdgeCacheMixin, TemplateView):
     template_name: str = "index.html"
 
+    def get_surrogate_keys(self) -> List[str]:
+        return ['index']
+
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         """
         Populates the context for the homepage.
@@ -18,18 +24,22 @@ class IndexView(TemplateView):
         
         # Use Service to get data (clean separation of concerns)
         context['recent_packages'] = PackageService.get_recent_packages(limit=6)
-        context['total_packages'] = Package.objects.count()
-        context['total_downloads'] = PackageService.get_total_downloads()
+        stats = PackageService.get_registry_stats()
+        context['total_packages'] = stats.total_packages
+        context['total_downloads'] = stats.total_downloads
         
         return context
 
 
-class PackageListView(ListView):
+class PackageListView(EdgeCacheMixin, ListView):
     model = Package
     template_name: str = "packages/list.html"
     context_object_name: str = "packages"
     paginate_by: int = 10  # Optional: Adds pagination automatically
 
+    def get_surrogate_keys(self) -> List[str]:
+        return ['package-list']
+
     def get_queryset(self) -> QuerySet[Package]:
         """
         Handles filtering (search) and sorting logic.
@@ -48,13 +58,15 @@ class PackageListView(ListView):
         sort_param: Optional[str] = self.request.GET.get('sort')
         if sort_param == 'downloads':
             queryset = queryset.order_by('-download_count')
+        elif sort_param == 'dependents':
+            queryset = queryset.order_by('-dependents_count')
         elif sort_param == 'name':
             queryset = queryset.order_by('name')
         else:
             # Default: Recently updated
             queryset = queryset.order_by('-updated_at')
 
-        return queryset
+        return PackageService.with_latest_version(queryset)
 
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         """
@@ -66,7 +78,7 @@ class PackageListView(ListView):
         return context
 
 
-class PackageDetailView(DetailView):
+class PackageDetailView(EdgeCacheMixin, DetailView):
     model = Package
     template_name: str = "packages/detail.html"
     context_object_name: str = "package"
@@ -85,7 +97,10 @@ class PackageDetailView(DetailView):
         name: str = self.kwargs.get(self.slug_url_kwarg)
         # Using select_related/prefetch_related optimization is good practice here
         # assuming 'versions' is a related model
-        return get_object_or_404(queryset.prefetch_related('versions'), name=name)
+        return get_object_or_404(queryset.select_related('author').prefetch_related('versions'), name=name)
+
+    def get_surrogate_keys(self) -> List[str]:
+        return [PackageService.surrogate_key(self.kwargs[self.slug_url_kwarg])]
 
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         """
@@ -94,6 +109,9 @@ class PackageDetailView(DetailView):
         context: Dict[str, Any] = super().get_context_data(**kwargs)
         package: Package = self.object  # type: ignore (DetailView defines self.object)
         
+        # Evaluated by the template inside its cached fragment only
+        context['file_tree'] = lambda: PackageService.get_file_tree(package, settings.FILE_TREE_MAX_ENTRIES)
+
         # Render markdown using the service
         if hasattr(package, 'readme'):
             context['readme_html'] = PackageService.render_markdown(package.readme)